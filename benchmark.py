@@ -0,0 +1,170 @@
+# Benchmark of the splitter, the schema planner, the SQL exports and the uploaders on synthetic OCEL 2.0 logs.
+# Runs fully offline: the uploads go to a local fake data pool that simulates the API latency.
+#
+# Every scale is run with the base shape of the log, and the scales up to 'sweep_max_events' also with every value of
+# the parameter grid (one parameter changed at a time): E2O fan-out, attribute sparsity and O2O density.
+#
+# Usage: python benchmark.py [n_events ...] [--trace-all | --no-trace]
+# (default scales: 10k, 100k, 1M and 10M events; memory is traced up to 1M events, at every scale with --trace-all)
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from fake_celonis import FakeDataPool
+from schema_planner import plan_schema, schema_sizes
+from splitter import transform_ocel
+from sql_export import dataframe_to_sql, export_dataframe
+from synthetic_ocel import generate_ocel
+import uploader
+import uploader2
+
+
+DEFAULT_SCALES = [10000, 100000, 1000000, 10000000]
+
+# Shape of the synthetic logs
+BASE_PARAMETERS = {
+    "n_object_types": 10,
+    "n_activities": 40,
+    "e2o_fanout": 3.0,
+    "events_per_object": 5.0,
+    "o2o_density": 1.0,
+    "n_event_attributes": 10,
+    "n_object_attributes": 10,
+    "attribute_sparsity": 0.7,
+}
+
+# Values of the parameters swept around the base shape
+PARAMETER_GRID = {
+    "e2o_fanout": [1.5, 3.0, 6.0],
+    "attribute_sparsity": [0.2, 0.7, 0.95],
+    "o2o_density": [0.5, 1.0, 4.0],
+}
+
+# Largest scale of the parameter sweeps (the larger scales only run the base shape), of the memory tracing (it slows
+# down the stages that allocate many Python objects) and of dataframe_to_sql (it holds the whole export in memory)
+SWEEP_MAX_EVENTS = 1000000
+TRACE_MAX_EVENTS = 1000000
+SQL_MAX_EVENTS = 1000000
+
+
+def parameter_sets(base_parameters, parameter_grid):
+    # The base shape, then every value of the grid that differs from it, one parameter changed at a time.
+    # Yields (name of the configuration, generator parameters).
+    yield "base", dict(base_parameters)
+    for name, values in parameter_grid.items():
+        for value in values:
+            if value != base_parameters.get(name):
+                yield f"{name}={value}", {**base_parameters, name: value}
+
+
+def measure(records, run, stage, function, *args, **kwargs):
+    # Run a stage, recording its wall-clock time and, when memory tracing is on, its peak of traced memory
+    # (in bytes) above the starting point. 'run': the scale and the configuration of the log, copied to the record.
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args, **kwargs)
+    duration = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1] - start_memory if tracing else None
+    records.append({**run, "stage": stage, "seconds": round(duration, 3), "peak_bytes": peak_memory})
+    memory = f"{peak_memory / 2 ** 20:10.1f} MiB" if tracing else "           -"
+    print(f"{run['events']:>10} events | {run['configuration']:<24} | {stage:<12} | {duration:9.2f}s | {memory}")
+    return result
+
+
+def export_tables(tables, target_folder, output_format="insert"):
+    for name, df in tables:
+        export_dataframe(df, os.path.join(target_folder, f"{name}.sql"), output_format=output_format)
+
+
+def export_tables_sql(tables, target_folder):
+    for name, df in tables:
+        dataframe_to_sql(df, os.path.join(target_folder, f"{name}.sql"))
+
+
+def plan_ocel_schema(ocel, lead_object_type):
+    # The schema planner reads the O2O relations of the log (ocel.o2o), which the other stages do not
+    return plan_schema(*schema_sizes(ocel), lead_object_type=lead_object_type)
+
+
+def run_scale(records, run, generator_parameters, lead_object_type, o2o_chunk_size, latency, max_workers, export,
+              export_sql):
+    ocel = measure(records, run, "generate", generate_ocel, n_events=run["events"], **generator_parameters)
+    measure(records, run, "plan_schema", plan_ocel_schema, ocel, lead_object_type)
+    object_dfs, event_dfs, relationship_dfs, object_relationship_dfs = measure(
+        records, run, "transform", transform_ocel, ocel, create_object_relations=True,
+        lead_object_type=lead_object_type, o2o_chunk_size=o2o_chunk_size)
+    del ocel
+
+    tables = list(object_dfs.items()) + list(event_dfs.items()) + \
+        [(f"{e}_{o}", df) for (e, o), df in relationship_dfs.items()] + list(object_relationship_dfs.items())
+    if export:
+        with tempfile.TemporaryDirectory() as target_folder:
+            measure(records, run, "export", export_tables, tables, target_folder)
+    if export_sql:
+        with tempfile.TemporaryDirectory() as target_folder:
+            measure(records, run, "export_sql", export_tables_sql, tables, target_folder)
+    del tables
+
+    data_pool = FakeDataPool(latency=latency, keep_data=False)
+    measure(records, run, "upload", uploader.upload_to_data_pool, data_pool, object_dfs, event_dfs,
+            relationship_dfs, object_relationship_dfs, max_workers=max_workers)
+
+    data_pool = FakeDataPool(latency=latency, keep_data=False)
+    measure(records, run, "upload2", uploader2.upload_to_data_pool, data_pool, object_dfs, event_dfs,
+            relationship_dfs, "benchmark")
+
+
+def run_benchmark(scales=None, base_parameters=None, parameter_grid=None, lead_object_type="Object Type 0",
+                  o2o_chunk_size=1000000, latency=0.01, max_workers=8, export=True, trace_memory=True,
+                  sweep_max_events=SWEEP_MAX_EVENTS, trace_max_events=TRACE_MAX_EVENTS,
+                  sql_max_events=SQL_MAX_EVENTS):
+    # Run every stage at every scale, for every configuration of the log, and return the list of records (one per
+    # scale, configuration and stage). The sweeps, the memory tracing and dataframe_to_sql are limited to the scales
+    # up to their maximum number of events (None: every scale).
+    scales = scales or DEFAULT_SCALES
+    base_parameters = {**BASE_PARAMETERS, **(base_parameters or {})}
+    parameter_grid = PARAMETER_GRID if parameter_grid is None else parameter_grid
+    records = []
+    for scale in scales:
+        configurations = parameter_sets(base_parameters, parameter_grid)
+        if sweep_max_events is not None and scale > sweep_max_events:
+            configurations = [next(configurations)]
+        tracing = trace_memory and (trace_max_events is None or scale <= trace_max_events)
+        export_sql = export and (sql_max_events is None or scale <= sql_max_events)
+        for configuration, generator_parameters in configurations:
+            run = {"events": scale, "configuration": configuration, "parameters": generator_parameters}
+            if tracing:
+                tracemalloc.start()
+            try:
+                run_scale(records, run, generator_parameters, lead_object_type, o2o_chunk_size, latency,
+                          max_workers, export, export_sql)
+            finally:
+                if tracing:
+                    tracemalloc.stop()
+    return records
+
+
+if __name__ == "__main__":
+    scales = [int(x) for x in sys.argv[1:] if not x.startswith("--")] or DEFAULT_SCALES
+
+    # Record the peak memory of each stage up to TRACE_MAX_EVENTS (slower), at every scale, or only the timings
+    trace_memory = "--no-trace" not in sys.argv
+    trace_max_events = None if "--trace-all" in sys.argv else TRACE_MAX_EVENTS
+
+    records = run_benchmark(scales, trace_memory=trace_memory, trace_max_events=trace_max_events)
+
+    output_file = "benchmark_results.jsonl"
+    with open(output_file, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print(f"Results written to {output_file}")
@@ -0,0 +1,136 @@
+# Chunked, resumable upload of large tables: the table is created from its first slice of rows, and the other slices
+# are appended. A local journal records the slices already uploaded, so a rerun resumes every table where it stopped
+# (as long as its content did not change) instead of sending it again from the first row.
+#
+# A failed slice is retried with exponential backoff, and its size is halved at every failure (down to
+# 'min_chunk_rows'), so payloads the API cannot take in one call still go through. After a successful slice the size
+# grows back, but stays below the smallest size that failed. A slice is recorded in the journal right after the API call succeeded: if the run is killed in
+# between, the slice is sent again on resume.
+
+import json
+import os
+import threading
+import time
+
+from fingerprints import table_fingerprint
+from instrumentation import stage
+
+
+class UploadJournal:
+    # Progress of the chunked uploads, written to a local JSON file after every uploaded slice:
+    # {"tables": {table name: {"fingerprint": ..., "rows": rows of the table, "uploaded": rows uploaded so far,
+    #                          "chunks": [[first row, end row], ...]}}}
+    def __init__(self, path):
+        self.path = path
+        self.tables = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.tables = json.load(f).get('tables', {})
+
+    def get(self, table_name):
+        with self._lock:
+            entry = self.tables.get(table_name)
+            return dict(entry) if entry is not None else None
+
+    def start(self, table_name, fingerprint, rows):
+        with self._lock:
+            self.tables[table_name] = {"fingerprint": fingerprint, "rows": rows, "uploaded": 0, "chunks": []}
+            self._save()
+
+    def record_chunk(self, table_name, start, end):
+        with self._lock:
+            entry = self.tables[table_name]
+            entry["chunks"].append([start, end])
+            entry["uploaded"] = end
+            self._save()
+
+    def clear(self):
+        # Forget all the progress (e.g. once every table of the run is uploaded)
+        with self._lock:
+            self.tables = {}
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _save(self):
+        if self.path is None:
+            return
+        # Write atomically, so an interrupted run never leaves a truncated journal
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"tables": self.tables}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _find_table(data_pool, table_name):
+    try:
+        return data_pool.get_tables().find(table_name)
+    except Exception:
+        return None
+
+
+def upload_table_chunked(data_pool, table_name, df, chunk_rows, journal=None, retries=2, retry_backoff=1.0,
+                         min_chunk_rows=None, fingerprint=None):
+    # Upload the dataframe in slices of at most 'chunk_rows' rows. With a journal, the upload resumes after the rows
+    # recorded for the same content ('fingerprint', computed when not given) if the table is still in the data pool.
+    # A slice is given up after 'retries' consecutive failures at the minimum size (default: chunk_rows / 64).
+    # Returns the number of calls, slices and resumed rows, and the last error (None when the whole table is uploaded).
+    chunk_rows = max(1, chunk_rows)
+    min_chunk_rows = max(1, min(chunk_rows, min_chunk_rows or chunk_rows // 64))
+    result = {"attempts": 0, "chunks": 0, "resumed_rows": 0, "error": None}
+    total = len(df)
+    start_row = 0
+    table = None
+
+    if journal is not None:
+        if fingerprint is None:
+            fingerprint = table_fingerprint(df)
+        entry = journal.get(table_name)
+        if entry is not None and entry["fingerprint"] == fingerprint and entry["uploaded"] > 0:
+            table = _find_table(data_pool, table_name)
+            if table is not None:
+                start_row = entry["uploaded"]
+        if start_row == 0:
+            journal.start(table_name, fingerprint, total)
+    result["resumed_rows"] = start_row
+
+    size = chunk_rows
+    failed_size = None
+    failures = 0
+    # The table is created even when it has no rows
+    while start_row < total or table is None:
+        end = min(total, start_row + size)
+        chunk = df.iloc[start_row:end]
+        result["attempts"] += 1
+        try:
+            if table is None:
+                with stage('create_table', table=table_name, rows=len(chunk)):
+                    table = data_pool.create_table(chunk, table_name, force=True, drop_if_exists=True)
+                if table is None:
+                    table = _find_table(data_pool, table_name)
+                if table is None:
+                    result["error"] = f"table '{table_name}' not found after its creation"
+                    break
+            else:
+                with stage('append_rows', table=table_name, rows=len(chunk)):
+                    table.append(chunk)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            failures += 1
+            failed_size = size if failed_size is None else min(failed_size, size)
+            if failures > retries and size <= min_chunk_rows:
+                break
+            time.sleep(retry_backoff * 2 ** min(failures - 1, 6))
+            size = max(min_chunk_rows, size // 2)
+            continue
+        result["error"] = None
+        failures = 0
+        if journal is not None:
+            journal.record_chunk(table_name, start_row, end)
+        result["chunks"] += 1
+        start_row = end
+        if failed_size is None or size * 2 < failed_size:
+            size = min(chunk_rows, size * 2)
+
+    result["uploaded_rows"] = start_row
+    return result
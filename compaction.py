@@ -0,0 +1,176 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from splitter import clean_name, clean_name_map
+
+
+# Tables of the OCEL object that are compacted, with their event ID / object ID columns
+ID_COLUMNS = {
+    'events': {'ocel:eid': 'eid'},
+    'objects': {'ocel:oid': 'oid'},
+    'relations': {'ocel:eid': 'eid', 'ocel:oid': 'oid'},
+    'o2o': {'ocel:oid': 'oid', 'ocel:oid_2': 'oid'},
+    'e2e': {'ocel:eid': 'eid', 'ocel:eid_2': 'eid'},
+    'object_changes': {'ocel:oid': 'oid'},
+}
+
+# Columns holding event types / object types, converted to categoricals
+TYPE_COLUMNS = ['ocel:activity', 'ocel:type']
+
+# Tables of the OCEL object holding each type column
+TYPE_TABLES = {
+    'ocel:activity': ['events', 'relations'],
+    'ocel:type': ['objects', 'relations', 'object_changes'],
+}
+
+
+def _code_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def _encode(values, categories):
+    # Replace the values with their position in 'categories' (-1 for missing values)
+    return pd.Series(categories.get_indexer(values).astype(_code_dtype(len(categories))), index=values.index)
+
+
+def _downcast_numeric(series):
+    # Use the smallest numeric dtype that stores the same values
+    if not isinstance(series.dtype, np.dtype):
+        return series
+    if series.dtype.kind in 'iu':
+        return pd.to_numeric(series, downcast='integer')
+    if series.dtype.kind == 'f' and series.dtype.itemsize > 4:
+        downcast = series.astype(np.float32)
+        if ((downcast.astype(series.dtype) == series) | series.isna()).all():
+            return downcast
+    return series
+
+
+def ocel_memory_usage(ocel):
+    # Deep memory usage (in bytes) of each table of the OCEL object
+    return {table: int(getattr(ocel, table).memory_usage(deep=True).sum()) for table in ID_COLUMNS
+            if getattr(ocel, table, None) is not None}
+
+
+def _id_tables(ocel):
+    return {table: getattr(ocel, table) for table in ID_COLUMNS if getattr(ocel, table, None) is not None}
+
+
+def _id_categories(tables):
+    # Reverse dictionaries: the code of an ID is its position in the index
+    eid_values = [df[col] for table, df in tables.items() for col, kind in ID_COLUMNS[table].items() if kind == 'eid' and col in df.columns]
+    oid_values = [df[col] for table, df in tables.items() for col, kind in ID_COLUMNS[table].items() if kind == 'oid' and col in df.columns]
+    return {
+        'eid': pd.Index(pd.unique(pd.concat(eid_values, ignore_index=True).dropna())) if eid_values else pd.Index([]),
+        'oid': pd.Index(pd.unique(pd.concat(oid_values, ignore_index=True).dropna())) if oid_values else pd.Index([]),
+    }
+
+
+def _decoder(ocel, categories):
+    decoder = {
+        'eid': categories['eid'],
+        'oid': categories['oid'],
+        # Columns named after an object type hold object IDs in the tables produced by transform_ocel
+        'object_columns': set(),
+    }
+    if 'ocel:type' in ocel.objects.columns:
+        decoder['object_columns'] = {clean_name(t) for t in ocel.objects['ocel:type'].dropna().unique()}
+    return decoder
+
+
+def ocel_id_decoder(ocel):
+    # Decoder of the codes compact_ocel would give to the IDs of the OCEL object, without compacting it
+    return _decoder(ocel, _id_categories(_id_tables(ocel)))
+
+
+def compact_ocel(ocel, downcast=True):
+    # Build a compact copy of the OCEL object (the original one is left untouched):
+    # - event types and object types become categoricals
+    # - event IDs and object IDs are interned to dense integer codes, the returned decoder keeps the reverse dictionary
+    # - numeric attributes are downcast to the smallest dtype holding the same values
+    # Returns the compact OCEL and the decoder to pass to decode_ids / the uploaders.
+    tables = _id_tables(ocel)
+    categories = _id_categories(tables)
+
+    compact = copy.copy(ocel)
+    for table, df in tables.items():
+        columns = {}
+        for col in df.columns:
+            if col in ID_COLUMNS[table]:
+                columns[col] = _encode(df[col], categories[ID_COLUMNS[table][col]])
+            elif col in TYPE_COLUMNS:
+                columns[col] = df[col].astype('category')
+            elif downcast and not col.startswith('ocel:'):
+                columns[col] = _downcast_numeric(df[col])
+            else:
+                columns[col] = df[col]
+        setattr(compact, table, pd.DataFrame(columns, index=df.index))
+
+    return compact, _decoder(ocel, categories)
+
+
+def decode_ids(df, decoder, id_kind='oid'):
+    # Turn the integer codes of a table produced by transform_ocel on a compact OCEL back into the original IDs.
+    # 'ID' holds IDs of the given kind ('eid' for event tables and custom E2O tables, 'oid' otherwise),
+    # 'EventID' holds event IDs, and the columns named after an object type hold object IDs.
+    # Columns that are not integer-coded are left as they are.
+    if decoder is None:
+        return df
+    kinds = {'ID': id_kind, 'EventID': 'eid'}
+    kinds.update({col: 'oid' for col in decoder['object_columns'] if col not in kinds})
+    decoded = {}
+    for col, kind in kinds.items():
+        # Embedded object columns are float when some events have no related object of the type
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype):
+            codes = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            missing = np.isnan(codes) | (codes < 0)
+            values = np.full(len(codes), None, dtype=object)
+            values[~missing] = decoder[kind].take(codes[~missing].astype(np.int64)).to_numpy(dtype=object)
+            decoded[col] = pd.Series(values, index=df.index)
+    if not decoded:
+        return df
+    return df.assign(**decoded)
+
+
+def rename_types(ocel, clean=clean_name):
+    # Rename the event types and the object types of the OCEL object (by default to their clean names, as used for
+    # the table names), without copying the log: the type columns become categoricals and only their categories are
+    # renamed, so the cost follows the number of distinct types instead of the number of rows. The other columns are
+    # shared with the original OCEL object, which is left untouched.
+    # Raises ValueError when two types of the same kind get the same name.
+    renamed = copy.copy(ocel)
+    for col, tables in TYPE_TABLES.items():
+        columns = {}
+        for table in tables:
+            df = getattr(renamed, table, None)
+            if df is not None and col in df.columns:
+                columns[table] = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype('category')
+        if not columns:
+            continue
+        # One mapping for all the tables, so the same type gets the same name everywhere
+        mapping = clean_name_map(pd.unique(pd.concat([pd.Series(c.cat.categories) for c in columns.values()])), clean)
+        for table, categorical in columns.items():
+            # Shallow copy with the renamed column: the other columns keep the arrays of the original table
+            # (df.assign would copy all of them under pandas 2, without copy-on-write)
+            df = getattr(renamed, table).copy(deep=False)
+            df[col] = categorical.cat.rename_categories(lambda x: mapping[x])
+            setattr(renamed, table, df)
+    return renamed
+
+
+def compaction_report(ocel, compact):
+    # Memory used by each table before and after the compaction
+    before = ocel_memory_usage(ocel)
+    after = ocel_memory_usage(compact)
+    report = {table: {'before': before[table], 'after': after[table], 'saved': before[table] - after[table]}
+              for table in before}
+    report['total'] = {key: sum(report[table][key] for table in before) for key in ['before', 'after', 'saved']}
+    return report
+
+
+def print_compaction_report(report):
+    for table, usage in report.items():
+        ratio = usage['after'] / usage['before'] if usage['before'] else 1.0
+        print(f"{table}: {usage['before']} -> {usage['after']} bytes ({usage['saved']} saved, {ratio:.1%} of the original)")
@@ -0,0 +1,222 @@
+# Declarative plan of the data model built by uploader2: the tables, foreign keys and process configurations it
+# should contain, derived from the generated dataframes without any API call.
+#
+# The plan is compared with the current state of the data model (read with one call per kind of item, and only
+# when the data model already exists), and only the missing items are created. Calls that do not depend on each
+# other are sent concurrently: first all the tables, then all the foreign keys and process configurations, which
+# need the IDs of the tables.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import stage
+from splitter import clean_name, table_columns
+
+
+def object_table_name(name):
+    return f"o_custom_{name}"
+
+
+def event_table_name(name):
+    return f"e_custom_{name}"
+
+
+def relationship_table_name(evt_name, obj_name):
+    return f"r_e_{evt_name}__{obj_name}"
+
+
+def object_key_table_name(name):
+    return f"k_o_custom_{name}"
+
+
+def event_key_table_name(name):
+    return f"k_e_custom_{name}"
+
+
+def direct_object_columns(columns, object_names):
+    # Columns of an event table holding the ID of a related object: named after the object type, or after the object
+    # type + '_Id' (the exact name wins). One lookup per column instead of a scan of every object type.
+    # 'columns': the column names of the event table. Returns {object type: column}, in the order of 'object_names'.
+    object_names = {name: i for i, name in enumerate(object_names)}
+    found = {}
+    for col in columns:
+        if col in object_names:
+            found[col] = col
+        elif col.endswith('_Id') and col[:-3] in object_names:
+            found.setdefault(col[:-3], col)
+    return {name: found[name] for name in sorted(found, key=object_names.get)}
+
+
+def exception_links(denormalization):
+    # (event name, object name) of the E2O links whose relationship table only holds the exceptions of an embedded
+    # object column: the links the denormalization plan embeds or stores as hybrid. A relationship table exists for
+    # such a link only when it is not 1:1, i.e. when splitter.link_decision made it hybrid.
+    return {(clean_name(evt_type), clean_name(obj_type))
+            for (evt_type, obj_type), decision in (denormalization or {}).get('e2o', {}).items()
+            if decision in ('embed', 'hybrid')}
+
+
+def plan_data_model(object_dataframes, event_dataframes, relationship_dataframes, process_configurations=None,
+                    key_tables=False, denormalization=None):
+    # process_configurations: optional list of dicts with the 'activity_table' and 'case_table' names, and the other
+    # arguments of create_process_configuration (e.g. 'case_id_column', 'activity_column', 'timestamp_column').
+    # key_tables: the IDs are uploaded as surrogate keys (see surrogate_keys), with one key table per object table
+    # and per event table holding the original IDs, referenced by the ID of its table.
+    # denormalization: the plan of denormalization_planner given to transform_ocel, if any (see exception_links).
+    # Foreign keys are (source table, target table, source column, target column) tuples.
+    tables = [object_table_name(name) for name in object_dataframes]
+    tables += [event_table_name(name) for name in event_dataframes]
+    tables += [relationship_table_name(evt_name, obj_name) for evt_name, obj_name in relationship_dataframes]
+    if key_tables:
+        tables += [object_key_table_name(name) for name in object_dataframes]
+        tables += [event_key_table_name(name) for name in event_dataframes]
+
+    # Embedded object columns of the event tables
+    # (only the column names are needed: the tables of LazyTables mappings are not built for this)
+    direct_columns = {evt_name: direct_object_columns(table_columns(event_dataframes, evt_name), object_dataframes)
+                      for evt_name in event_dataframes}
+
+    foreign_keys = []
+    # Relationship tables reference their event table and their object table. The exception table of a hybrid link
+    # (decided by the denormalization plan, whatever the columns of the event table are called) only references its
+    # event table: the embedded column already links the event table to the object table, and a second path between
+    # them would close a cycle.
+    hybrid_links = exception_links(denormalization)
+    for evt_name, obj_name in relationship_dataframes:
+        rel_table_name = relationship_table_name(evt_name, obj_name)
+        foreign_keys.append((event_table_name(evt_name), rel_table_name, "ID", "EventID"))
+        if (evt_name, obj_name) not in hybrid_links:
+            foreign_keys.append((object_table_name(obj_name), rel_table_name, "ID", "ID"))
+    # Event tables reference the object tables of their embedded object columns
+    for evt_name, columns in direct_columns.items():
+        for obj_name, column in columns.items():
+            foreign_keys.append((event_table_name(evt_name), object_table_name(obj_name), column, "ID"))
+    # Key tables map the surrogate key of every row back to its original ID
+    if key_tables:
+        for name in object_dataframes:
+            foreign_keys.append((object_table_name(name), object_key_table_name(name), "ID", "ID"))
+        for name in event_dataframes:
+            foreign_keys.append((event_table_name(name), event_key_table_name(name), "ID", "ID"))
+
+    return {
+        "tables": tables,
+        "foreign_keys": list(dict.fromkeys(foreign_keys)),
+        "process_configurations": list(process_configurations or []),
+    }
+
+
+def empty_model_state():
+    return {"tables": {}, "foreign_keys": set(), "process_configurations": set()}
+
+
+def read_model_state(data_model, plan=None):
+    # Current tables ({name: ID}), foreign keys and process configurations ((activity table, case table)) of the
+    # data model. With a plan, the kinds of items the plan does not have are not read.
+    state = empty_model_state()
+    with stage('read_model_state', table=data_model.name):
+        for table in data_model.get_tables():
+            state["tables"][table.name] = table.id
+        table_names = {table_id: name for name, table_id in state["tables"].items()}
+        if plan is None or plan["foreign_keys"]:
+            for fk in data_model.get_foreign_keys():
+                if fk.source_table_id not in table_names or fk.target_table_id not in table_names:
+                    continue
+                for column in fk.columns:
+                    state["foreign_keys"].add((table_names[fk.source_table_id], table_names[fk.target_table_id],
+                                               column.source_column_name, column.target_column_name))
+        if plan is None or plan["process_configurations"]:
+            for configuration in data_model.get_process_configurations():
+                state["process_configurations"].add((table_names.get(configuration.activity_table_id),
+                                                     table_names.get(configuration.case_table_id)))
+    return state
+
+
+def diff_plan(plan, state):
+    # Items of the plan missing from the data model
+    return {
+        "tables": [name for name in plan["tables"] if name not in state["tables"]],
+        "foreign_keys": [fk for fk in plan["foreign_keys"] if fk not in state["foreign_keys"]],
+        "process_configurations": [pc for pc in plan["process_configurations"]
+                                   if (pc["activity_table"], pc.get("case_table")) not in state["process_configurations"]],
+    }
+
+
+def _run_concurrently(function, items, max_workers):
+    # Call function(item) for every item with a bounded pool of threads; results in the order of the items.
+    # Every call is completed before the first error (if any) is raised.
+    if max_workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(function, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def apply_plan(data_model, diff, state, max_workers=8, verbose=True):
+    # Create the missing items of the diff in the data model, updating 'state' with the created ones.
+    # Returns a report with the number of created items and API calls, and the elapsed time.
+    start = time.perf_counter()
+
+    def add_table(table_name):
+        with stage('add_table', table=table_name):
+            table = data_model.add_table(table_name, table_name)
+        state["tables"][table_name] = table.id
+        if verbose:
+            print(f"Added table '{table_name}' to Data Model.")
+
+    def create_foreign_key(fk):
+        source_table_name, target_table_name, source_column, target_column = fk
+        with stage('create_foreign_key', table=target_table_name):
+            data_model.create_foreign_key(state["tables"][source_table_name], state["tables"][target_table_name],
+                                          [(source_column, target_column)])
+        state["foreign_keys"].add(fk)
+        if verbose:
+            print(f"Foreign key added between '{target_table_name}' and '{source_table_name}' "
+                  f"on ('{target_column}' -> '{source_column}').")
+
+    def create_process_configuration(pc):
+        arguments = {key: value for key, value in pc.items() if key not in ("activity_table", "case_table")}
+        case_table_id = state["tables"][pc["case_table"]] if pc.get("case_table") is not None else None
+        with stage('create_process_configuration', table=pc["activity_table"]):
+            data_model.create_process_configuration(activity_table_id=state["tables"][pc["activity_table"]],
+                                                    case_table_id=case_table_id, **arguments)
+        state["process_configurations"].add((pc["activity_table"], pc.get("case_table")))
+        if verbose:
+            print(f"Process configuration added for '{pc['activity_table']}'.")
+
+    # Tables first: the other items reference their IDs
+    _run_concurrently(add_table, diff["tables"], max_workers)
+    _run_concurrently(lambda item: item[0](item[1]),
+                      [(create_foreign_key, fk) for fk in diff["foreign_keys"]]
+                      + [(create_process_configuration, pc) for pc in diff["process_configurations"]],
+                      max_workers)
+
+    return {
+        "tables": len(diff["tables"]),
+        "foreign_keys": len(diff["foreign_keys"]),
+        "process_configurations": len(diff["process_configurations"]),
+        "calls": sum(len(items) for items in diff.values()),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+# Example usage: the data model of the bundled example log, planned and applied against a local fake data pool
+if __name__ == "__main__":
+    import pm4py
+    from fake_celonis import FakeDataPool
+    from splitter import transform_ocel
+
+    ocel = pm4py.read_ocel("tests/input_data/ocel/example_log.jsonocel")
+    object_dataframes, event_dataframes, relationship_dataframes, _ = transform_ocel(ocel)
+
+    plan = plan_data_model(object_dataframes, event_dataframes, relationship_dataframes)
+    for max_workers in [1, 8]:
+        data_pool = FakeDataPool(latency=0.01)
+        for table_name in plan["tables"]:
+            data_pool.tables[table_name] = None
+        data_model = data_pool.create_data_model("plan_example")
+        state = empty_model_state()
+        report = apply_plan(data_model, diff_plan(plan, state), state, max_workers=max_workers, verbose=False)
+        print(f"{report['tables']} tables, {report['foreign_keys']} foreign keys, {dict(data_model.calls)} calls, "
+              f"in {report['elapsed']:.2f}s with {max_workers} worker(s)")
+        # Applying the plan again is a no-op
+        print(f"Diff after applying: {diff_plan(plan, read_model_state(data_model, plan))}")
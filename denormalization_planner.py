@@ -0,0 +1,184 @@
+# Cost-based planner deciding how every link of an OCEL is stored: the E2O links (event type, object type) and, with
+# a lead object type, the O2O links (child object type -> lead object). A link is either:
+# - 'embed': a column of the event (child object) table, one object ID per event (object), with no extra table;
+# - 'table': a relationship table with one row per related (event, object) / (child, lead) pair, one more join;
+# - 'hybrid': a column for the events (child objects) related to exactly one object, and a relationship table with
+#   only the rows of the other ones, the exceptions, so a few outliers do not push the whole link into a table.
+#
+# Every link is measured in one grouped pass over the relations (rows, distinct keys and targets, share of 1:1 keys,
+# uploaded bytes of each form), and the form with the lowest cost is chosen: the uploaded bytes, plus 'join_cost'
+# bytes per extra table in the data model. Embedding is only possible for a 1:1 link, and the hybrid form only when
+# the 1:1 keys are at least 'min_one_to_one_share' of the keys. The plan is passed to splitter.transform_ocel
+# (denormalization=...), and its report explains every decision.
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from splitter import derive_lead_object_pairs, merge_lead_object_relations
+
+DEFAULT_JOIN_COST = 1024 * 1024
+DEFAULT_MIN_ONE_TO_ONE_SHARE = 0.95
+DEFAULT_NULL_CELL_BYTES = 1
+
+
+def _id_bytes(series):
+    # Uploaded size of every ID as text (its number of characters), 0 for missing IDs
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        lengths = np.append(series.cat.categories.astype(str).str.len().to_numpy(dtype=np.int64), 0)
+        return lengths[series.cat.codes.to_numpy()]
+    return series.astype(str).str.len().to_numpy(dtype=np.int64, na_value=0) * series.notna().to_numpy()
+
+
+def _measure_links(keys, sources, targets, source_bytes, target_bytes):
+    # Measure the links of a table of (link, source, target) rows ('keys': the link of every row, a dataframe of one
+    # or two columns). Returns one row per link: rows, keys (distinct sources), targets (distinct targets),
+    # one_to_one (sources with exactly one target), and the uploaded bytes of the relationship table (table_bytes),
+    # of the embedded targets of the 1:1 sources (embed_bytes) and of the rows of the other sources (exception_bytes).
+    link_columns = list(keys.columns)
+    rows = keys.assign(source=sources.to_numpy(), target=targets.to_numpy(), row_bytes=source_bytes + target_bytes,
+                       target_bytes=target_bytes)
+    per_source = rows.groupby(link_columns + ['source'], sort=False, observed=True).agg(
+        targets=('target', 'nunique'), rows=('row_bytes', 'size'), row_bytes=('row_bytes', 'sum'),
+        target_bytes=('target_bytes', 'first'))
+    one_to_one = per_source['targets'].eq(1)
+    per_source = pd.DataFrame({
+        'rows': per_source['rows'],
+        'keys': 1,
+        'one_to_one': one_to_one.astype(np.int64),
+        'table_bytes': per_source['row_bytes'],
+        'embed_bytes': per_source['target_bytes'].where(one_to_one, 0),
+        'exception_rows': per_source['rows'].where(~one_to_one, 0),
+        'exception_bytes': per_source['row_bytes'].where(~one_to_one, 0),
+    })
+    levels = list(range(len(link_columns)))
+    measures = per_source.groupby(level=levels, sort=False, observed=True).sum()
+    measures.insert(2, 'targets', rows.groupby(link_columns, sort=False, observed=True)['target'].nunique())
+    return measures
+
+
+def measure_e2o_links(ocel):
+    # One row per (event type, object type) pair of the relations; 'null_cells' are the events of the type without
+    # an embedded object (empty cells of the column)
+    relations = ocel.relations
+    if len(relations) == 0:
+        return pd.DataFrame()
+    with stage('measure_e2o_links', rows=len(relations)):
+        measures = _measure_links(relations[['ocel:activity', 'ocel:type']], relations['ocel:eid'],
+                                  relations['ocel:oid'], _id_bytes(relations['ocel:eid']),
+                                  _id_bytes(relations['ocel:oid']))
+        events = ocel.events['ocel:activity'].value_counts(sort=False)
+        measures['null_cells'] = events.reindex(measures.index.get_level_values(0)).fillna(0).to_numpy(
+            dtype=np.int64) - measures['one_to_one'].to_numpy()
+    return measures
+
+
+def measure_o2o_links(ocel, lead_object_type, o2o_chunk_size=None):
+    # One row per child object type of the lead object type (the (lead, child) pairs of transform_ocel);
+    # 'null_cells' are the objects of the type without an embedded lead object
+    relations = ocel.relations
+    with stage('measure_o2o_links', rows=len(relations)):
+        if o2o_chunk_size is not None:
+            pairs = derive_lead_object_pairs(relations, lead_object_type, o2o_chunk_size)
+        else:
+            pairs = merge_lead_object_relations(relations, lead_object_type)
+        if len(pairs) == 0:
+            return pd.DataFrame()
+        measures = _measure_links(pairs[['ocel:type']].rename(columns={'ocel:type': 'child_type'}),
+                                  pairs['OtherObjectID'], pairs['LeadObjectID'], _id_bytes(pairs['OtherObjectID']),
+                                  _id_bytes(pairs['LeadObjectID']))
+        objects = ocel.objects['ocel:type'].value_counts(sort=False)
+        measures['null_cells'] = objects.reindex(measures.index).fillna(0).to_numpy(
+            dtype=np.int64) - measures['one_to_one'].to_numpy()
+    return measures
+
+
+def _decide(m, join_cost, min_one_to_one_share, null_cell_bytes, key_name, target_name):
+    # Cost of every possible form of a link (measures 'm'), the chosen form and the reason
+    share = m['one_to_one'] / m['keys'] if m['keys'] else 0.0
+    column_bytes = m['embed_bytes'] + null_cell_bytes * max(0, m['null_cells'])
+    costs = {'table': m['table_bytes'] + join_cost}
+    if m['one_to_one'] == m['keys']:
+        costs['embed'] = column_bytes
+    elif share >= min_one_to_one_share and m['one_to_one'] > 0:
+        costs['hybrid'] = column_bytes + m['exception_bytes'] + join_cost
+    # Lowest cost; on a tie, the simplest form (embed, then table)
+    decision = min(['embed', 'table', 'hybrid'], key=lambda form: costs.get(form, np.inf))
+    uploaded = {'embed': column_bytes, 'table': m['table_bytes'],
+                'hybrid': column_bytes + m['exception_bytes']}[decision]
+
+    if decision == 'embed':
+        reason = (f"every {key_name} has exactly one {target_name}: a column of {column_bytes} bytes, "
+                  f"no extra table")
+    elif decision == 'hybrid':
+        reason = (f"{share:.1%} of the {key_name}s have exactly one {target_name}: a column and "
+                  f"{m['exception_rows']} exception row(s) upload {uploaded} bytes instead of {m['table_bytes']}")
+    elif 'embed' in costs:
+        reason = (f"1:1, but the column would have {m['null_cells']} empty cell(s) ({column_bytes} bytes): "
+                  f"the table ({m['table_bytes']} bytes + one join) is cheaper")
+    elif 'hybrid' in costs:
+        reason = (f"{share:.1%} of the {key_name}s have exactly one {target_name}, but the column and the "
+                  f"exceptions ({costs['hybrid'] - join_cost} bytes) are not smaller than the table")
+    else:
+        reason = (f"only {share:.1%} of the {key_name}s have exactly one {target_name} "
+                  f"(below {min_one_to_one_share:.0%}): relationship table")
+    joins = {'embed': 0, 'table': 1, 'hybrid': 1}[decision]
+    return decision, uploaded, joins, share, reason
+
+
+def plan_denormalization(ocel, lead_object_type=None, o2o_chunk_size=None, join_cost=DEFAULT_JOIN_COST,
+                         min_one_to_one_share=DEFAULT_MIN_ONE_TO_ONE_SHARE, null_cell_bytes=DEFAULT_NULL_CELL_BYTES):
+    # Plan the form of every E2O link (and of every O2O link of the lead object type, when given).
+    # join_cost: bytes one extra table (one more join in the data model) is worth; null_cell_bytes: uploaded bytes of
+    # an empty cell of an embedded column.
+    # Returns {'e2o': {(event type, object type): form}, 'o2o': {child object type: form}, 'report': dataframe with
+    # the measures, the chosen form, its uploaded bytes and joins, and the reason of every decision}.
+    plan = {'e2o': {}, 'o2o': {}}
+    report = []
+    links = [('e2o', measure_e2o_links(ocel), 'event', 'object')]
+    if lead_object_type is not None:
+        links.append(('o2o', measure_o2o_links(ocel, lead_object_type, o2o_chunk_size), 'child object',
+                      'lead object'))
+    for link, measures, key_name, target_name in links:
+        for key, m in zip(measures.index, measures.to_dict('records')):
+            decision, uploaded, joins, share, reason = _decide(m, join_cost, min_one_to_one_share, null_cell_bytes,
+                                                                key_name, target_name)
+            plan[link][key] = decision
+            source, target = key if link == 'e2o' else (key, lead_object_type)
+            report.append({'link': link, 'source': source, 'target': target, **m, 'one_to_one_share': share,
+                           'decision': decision, 'uploaded_bytes': uploaded, 'joins': joins, 'reason': reason})
+    plan['report'] = pd.DataFrame(report)
+    return plan
+
+
+def print_denormalization_report(plan):
+    report = plan['report']
+    if len(report) == 0:
+        print("No links to plan.")
+        return
+    for link, title in [('e2o', 'Event-object links'), ('o2o', 'Object-to-object links')]:
+        rows = report[report['link'] == link]
+        if len(rows) == 0:
+            continue
+        print(f"{title}:")
+        for row in rows.itertuples():
+            print(f"- {row.source} -> {row.target}: {row.decision} ({row.rows} rows, {row.keys} keys, "
+                  f"{row.one_to_one_share:.1%} 1:1, {row.uploaded_bytes} bytes instead of {row.table_bytes} as a "
+                  f"table): {row.reason}")
+    counts = report['decision'].value_counts()
+    print(f"{counts.get('embed', 0)} embedded, {counts.get('table', 0)} table(s), {counts.get('hybrid', 0)} hybrid; "
+          f"{report['uploaded_bytes'].sum()} bytes instead of {report['table_bytes'].sum()} with only tables, "
+          f"{report['joins'].sum()} extra table(s) instead of {len(report)}.")
+
+
+if __name__ == "__main__":
+    import pm4py
+    from splitter import transform_ocel
+
+    ocel = pm4py.read_ocel2("tests/input_data/ocel/ocel20_example.xmlocel")
+    plan = plan_denormalization(ocel, lead_object_type="Purchase Order")
+    print_denormalization_report(plan)
+    object_dfs, event_dfs, relationship_dfs, object_relationship_dfs = transform_ocel(
+        ocel, create_object_relations=True, lead_object_type="Purchase Order", denormalization=plan)
+    print(f"{len(event_dfs)} event tables, {len(relationship_dfs)} relationship tables, "
+          f"{len(object_relationship_dfs)} object relationship tables")
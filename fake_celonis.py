@@ -0,0 +1,187 @@
+# Local stand-in for the pycelonis data pool, used to exercise the uploaders offline
+
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+
+class FakeUploadError(Exception):
+    pass
+
+
+class FakeDataPool:
+    def __init__(self, latency=0.0, latency_per_row=0.0, failure_rate=0.0, seed=None, keep_data=True,
+                 max_rows_per_call=None):
+        # latency: seconds spent waiting for every API call, latency_per_row: additional seconds per uploaded row,
+        # failure_rate: probability that an upload call fails (after waiting),
+        # keep_data: keep a copy of the uploaded rows (otherwise only the columns are kept, e.g. for benchmarks),
+        # max_rows_per_call: calls sending more rows fail, like payloads over the size limit of the API
+        self.keep_data = keep_data
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.failure_rate = failure_rate
+        self.max_rows_per_call = max_rows_per_call
+        self.tables = {}
+        self.data_models = []
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _call(self, name, rows=0):
+        with self._lock:
+            self.calls[name] += 1
+            fails = self._random.random() < self.failure_rate
+        time.sleep(self.latency + self.latency_per_row * rows)
+        if fails:
+            raise FakeUploadError(f"simulated failure in {name}")
+        if self.max_rows_per_call is not None and rows > self.max_rows_per_call:
+            raise FakeUploadError(f"payload of {rows} rows too large in {name}")
+
+    def create_table(self, df, table_name, force=False, drop_if_exists=False, **kwargs):
+        self._call("create_table", len(df))
+        with self._lock:
+            if table_name in self.tables and not drop_if_exists:
+                raise FakeUploadError(f"table '{table_name}' already exists")
+            self.tables[table_name] = df.copy() if self.keep_data else df.iloc[:0].copy()
+        return FakeDataPoolTable(self, table_name)
+
+    def get_tables(self):
+        with self._lock:
+            return FakeCollection(FakeDataPoolTable(self, table_name) for table_name in self.tables)
+
+    def create_data_model(self, name):
+        self._call("create_data_model")
+        data_model = FakeDataModel(self, name)
+        with self._lock:
+            self.data_models.append(data_model)
+        return data_model
+
+    def get_data_models(self):
+        with self._lock:
+            return FakeCollection(self.data_models)
+
+
+class FakeCollection(list):
+    # List with the find-by-name lookup of the pycelonis collections
+    def find(self, name):
+        for item in self:
+            if item.name == name:
+                return item
+        return None
+
+
+class FakeDataPoolTable:
+    # Table of a FakeDataPool, supporting appends
+    def __init__(self, data_pool, name):
+        self.data_pool = data_pool
+        self.name = name
+
+    def append(self, df, **kwargs):
+        self.data_pool._call("append", len(df))
+        with self.data_pool._lock:
+            if self.name not in self.data_pool.tables:
+                raise FakeUploadError(f"table '{self.name}' not found in the data pool")
+            if self.data_pool.keep_data:
+                self.data_pool.tables[self.name] = pd.concat([self.data_pool.tables[self.name], df], ignore_index=True)
+
+
+class FakeDataModelTable:
+    def __init__(self, id, name, alias):
+        self.id = id
+        self.name = name
+        self.alias = alias
+
+
+class FakeForeignKeyColumn:
+    def __init__(self, source_column_name, target_column_name):
+        self.source_column_name = source_column_name
+        self.target_column_name = target_column_name
+
+
+class FakeForeignKey:
+    def __init__(self, id, source_table_id, target_table_id, columns):
+        self.id = id
+        self.source_table_id = source_table_id
+        self.target_table_id = target_table_id
+        self.columns = [FakeForeignKeyColumn(source, target) for source, target in columns]
+
+
+class FakeProcessConfiguration:
+    def __init__(self, id, activity_table_id, case_table_id, **kwargs):
+        self.id = id
+        self.activity_table_id = activity_table_id
+        self.case_table_id = case_table_id
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+class FakeDataModel:
+    # Data model of a FakeDataPool: API calls share the latency of the pool, and are counted both in the pool
+    # and in the data model (self.calls)
+    _ids = itertools.count(1)
+
+    def __init__(self, data_pool, name):
+        self.data_pool = data_pool
+        self.name = name
+        self.id = f"dm-{next(self._ids)}"
+        self.tables = {}
+        self.foreign_keys = []
+        self.process_configurations = []
+        self.reloads = 0
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        self.data_pool._call(name)
+
+    def add_table(self, table_name, alias=None):
+        self._call("add_table")
+        if table_name not in self.data_pool.tables:
+            raise FakeUploadError(f"table '{table_name}' not found in the data pool")
+        table = FakeDataModelTable(f"t-{next(self._ids)}", table_name, alias or table_name)
+        with self._lock:
+            self.tables[table.id] = table
+        return table
+
+    def get_tables(self):
+        self._call("get_tables")
+        with self._lock:
+            return FakeCollection(self.tables.values())
+
+    def create_foreign_key(self, source_table_id, target_table_id, columns):
+        self._call("create_foreign_key")
+        if source_table_id not in self.tables or target_table_id not in self.tables:
+            raise FakeUploadError("foreign key between unknown tables")
+        foreign_key = FakeForeignKey(f"fk-{next(self._ids)}", source_table_id, target_table_id, columns)
+        with self._lock:
+            self.foreign_keys.append(foreign_key)
+        return foreign_key
+
+    def get_foreign_keys(self):
+        self._call("get_foreign_keys")
+        with self._lock:
+            return FakeCollection(self.foreign_keys)
+
+    def create_process_configuration(self, activity_table_id=None, case_table_id=None, **kwargs):
+        self._call("create_process_configuration")
+        if activity_table_id not in self.tables or (case_table_id is not None and case_table_id not in self.tables):
+            raise FakeUploadError("process configuration of unknown tables")
+        configuration = FakeProcessConfiguration(f"pc-{next(self._ids)}", activity_table_id, case_table_id, **kwargs)
+        with self._lock:
+            self.process_configurations.append(configuration)
+        return configuration
+
+    def get_process_configurations(self):
+        self._call("get_process_configurations")
+        with self._lock:
+            return FakeCollection(self.process_configurations)
+
+    def reload(self):
+        self._call("reload")
+        self.reloads += 1
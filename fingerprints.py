@@ -0,0 +1,41 @@
+# Content fingerprints of the generated tables, and the local manifest used by the incremental uploads
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+def table_fingerprint(df):
+    # Fast content hash of a dataframe: column names and dtypes, plus the vectorized hash of every row (in order)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode('utf-8'))
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        # Unhashable cell values (e.g. lists): hash their string representation
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    # Load the manifest of a previous run, or an empty one:
+    # {"tables": {table name: fingerprint}, "data_models": {data model name: state of the data model}}
+    if path is not None and os.path.exists(path):
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    else:
+        manifest = {}
+    manifest.setdefault('tables', {})
+    manifest.setdefault('data_models', {})
+    return manifest
+
+
+def save_manifest(path, manifest):
+    # Write the manifest atomically, so an interrupted run never leaves a truncated file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
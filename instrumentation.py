@@ -0,0 +1,157 @@
+# Per-stage instrumentation of the transform / upload pipeline.
+#
+# Stages are wrapped in 'with stage(name, table=...) as s:' blocks. When a sink is installed, every block emits one
+# structured record (stage, table, rows, bytes, duration, RSS) to the sink; when no sink is installed, stage() returns
+# a shared no-op object, so the instrumentation costs one function call per block.
+#
+# A sink is any callable taking the record (a dict). Sinks can be installed with set_sink(), or by setting the
+# OCEL_CONNECTOR_TRACE environment variable to the path of a JSON lines file.
+
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+TRACE_ENVIRONMENT_VARIABLE = "OCEL_CONNECTOR_TRACE"
+
+_sink = None
+
+
+def current_rss():
+    # Resident set size of the process in bytes (peak RSS where the current one is not available)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def dataframe_bytes(df):
+    # Shallow memory usage of a dataframe (object columns are counted as references, to keep it cheap)
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class _Stage:
+    __slots__ = ("record", "start")
+
+    def __init__(self, name, table, rows, bytes):
+        self.record = {"stage": name, "table": table, "rows": rows, "bytes": bytes}
+
+    def update(self, df=None, rows=None, bytes=None):
+        # Attach the size of the processed table (or explicit rows / bytes) to the record
+        if df is not None:
+            self.record["rows"] = len(df)
+            self.record["bytes"] = dataframe_bytes(df)
+        if rows is not None:
+            self.record["rows"] = rows
+        if bytes is not None:
+            self.record["bytes"] = bytes
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record["duration"] = time.perf_counter() - self.start
+        self.record["rss"] = current_rss()
+        self.record["timestamp"] = time.time()
+        if exc_type is not None:
+            self.record["error"] = f"{exc_type.__name__}: {exc_value}"
+        sink = _sink
+        if sink is not None:
+            sink(self.record)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def update(self, df=None, rows=None, bytes=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name, table=None, rows=None, bytes=None):
+    # Context manager measuring a stage of the pipeline (no-op when no sink is installed)
+    if _sink is None:
+        return _NO_STAGE
+    return _Stage(name, table, rows, bytes)
+
+
+def set_sink(sink):
+    # Install the sink receiving the records (None disables the instrumentation). Returns the previous sink.
+    global _sink
+    previous = _sink
+    _sink = sink
+    return previous
+
+
+def is_enabled():
+    return _sink is not None
+
+
+def json_lines_sink(path):
+    # Sink appending each record as a JSON line to the given file
+    lock = threading.Lock()
+
+    def sink(record):
+        line = json.dumps(record, default=str) + "\n"
+        with lock:
+            with open(path, "a") as f:
+                f.write(line)
+
+    return sink
+
+
+def logger_sink(logger=None, level=logging.INFO):
+    # Sink sending each record to a logger, as a JSON message
+    logger = logger or logging.getLogger("ocel20_celonis_connector")
+
+    def sink(record):
+        logger.log(level, json.dumps(record, default=str))
+
+    return sink
+
+
+def list_sink(records):
+    # Sink collecting the records in the given list (e.g. to summarise a run)
+    lock = threading.Lock()
+
+    def sink(record):
+        with lock:
+            records.append(record)
+
+    return sink
+
+
+def summarize(records):
+    # Total duration, count and rows per stage, slowest stage first
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record["stage"], {"stage": record["stage"], "count": 0, "duration": 0.0, "rows": 0})
+        total["count"] += 1
+        total["duration"] += record["duration"]
+        total["rows"] += record["rows"] or 0
+    return sorted(totals.values(), key=lambda x: x["duration"], reverse=True)
+
+
+if os.environ.get(TRACE_ENVIRONMENT_VARIABLE):
+    set_sink(json_lines_sink(os.environ[TRACE_ENVIRONMENT_VARIABLE]))
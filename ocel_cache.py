@@ -0,0 +1,258 @@
+# On-disk cache of parsed OCEL logs, so that reruns on the same file skip the pm4py parse.
+#
+# Every table of the OCEL object is stored column by column in .npy files: numeric and timestamp columns as their
+# raw values, string columns dictionary-encoded (integer codes + the distinct values as one array). String columns are
+# the ones of a string dtype, and the object columns holding only strings (the string columns of pandas < 3), with
+# their missing values. On a cache hit the .npy files are memory-mapped copy-on-write: numeric and timestamp columns
+# are backed by the mapped files (in-place writes go to private memory, never to the cache), and the string columns are
+# rebuilt from their codes with one take on the distinct values. Columns of any other dtype are pickled.
+#
+# Entries are keyed by the content hash of the file (and the reader), and an index records the path, size and
+# modification time of every cached file, so the content is only hashed again when the file changed on disk. The
+# total size of the cache is bounded: the least recently used entries are evicted first.
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+DEFAULT_CACHE_DIR = '.ocel_cache'
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3
+
+# Tables of the OCEL object that are cached
+OCEL_TABLES = ['events', 'objects', 'relations', 'o2o', 'e2e', 'object_changes']
+
+# Version of the layout of the cached files, part of the key of every entry (entries of another layout are not read)
+CACHE_FORMAT = 2
+
+
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reader_key(reader):
+    return f"{getattr(reader, '__module__', '')}.{getattr(reader, '__qualname__', repr(reader))}"
+
+
+def _load_index(cache_dir):
+    path = os.path.join(cache_dir, 'index.json')
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            index = json.load(f)
+    else:
+        index = {}
+    index.setdefault('files', {})
+    index.setdefault('entries', {})
+    return index
+
+
+def _save_index(cache_dir, index):
+    # Write atomically, so an interrupted run never leaves a truncated index
+    path = os.path.join(cache_dir, 'index.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+# Marker of the object columns that are not string columns
+_NOT_STRINGS = object()
+
+
+def _string_missing_value(series):
+    # Object column holding only strings and one kind of missing value: that missing value (None or NaN).
+    # Returns _NOT_STRINGS when the column holds anything else (other types, no value at all, mixed missing values).
+    if pd.api.types.infer_dtype(series, skipna=True) != 'string':
+        return _NOT_STRINGS
+    values = series.to_numpy()
+    missing_types = {type(value) for value in values[pd.isna(values)]}
+    if not missing_types or missing_types == {type(None)}:
+        return None
+    if missing_types == {float}:
+        return np.nan
+    return _NOT_STRINGS
+
+
+def _save_strings(path, series):
+    # Dictionary encoding: the code of every row (-1 when missing) and the distinct strings in one array
+    codes, uniques = pd.factorize(series)
+    code_dtype = next(dtype for dtype in [np.int8, np.int16, np.int32, np.int64] if len(uniques) < np.iinfo(dtype).max)
+    np.save(path + '.npy', codes.astype(code_dtype))
+    np.save(path + '.values.npy', np.asarray(uniques, dtype=object), allow_pickle=True)
+
+
+def _load_strings(path, codes, missing_value):
+    # Strings of the rows: the distinct strings taken at the codes, with the missing value appended for the code -1
+    uniques = np.load(path + '.values.npy', allow_pickle=True)
+    return np.append(uniques, np.array([missing_value], dtype=object)).take(codes)
+
+
+def _save_table(directory, table, df):
+    # Store the columns of the dataframe; returns the metadata needed to load them back
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df.iloc[:, i]
+        path = os.path.join(directory, f"{table}.{i}")
+        missing_value = _string_missing_value(series) if series.dtype == object else _NOT_STRINGS
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            np.save(path + '.npy', series.to_numpy())
+            columns.append((col, 'numpy', series.dtype))
+        elif isinstance(series.dtype, pd.DatetimeTZDtype):
+            np.save(path + '.npy', series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy())
+            columns.append((col, 'datetime_tz', series.dtype))
+        elif isinstance(series.dtype, pd.StringDtype):
+            _save_strings(path, series)
+            columns.append((col, 'string', series.dtype))
+        elif missing_value is not _NOT_STRINGS:
+            _save_strings(path, series)
+            columns.append((col, 'object_string', missing_value))
+        else:
+            with open(path + '.pkl', 'wb') as f:
+                pickle.dump(series.array, f, protocol=pickle.HIGHEST_PROTOCOL)
+            columns.append((col, 'pickle', series.dtype))
+    index = None if df.index.equals(pd.RangeIndex(len(df))) else df.index
+    return {"columns": columns, "index": index, "rows": len(df)}
+
+
+def _load_table(directory, table, meta):
+    columns = {}
+    for i, (col, kind, dtype) in enumerate(meta["columns"]):
+        path = os.path.join(directory, f"{table}.{i}")
+        # Copy-on-write mapping (empty arrays cannot be mapped)
+        mmap_mode = 'c' if meta["rows"] else None
+        if kind == 'numpy':
+            values = np.load(path + '.npy', mmap_mode=mmap_mode)
+        elif kind == 'datetime_tz':
+            values = pd.Series(np.load(path + '.npy', mmap_mode=mmap_mode)).dt.tz_localize('UTC')
+            values = values.dt.tz_convert(dtype.tz).array
+        elif kind == 'string':
+            values = pd.array(_load_strings(path, np.load(path + '.npy', mmap_mode=mmap_mode), None), dtype=dtype)
+        elif kind == 'object_string':
+            # The dtype field holds the missing value of the column (object dtype kept: pandas 3 would infer str)
+            values = pd.Series(_load_strings(path, np.load(path + '.npy', mmap_mode=mmap_mode), dtype), dtype=object,
+                               copy=False)
+        else:
+            with open(path + '.pkl', 'rb') as f:
+                # Keep the dtype (e.g. object columns holding strings would be inferred as str)
+                values = pd.Series(pickle.load(f), dtype=dtype, copy=False)
+        columns[i] = values
+    df = pd.DataFrame(columns, index=meta["index"] if meta["index"] is not None else pd.RangeIndex(meta["rows"]),
+                      copy=False)
+    df.columns = pd.Index([col for col, _, _ in meta["columns"]])
+    return df
+
+
+def save_ocel(directory, ocel):
+    # Store the tables of the OCEL object in the directory (the other attributes, e.g. globals, are pickled)
+    os.makedirs(directory, exist_ok=True)
+    meta = {"tables": {}, "attributes": {}}
+    for table in OCEL_TABLES:
+        df = getattr(ocel, table, None)
+        if df is not None:
+            meta["tables"][table] = _save_table(directory, table, df)
+    for attribute in ['globals', 'parameters']:
+        meta["attributes"][attribute] = getattr(ocel, attribute, None)
+    with open(os.path.join(directory, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_ocel(directory):
+    from pm4py.objects.ocel.obj import OCEL
+
+    with open(os.path.join(directory, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    tables = {table: _load_table(directory, table, table_meta) for table, table_meta in meta["tables"].items()}
+    return OCEL(**tables, **meta["attributes"])
+
+
+def _evict(cache_dir, index, max_bytes, keep):
+    # Remove the least recently used entries until the cache fits in max_bytes (the entry in use is kept)
+    entries = index["entries"]
+    total = sum(entry["bytes"] for entry in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k]["last_access"]):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        total -= entries[key]["bytes"]
+        shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+        del entries[key]
+    # Forget the files whose entry is gone
+    index["files"] = {k: v for k, v in index["files"].items() if v["entry"] in entries}
+
+
+def read_ocel_cached(file_path, reader=None, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    # Read the OCEL file with 'reader' (default: pm4py.read_ocel2), or load it from the cache when the same content
+    # was already parsed by the same reader. Numeric and timestamp columns of a cached log are memory-mapped
+    # copy-on-write: writes to them never reach the cached files.
+    if reader is None:
+        import pm4py
+        reader = pm4py.read_ocel2
+
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _load_index(cache_dir)
+    file_key = f"{os.path.abspath(file_path)}|{_reader_key(reader)}"
+    stat = os.stat(file_path)
+
+    # The content is only hashed again when the size or the modification time changed
+    known = index["files"].get(file_key)
+    if (known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns
+            and known.get("format") == CACHE_FORMAT):
+        entry_key = known["entry"]
+    else:
+        with stage('hash_file', table=file_path):
+            content_hash = file_hash(file_path)
+        entry_key = hashlib.blake2b(f"{content_hash}|{_reader_key(reader)}|{CACHE_FORMAT}".encode('utf-8'),
+                                    digest_size=16).hexdigest()
+    entry_dir = os.path.join(cache_dir, entry_key)
+
+    if entry_key in index["entries"] and os.path.exists(os.path.join(entry_dir, 'meta.pkl')):
+        with stage('load_cached_ocel', table=file_path):
+            ocel = load_ocel(entry_dir)
+    else:
+        with stage('parse_ocel', table=file_path):
+            ocel = reader(file_path)
+        # Write the entry in a temporary directory first, so an interrupted run never leaves a partial entry
+        with stage('save_cached_ocel', table=file_path):
+            tmp_dir = entry_dir + '.tmp'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            save_ocel(tmp_dir, ocel)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        index["entries"][entry_key] = {"bytes": _directory_size(entry_dir)}
+
+    index["files"][file_key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "entry": entry_key,
+                                "format": CACHE_FORMAT}
+    index["entries"][entry_key]["last_access"] = time.time()
+    _evict(cache_dir, index, max_bytes, keep=entry_key)
+    _save_index(cache_dir, index)
+    return ocel
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "tests/input_data/ocel/ocel20_example.xmlocel"
+    for run in ["first run (parse)", "second run (cache)"]:
+        start = time.perf_counter()
+        ocel = read_ocel_cached(file_path)
+        print(f"{run}: {time.perf_counter() - start:.2f}s, {len(ocel.events)} events, {len(ocel.objects)} objects")
@@ -0,0 +1,176 @@
+# Loader of the flattened OCEL CSV format: one row per event, and one 'ocel:type:<type>' column per object type
+# holding the IDs of the related objects as a stringified list, e.g. "['880001','880004']".
+#
+# pm4py.read_ocel_csv parses every list cell with ast.literal_eval in a Python loop. Here the cells are parsed with
+# vectorized string operations: they are split on the commas and exploded into the relations table at once. Only the
+# cells that are not plain lists of IDs (e.g. IDs containing commas or quotes) fall back to ast.literal_eval.
+
+import ast
+import re
+
+import numpy as np
+import pandas as pd
+from pm4py.objects.ocel.obj import OCEL
+from pm4py.objects.ocel.util import ocel_consistency
+
+from instrumentation import stage
+
+OBJECT_TYPE_PREFIX = 'ocel:type:'
+
+def _parse_list(value):
+    # Same as the pm4py importer: the list in the cell, or no objects when it cannot be parsed
+    try:
+        parsed = ast.literal_eval(value)
+    except (SyntaxError, ValueError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+# Vectorized string functions of numpy (its variable-width string dtype and np.strings.slice need numpy >= 2.3). With
+# an older numpy, the same operations go through the pandas string methods of an object array.
+NUMPY_STRINGS = hasattr(np, 'strings') and hasattr(np.strings, 'slice') and hasattr(np.dtypes, 'StringDType')
+
+
+def _string_array(values):
+    return np.array(values, dtype=np.dtypes.StringDType() if NUMPY_STRINGS else object)
+
+
+def _startswith(values, prefix):
+    if NUMPY_STRINGS:
+        return np.strings.startswith(values, prefix)
+    return pd.Series(values, dtype=object).str.startswith(prefix).to_numpy(dtype=bool)
+
+
+def _endswith(values, suffix):
+    if NUMPY_STRINGS:
+        return np.strings.endswith(values, suffix)
+    return pd.Series(values, dtype=object).str.endswith(suffix).to_numpy(dtype=bool)
+
+
+def _replace(values, old, new):
+    if NUMPY_STRINGS:
+        return np.strings.replace(values, old, new)
+    return pd.Series(values, dtype=object).str.replace(old, new, regex=False).to_numpy(dtype=object)
+
+
+def _count(values, sub):
+    if NUMPY_STRINGS:
+        return np.strings.count(values, sub)
+    return pd.Series(values, dtype=object).str.count(re.escape(sub)).to_numpy(dtype=np.int64)
+
+
+def _slice(values, start, stop):
+    if NUMPY_STRINGS:
+        return np.strings.slice(values, start, stop)
+    return pd.Series(values, dtype=object).str.slice(start, stop).to_numpy(dtype=object)
+
+
+def parse_object_lists(cells):
+    # Explode a column of stringified lists into a series of object IDs (as strings), indexed by the row of the cell,
+    # in the order of the lists. Cells not starting with '[' (blank, NaN) have no objects.
+    # The string operations run on a numpy string array; the items of all the plain lists of single-quoted IDs
+    # ("['a','b']" or "['a', 'b']") are split at once, by joining the lists and splitting the result on "','".
+    values = _string_array(cells.to_numpy(dtype=object, na_value=''))
+    is_list = _startswith(values, '[') & (values != '[]')
+    index = cells.index.to_numpy()[is_list]
+    values = values[is_list]
+
+    # A list is plain when its quotes and commas are exactly the delimiters of its items
+    plain_values = _replace(values, "', '", "','")
+    n_items = _count(plain_values, "','") + 1
+    plain = (_startswith(plain_values, "['") & _endswith(plain_values, "']")
+             & (_count(plain_values, "'") == 2 * n_items)
+             & (_count(plain_values, ",") == n_items - 1))
+    joined = "','".join(_slice(plain_values[plain], 2, -2).tolist())
+    if "\\" in joined or "\n" in joined:
+        # Escapes and line breaks are left to the literal parser
+        plain &= (_count(plain_values, "\\") == 0) & (_count(plain_values, "\n") == 0)
+        joined = "','".join(_slice(plain_values[plain], 2, -2).tolist())
+    items = joined.split("','") if plain.any() else []
+    items = pd.Series(items, index=np.repeat(index[plain], n_items[plain]), dtype=str)
+
+    if not plain.all():
+        # Lists the vectorized path cannot split safely
+        others = pd.Series(values[~plain].tolist(), index=index[~plain], dtype=object)
+        others = others.map(_parse_list).explode().dropna().astype(str)
+        items = pd.concat([items, others]).sort_index(kind='stable')
+    return items[items != '']
+
+
+def get_ocel_from_flattened_table(table, objects=None):
+    # Build the OCEL (events, objects, relations) from the flattened table, as pm4py.read_ocel_csv does:
+    # events sorted by timestamp, relations in event order (then column order, then list order) sorted by timestamp
+    object_type_columns = [col for col in table.columns if col.startswith(OBJECT_TYPE_PREFIX)]
+    event_columns = [col for col in table.columns if not col.startswith(OBJECT_TYPE_PREFIX)]
+    table = table.reset_index(drop=True)
+    timestamps = pd.to_datetime(table['ocel:timestamp'])
+
+    # Explode the lists of every object type column, then order the relations by row, column and list position
+    rows = []
+    columns = []
+    object_ids = []
+    for i, col in enumerate(object_type_columns):
+        with stage('parse_object_lists', table=col, rows=len(table)):
+            items = parse_object_lists(table[col])
+        rows.append(items.index.to_numpy(dtype=np.int64))
+        columns.append(np.full(len(items), i, dtype=np.int64))
+        object_ids.append(items.to_numpy(dtype=object))
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.array([], dtype=np.int64)
+    object_ids = np.concatenate(object_ids) if object_ids else np.array([], dtype=object)
+    order = np.lexsort((columns, rows))
+    rows, columns, object_ids = rows[order], columns[order], object_ids[order]
+    object_types = np.array([col[len(OBJECT_TYPE_PREFIX):] for col in object_type_columns], dtype=object)
+
+    if objects is None:
+        # Distinct objects of every type (types in column order, objects in order of first appearance)
+        objects = pd.DataFrame({
+            'column': columns,
+            'ocel:type': pd.Series(object_types[columns], dtype=str).array,
+            'ocel:oid': pd.Series(object_ids, dtype=str).array,
+        }).drop_duplicates(['ocel:type', 'ocel:oid']).sort_values('column', kind='stable')
+        objects = objects[['ocel:type', 'ocel:oid']].reset_index(drop=True)
+
+    relations = pd.DataFrame({
+        'ocel:eid': table['ocel:eid'].to_numpy()[rows],
+        'ocel:activity': table['ocel:activity'].to_numpy()[rows],
+        'ocel:timestamp': timestamps.array.take(rows),
+        'ocel:oid': pd.Series(object_ids, dtype=str).array,
+        'ocel:type': pd.Series(object_types[columns], dtype=str).array,
+    })
+    relations['ocel:eid'] = relations['ocel:eid'].astype(table['ocel:eid'].dtype)
+    relations['ocel:activity'] = relations['ocel:activity'].astype(table['ocel:activity'].dtype)
+    relations = relations.sort_values('ocel:timestamp', kind='stable')
+
+    events = table[event_columns].copy()
+    events['ocel:timestamp'] = timestamps
+    events = events.sort_values('ocel:timestamp', kind='stable')
+
+    return OCEL(events=events, objects=objects, relations=relations)
+
+
+def read_ocel_csv(file_path, objects_path=None, encoding='utf-8'):
+    # Read a flattened OCEL CSV file (and optionally the CSV of the objects), like pm4py.read_ocel_csv
+    with stage('read_csv', table=file_path) as s:
+        table = pd.read_csv(file_path, index_col=False, dtype=str, encoding=encoding)
+        s.update(df=table)
+    objects = None
+    if objects_path is not None:
+        objects = pd.read_csv(objects_path, index_col=False, dtype=str, encoding=encoding)
+    with stage('flattened_table_to_ocel', table=file_path, rows=len(table)):
+        ocel = get_ocel_from_flattened_table(table, objects)
+    del table
+    return ocel_consistency.apply(ocel)
+
+
+if __name__ == "__main__":
+    from splitter import transform_ocel
+
+    ocel = read_ocel_csv("tests/input_data/ocel/ocel_order_simulated.csv")
+    print(f"{len(ocel.events)} events, {len(ocel.objects)} objects, {len(ocel.relations)} relations")
+
+    object_dfs, event_dfs, relationship_dfs, object_relationship_dfs = transform_ocel(
+        ocel, create_object_relations=True, lead_object_type='orders'
+    )
+    for name, df in list(object_dfs.items()) + list(event_dfs.items()):
+        print(f"{name}: {len(df)} rows, columns {list(df.columns)}")
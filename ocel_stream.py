@@ -0,0 +1,450 @@
+# Streaming reader of OCEL files (OCEL 1.0 / 2.0 JSON, OCEL 2.0 XML) feeding the splitter.
+#
+# pm4py.read_ocel / read_ocel2 load the whole document (the parsed JSON or the XML tree) in memory before building the
+# events, objects and relations tables, which transform_ocel then splits per type. Here the file is parsed
+# incrementally: every event and object is sent to the rows of its type as soon as it is read, and the rows are turned
+# into dataframes every 'chunk_size' records, so the parsed document is never held in memory and the peak memory
+# follows the size of the per-type tables. The partitions are then passed to splitter.transform_partitions.
+#
+# The tables are the same as transform_ocel(pm4py.read_ocel(...)): events sorted by timestamp, relations to unknown
+# objects dropped, events and objects without relations dropped, initial values of the OCEL 2.0 object attributes.
+# The O2O relationships, the qualifiers and the object changes are skipped, since the splitter does not use them.
+
+import gzip
+import json
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from splitter import transform_partitions
+
+DEFAULT_CHUNK_SIZE = 100000
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _JsonStream:
+    # Incremental reader of a JSON document: containers are walked one item at a time, and values are decoded with the
+    # standard JSON decoder from a buffer refilled from the file
+    def __init__(self, f, read_size=1 << 20):
+        self.f = f
+        self.read_size = read_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read_more(self, size):
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        # Drop the consumed part of the buffer
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        # Next non-whitespace character (None at the end of the document)
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more(self.read_size):
+                return None
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character is None or character not in characters:
+            raise ValueError(f"Invalid JSON document: expected one of '{characters}', found {character!r}")
+        self.pos += 1
+        return character
+
+    def decode_value(self):
+        # Decode the value at the current position (a value can also be skipped this way)
+        self._peek()
+        size = self.read_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value ending with the buffer (e.g. a number) may continue in the file
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Growing reads, so that decoding a large value stays linear
+            self._read_more(size)
+            size *= 2
+
+    def iter_object(self):
+        # Iterate over the keys of the object at the current position. The value of every key must be consumed
+        # (decode_value, iter_object or iter_array) before the next key is requested.
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        # Iterate over the items of the array at the current position, each one to be consumed like above
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self._expect(",]") == "]":
+                return
+
+
+def _parse_timestamp(value):
+    # Timestamp of an attribute value (naive timestamps are UTC, as in pm4py), or the value when it is not a date
+    try:
+        return pd.to_datetime(value, utc=True, format='ISO8601').to_pydatetime()
+    except (TypeError, ValueError):
+        return value
+
+
+def _parse_json_attribute(value, attribute_type):
+    # Value of an OCEL 2.0 JSON attribute, according to the type declared for it (same rules as pm4py)
+    if value is None or (isinstance(value, str) and value.strip().lower() == "null"):
+        return None
+    attribute_type = "" if attribute_type is None else str(attribute_type).lower()
+    if "date" in attribute_type or "time" in attribute_type:
+        return _parse_timestamp(value)
+    if "float" in attribute_type or "double" in attribute_type:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
+    if "int" in attribute_type:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    if "bool" in attribute_type:
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        return bool(value)
+    return value
+
+
+def _parse_xml_attribute(text, attribute_type):
+    # Value of an OCEL 2.0 XML attribute, according to the type declared for it (same rules as pm4py)
+    attribute_type = attribute_type.lower()
+    if "float" in attribute_type:
+        return 0 if text == "null" else float(text)
+    if "date" in attribute_type:
+        return _parse_timestamp(text)
+    return str(text)
+
+
+def _attribute_types(types):
+    # {type name: {attribute name: attribute type}} from the objectTypes / eventTypes of an OCEL 2.0 JSON file
+    return {t["name"]: {a["name"]: a["type"] for a in t.get("attributes", [])} for t in types}
+
+
+def _iter_json_records(f):
+    # Records ('object', id, type, attributes) and ('event', id, activity, timestamp, attributes, object ids)
+    # of an OCEL 1.0 or OCEL 2.0 JSON document, in document order
+    stream = _JsonStream(f)
+    object_attribute_types = {}
+    event_attribute_types = {}
+    for key in stream.iter_object():
+        if key == "ocel:objects":
+            for oid in stream.iter_object():
+                obj = stream.decode_value()
+                yield "object", oid, obj["ocel:type"], obj["ocel:ovmap"]
+        elif key == "ocel:events":
+            for eid in stream.iter_object():
+                evt = stream.decode_value()
+                yield ("event", eid, evt["ocel:activity"], evt["ocel:timestamp"], evt["ocel:vmap"],
+                       list(dict.fromkeys(evt["ocel:omap"])))
+        elif key == "objectTypes":
+            object_attribute_types = _attribute_types(stream.decode_value())
+        elif key == "eventTypes":
+            event_attribute_types = _attribute_types(stream.decode_value())
+        elif key == "objects":
+            for _ in stream.iter_array():
+                obj = stream.decode_value()
+                types = object_attribute_types.get(obj["type"], {})
+                attributes = {}
+                for attribute in obj.get("attributes") or []:
+                    # Later values of an attribute are object changes: keep the initial one
+                    if attribute["name"] not in attributes:
+                        attributes[attribute["name"]] = _parse_json_attribute(attribute["value"],
+                                                                              types.get(attribute["name"]))
+                yield "object", obj["id"], obj["type"], attributes
+        elif key == "events":
+            for _ in stream.iter_array():
+                evt = stream.decode_value()
+                types = event_attribute_types.get(evt["type"], {})
+                attributes = {a["name"]: _parse_json_attribute(a["value"], types.get(a["name"]))
+                              for a in evt.get("attributes") or []}
+                oids = list(dict.fromkeys(r["objectId"] for r in evt.get("relationships") or []))
+                yield "event", evt["id"], evt["type"], evt["time"], attributes, oids
+        else:
+            stream.decode_value()
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _iter_xml_records(f):
+    # Same records as _iter_json_records, from an OCEL 2.0 XML document. Every element is released once handled.
+    object_attribute_types = {}
+    event_attribute_types = {}
+    path = []
+    for action, elem in ET.iterparse(f, events=("start", "end")):
+        if action == "start":
+            path.append(elem)
+            continue
+        path.pop()
+        tag = _local_name(elem.tag)
+        if len(path) == 2 and tag in ("object-type", "event-type"):
+            types = object_attribute_types if tag == "object-type" else event_attribute_types
+            types[elem.get("name")] = {a.get("name"): a.get("type") for a in elem.iter() if _local_name(a.tag) == "attribute"}
+        elif len(path) == 2 and tag == "object":
+            types = object_attribute_types.get(elem.get("type"), {})
+            attributes = {}
+            for child in elem:
+                if _local_name(child.tag) == "attributes":
+                    for attribute in child:
+                        # Later values of an attribute are object changes: keep the initial one
+                        if attribute.get("name") not in attributes:
+                            attributes[attribute.get("name")] = _parse_xml_attribute(
+                                attribute.text, types.get(attribute.get("name"), "string"))
+            yield "object", elem.get("id"), elem.get("type"), attributes
+        elif len(path) == 2 and tag == "event":
+            types = event_attribute_types.get(elem.get("type"), {})
+            attributes = {}
+            oids = []
+            for child in elem:
+                if _local_name(child.tag) == "attributes":
+                    for attribute in child:
+                        attributes[attribute.get("name")] = _parse_xml_attribute(
+                            attribute.text, types.get(attribute.get("name"), "string"))
+                elif _local_name(child.tag) == "objects":
+                    oids.extend(relationship.get("object-id") for relationship in child)
+            yield "event", elem.get("id"), elem.get("type"), elem.get("time"), attributes, oids
+        elif len(path) != 1:
+            continue
+        # Release the handled element
+        elem.clear()
+        if path:
+            path[-1].remove(elem)
+
+
+def _common_dtype(dtypes, has_missing):
+    # dtype that pandas infers for a column holding the values of chunks with the given dtypes
+    # (plus missing values if has_missing), as when the importer builds the whole table at once
+    dtypes = set(dtypes)
+    if not dtypes:
+        return np.dtype(object)
+    if len(dtypes) == 1:
+        dtype = dtypes.pop()
+        if not has_missing or dtype.kind not in "iub":
+            return dtype
+        return np.dtype("float64") if dtype.kind in "iu" else np.dtype(object)
+    if all(dtype.kind in "iuf" for dtype in dtypes):
+        if has_missing or any(dtype.kind == "f" for dtype in dtypes):
+            return np.dtype("float64")
+        return np.dtype("int64")
+    return np.dtype(object)
+
+
+class _PartitionBuilder:
+    # Rows of a table (events or objects) collected per type, converted into dataframes chunk by chunk.
+    # The index of every row is its position in the file, like in the table of the pm4py importer.
+    def __init__(self):
+        self.rows = {}
+        self.positions = {}
+        self.chunks = {}
+        self.attributes = {}
+        self.count = 0
+        self.pending = 0
+
+    def add(self, type_name, row, attributes):
+        # Add a row (base columns) with its attributes, return its position
+        position = self.count
+        self.count += 1
+        for key in attributes:
+            if key not in self.attributes:
+                self.attributes[key] = None
+        row.update(attributes)
+        self.rows.setdefault(type_name, []).append(row)
+        self.positions.setdefault(type_name, []).append(position)
+        self.pending += 1
+        return position
+
+    def flush(self, convert=None):
+        for type_name, rows in self.rows.items():
+            chunk = pd.DataFrame(rows, index=self.positions[type_name])
+            if convert is not None:
+                chunk = convert(chunk)
+            self.chunks.setdefault(type_name, []).append(chunk)
+        self.rows = {}
+        self.positions = {}
+        self.pending = 0
+
+    def partitions(self):
+        # One dataframe per type, with the dtypes the columns would have in the whole table.
+        # The columns follow the order of first appearance in the file (base columns first).
+        dtypes = {}
+        non_null = {}
+        for chunks in self.chunks.values():
+            for chunk in chunks:
+                counts = chunk.notna().sum()
+                for col in chunk.columns:
+                    non_null[col] = non_null.get(col, 0) + int(counts[col])
+                    if counts[col] > 0:
+                        dtypes.setdefault(col, []).append(chunk[col].dtype)
+        partitions = {}
+        for type_name, chunks in self.chunks.items():
+            df = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+            base_columns = [col for col in df.columns if col.startswith('ocel:')]
+            columns = base_columns + [col for col in self.attributes if col in df.columns and col not in base_columns]
+            df = df[columns]
+            for col in columns:
+                dtype = _common_dtype(dtypes.get(col, []), non_null.get(col, 0) < self.count)
+                if df[col].dtype != dtype:
+                    df[col] = df[col].astype(dtype)
+            partitions[type_name] = df
+        self.chunks = {}
+        return partitions
+
+
+def _parse_event_timestamps(chunk):
+    try:
+        timestamps = pd.to_datetime(chunk['ocel:timestamp'], utc=True, format='ISO8601')
+    except ValueError:
+        timestamps = pd.to_datetime(chunk['ocel:timestamp'], utc=True, format='mixed')
+    chunk['ocel:timestamp'] = timestamps
+    return chunk
+
+
+def _relation_chunk(event_positions, object_ids):
+    # Relations read since the last chunk: position of the event, identifier of the object
+    return pd.DataFrame({'position': np.array(event_positions, dtype=np.int64),
+                         'ocel:oid': pd.Series(object_ids, dtype=str)})
+
+
+def _open(file_path, binary):
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rb" if binary else "rt", encoding=None if binary else "utf-8")
+    return open(file_path, "rb" if binary else "r", encoding=None if binary else "utf-8")
+
+
+def read_ocel_partitions(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Read an OCEL file incrementally into (object partitions, event partitions, relations), the input of
+    # splitter.transform_partitions. Partitions are dicts {type: dataframe} in order of first appearance.
+    is_xml = re.search(r'\.xml(ocel)?(\.gz)?$', file_path.lower()) is not None
+    objects = _PartitionBuilder()
+    events = _PartitionBuilder()
+    relation_chunks = []
+    relation_events = []
+    relation_objects = []
+
+    with _open(file_path, binary=is_xml) as f:
+        records = _iter_xml_records(f) if is_xml else _iter_json_records(f)
+        for record in records:
+            if record[0] == "object":
+                _, oid, obj_type, attributes = record
+                objects.add(str(obj_type), {'ocel:oid': str(oid), 'ocel:type': str(obj_type)}, attributes)
+            else:
+                _, eid, activity, timestamp, attributes, oids = record
+                position = events.add(str(activity), {'ocel:eid': str(eid), 'ocel:activity': str(activity),
+                                                      'ocel:timestamp': timestamp}, attributes)
+                relation_events.extend([position] * len(oids))
+                relation_objects.extend(str(oid) for oid in oids)
+            if objects.pending + events.pending >= chunk_size:
+                objects.flush()
+                events.flush(_parse_event_timestamps)
+                relation_chunks.append(_relation_chunk(relation_events, relation_objects))
+                relation_events = []
+                relation_objects = []
+    objects.flush()
+    events.flush(_parse_event_timestamps)
+    relation_chunks.append(_relation_chunk(relation_events, relation_objects))
+    del relation_events, relation_objects
+
+    object_partitions = objects.partitions()
+    event_partitions = events.partitions()
+
+    # Type of every object (the last definition wins), ignoring objects without identifier or type
+    object_rows = pd.concat([df[['ocel:oid', 'ocel:type']] for df in object_partitions.values()]).sort_index() \
+        if object_partitions else pd.DataFrame({'ocel:oid': pd.Series(dtype=str), 'ocel:type': pd.Series(dtype=str)})
+    object_rows = object_rows[(object_rows['ocel:oid'].str.len() > 0) & (object_rows['ocel:type'].str.len() > 0)]
+    object_types = object_rows.drop_duplicates('ocel:oid', keep='last').set_index('ocel:oid')['ocel:type']
+
+    # Identifier, activity and timestamp of every event, by position
+    event_rows = pd.concat([df[['ocel:eid', 'ocel:activity', 'ocel:timestamp']] for df in event_partitions.values()]) \
+        if event_partitions else None
+
+    # Relations to known objects, numbered like the rows of the pm4py relations table, sorted by timestamp
+    relations = pd.concat(relation_chunks, ignore_index=True)
+    del relation_chunks
+    relations = relations[relations['ocel:oid'].isin(object_types.index)]
+    if event_rows is not None and len(relations) > 0:
+        relations.index = pd.RangeIndex(len(relations))
+        rows = event_rows.reindex(relations['position'])
+        relations = pd.DataFrame({
+            'ocel:eid': rows['ocel:eid'].array,
+            'ocel:activity': rows['ocel:activity'].array,
+            'ocel:timestamp': rows['ocel:timestamp'].array,
+            'ocel:oid': relations['ocel:oid'],
+            'ocel:type': relations['ocel:oid'].map(object_types),
+        }, index=relations.index)
+        relations = relations[(relations['ocel:eid'].str.len() > 0) & (relations['ocel:activity'].str.len() > 0)]
+        relations = relations.sort_values('ocel:timestamp', kind='stable')
+    else:
+        relations = pd.DataFrame({col: pd.Series(dtype=str) for col in
+                                  ['ocel:eid', 'ocel:activity', 'ocel:timestamp', 'ocel:oid', 'ocel:type']})
+    del event_rows
+
+    # Keep the events and objects with relations, events sorted by timestamp; the types in order of first appearance
+    related_events = set(relations['ocel:eid'].unique())
+    related_objects = set(relations['ocel:oid'].unique())
+    event_partitions = {activity: df[df['ocel:eid'].isin(related_events)].sort_values('ocel:timestamp', kind='stable')
+                        for activity, df in event_partitions.items()}
+    event_partitions = {activity: df for activity, df in event_partitions.items() if len(df) > 0}
+    event_partitions = dict(sorted(event_partitions.items(),
+                                   key=lambda x: (x[1]['ocel:timestamp'].iloc[0], x[1].index[0])))
+    object_partitions = {obj_type: df[df['ocel:oid'].isin(related_objects)]
+                         for obj_type, df in object_partitions.items()}
+    object_partitions = {obj_type: df for obj_type, df in object_partitions.items() if len(df) > 0}
+    object_partitions = dict(sorted(object_partitions.items(), key=lambda x: x[1].index[0]))
+
+    return object_partitions, event_partitions, relations
+
+
+def stream_transform_ocel(file_path, custom=False, create_object_relations=False, lead_object_type=None,
+                          o2o_chunk_size=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Same result as transform_ocel(pm4py.read_ocel(file_path), ...), reading the file incrementally
+    with stage('read_ocel_stream', table=file_path) as s:
+        object_partitions, event_partitions, relations = read_ocel_partitions(file_path, chunk_size)
+        s.update(rows=len(relations))
+    return transform_partitions(object_partitions, event_partitions, relations, custom=custom,
+                                create_object_relations=create_object_relations, lead_object_type=lead_object_type,
+                                o2o_chunk_size=o2o_chunk_size)
+
+
+if __name__ == "__main__":
+    object_dfs, event_dfs, relationship_dfs, object_relationship_dfs = stream_transform_ocel(
+        "tests/input_data/ocel/recruiting-red.jsonocel"
+    )
+    for name, df in list(object_dfs.items()) + list(event_dfs.items()):
+        print(f"{name}: {len(df)} rows, columns {list(df.columns)}")
+    for (evt_name, obj_name), df in relationship_dfs.items():
+        print(f"{evt_name} - {obj_name}: {len(df)} relations")
@@ -1,11 +1,10 @@
 import pm4py
-import networkx as nx
 import re
 import uuid
-from pm4py.objects.ocel.obj import OCEL
 from pm4py.objects.ocel.util import ocel_to_dict_types_rel, ocel_type_renaming
-from copy import deepcopy
-from typing import Dict, Optional
+
+from compaction import rename_types
+from schema_planner import plan_schema
 
 
 celonis_url = "https://staff-pads.eu-1.celonis.cloud/"
@@ -30,41 +29,6 @@ recorded = set()
 data_pool = None
 data_model = None
 
-names_stripper_match = re.compile(r'[^0-9a-zA-Z]+')
-
-
-def names_stripper(X: str, max_len: int = 100) -> str:
-    X = X.split(" ")
-    i = 0
-    while i < len(X):
-        X[i] = X[i].capitalize()
-        i = i + 1
-    X = "".join(X)
-    stru = names_stripper_match.sub('', X).strip()
-    if len(stru) > max_len:
-        stru = stru[:100]
-    return stru
-
-
-def __rename_types_from_maps(ocel: OCEL, event_types_map: Optional[Dict[str, str]], object_types_map: Optional[Dict[str, str]]) -> OCEL:
-    ret_ocel = deepcopy(ocel)
-    if event_types_map is not None:
-        ret_ocel.events[ocel.event_activity] = ret_ocel.events[ocel.event_activity].map(event_types_map)
-        ret_ocel.relations[ocel.event_activity] = ret_ocel.relations[ocel.event_activity].map(event_types_map)
-    if object_types_map is not None:
-        ret_ocel.objects[ocel.object_type_column] = ret_ocel.objects[ocel.object_type_column].map(object_types_map)
-        ret_ocel.relations[ocel.object_type_column] = ret_ocel.relations[ocel.object_type_column].map(object_types_map)
-        ret_ocel.object_changes[ocel.object_type_column] = ret_ocel.object_changes[ocel.object_type_column].map(object_types_map)
-    return ret_ocel
-
-
-def remove_spaces_non_alphanumeric_characters_from_types(ocel: OCEL) -> OCEL:
-    object_types = ocel.objects[ocel.object_type_column].value_counts().to_dict()
-    event_types = ocel.events[ocel.event_activity].value_counts().to_dict()
-    object_types_map = {x: names_stripper(x) for x in object_types}
-    event_types_map = {x: names_stripper(x) for x in event_types}
-    return __rename_types_from_maps(ocel, event_types_map, object_types_map)
-
 
 def add_e2o(df, et, ot):
     df.rename(columns={"ocel:eid": "EventID", "ocel:oid": "ObjectID", "ocel:activity": "EventType", "ocel:type": "ObjectType"}, inplace=True)
@@ -89,7 +53,8 @@ ocel0 = pm4py.read_ocel2("order-management.json")
 
 #ocel0 = pm4py.read_ocel2("ContainerLogistics (3).xml")
 
-ocel = remove_spaces_non_alphanumeric_characters_from_types(ocel0)
+# Clean type names: only the categories of the type columns are renamed, the log is not copied
+ocel = rename_types(ocel0)
 print(ocel)
 
 lead_ot = input("Insert the lead object type -> ")
@@ -105,90 +70,20 @@ if len(ocel.events) == 0 or len(ocel.objects) == 0 or len(ocel.relations) == 0:
 
 dct = ocel_to_dict_types_rel.apply(ocel)
 
-graph = nx.DiGraph()
+# Plan the acyclic schema: lead object type first, then the largest tables
+plan = plan_schema({k: len(v) for k, v in dct["ev_types"].items()}, {k: len(v) for k, v in dct["obj_types"].items()},
+                   {k: len(v) for k, v in dct["e2o"].items()}, {k: len(v) for k, v in dct["o2o"].items()},
+                   lead_object_type=lead_ot)
 
-all_events = list(dct["ev_types"].items())
-all_objects = list(dct["obj_types"].items())
-all_e2o = list(dct["e2o"].items())
-all_o2o = list(dct["o2o"].items())
+all_events = [(name0, dct["ev_types"][name0]) for name0 in plan["events"]]
+all_objects = [(name0, dct["obj_types"][name0]) for name0 in plan["objects"]]
+all_e2o = [(name0, dct["e2o"][name0]) for name0 in plan["e2o"]]
+all_o2o = [(name0, dct["o2o"][name0]) for name0 in plan["o2o"]]
 
-all_events = sorted(all_events, key=lambda x: (len(x[1]), x[0]), reverse=True)
-all_objects = sorted(all_objects, key=lambda x: (len(x[1]), x[0]), reverse=True)
-all_e2o = sorted(all_e2o, key=lambda x: (1 if x[0][1] == lead_ot else 0, len(x[1]), x[0]), reverse=True)
-all_o2o = sorted(all_o2o, key=lambda x: (1 if x[0][0] == lead_ot else 0, 1 if x[0][1] == lead_ot else 0, len(x[1]), x[0]), reverse=True)
-
-for name0, df in all_events:
-    name = "e_" + namespace + "_" + name0
-
-    graph.add_node(name, original=("event", name0))
-
-for name0, df in all_objects:
-    name = "o_"+namespace+"_"+name0
-
-    graph.add_node(name, original=("object", name0))
-
-for name0, df in all_e2o:
-    new_graph = graph.copy()
-
-    et = name0[0]
-    ot = name0[1]
-
-    name = "r_e_" + namespace + "_" + et + "_" + ot
-
-    new_graph.add_node(name, original=("e2o", et, ot))
-    new_graph.add_edge("e_"+namespace+"_"+et, name, edge_type="e2o")
-    new_graph.add_edge("o_"+namespace+"_"+ot, name, edge_type="e2o")
-
-    if False:
-        try:
-            cycle = nx.find_cycle(new_graph)
-            #print(cycle)
-            #print(name)
-        except:
-            #traceback.print_exc()
-            graph = new_graph
-    else:
-        graph = new_graph
-
-graph = nx.Graph(graph)
-
-for name0, df in all_o2o:
-    new_graph = graph.copy()
-
-    ot1 = name0[0]
-    ot2 = name0[1]
-
-    name = "r_o_"+namespace+"_"+ot1+"_"+ot2
-
-    new_graph.add_node(name, original=(ot1, ot2))
-    new_graph.add_edge("o_"+namespace+"_"+ot1, name, edge_type="o2o")
-    new_graph.add_edge("o_"+namespace+"_"+ot2, name, edge_type="o2o")
-
-    try:
-        cycle = nx.find_cycle(new_graph)
-        #print(cycle)
-        print(name)
-    except:
-        #traceback.print_exc()
-        graph = new_graph
-
-nodes = [graph.nodes[n]["original"] for n in graph.nodes]
-allowed_events0 = set(n[1] for n in nodes if n[0] == "event")
-allowed_events = set()
-for u, v, attributes in graph.edges(data=True):
-    source = v.split("_")[-2]
-    if source in allowed_events0:
-        if attributes["edge_type"] == "e2o":
-            allowed_events.add(source)
-allowed_objects0 = set(n[1] for n in nodes if n[0] == "object")
-allowed_objects = set()
-for u, v, attributes in graph.edges(data=True):
-    target = v.split("_")[-1]
-    if target in allowed_objects0:
-        if attributes["edge_type"] == "e2o":
-            allowed_objects.add(target)
-allowed_e2o = set((n[1], n[2]) for n in nodes if n[0] == "e2o" and n[1] in allowed_events and n[2] in allowed_objects)
-allowed_o2o = set((n[1], n[2]) for n in nodes if n[0] == "o2o" and n[1] in allowed_objects and n[2] in allowed_objects)
+allowed_events = set(plan["events"])
+allowed_objects = set(plan["objects"])
+allowed_e2o = set(plan["e2o"])
+allowed_o2o = set(plan["o2o"])
 
 print(allowed_events)
 print(allowed_objects)
@@ -0,0 +1,167 @@
+# Parallel version of splitter.transform_ocel: the per-type work (event tables with their 1:1 object columns, the
+# cardinality checks and the relationship tables of every event type, and the object tables) is sharded by type
+# across a pool of worker processes.
+#
+# The inputs are not pickled to the workers: the parent only computes the row positions of every type, and the
+# workers are forked after the log is published in a module-level variable, so they read the parent's dataframes
+# through the memory pages shared by fork (copy-on-write). Only the type names go to the workers, and only the
+# finished tables come back. The results are assembled in the serial order, so the output is identical to the one
+# of transform_ocel. Where fork is not available (Windows, macOS default), the serial transform is used.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from instrumentation import stage
+from splitter import (analyze_e2o_cardinality, build_event_table, build_lead_object_relations, build_object_table,
+                      build_relationship_table, clean_name, clean_name_map, link_decision, partition_positions,
+                      split_one_to_one, take_rows, transform_ocel, value_columns_by_type)
+
+# Inputs of the current parallel transform, inherited by the forked workers
+_shared = None
+
+
+def _event_type_tables(evt_type):
+    # Event table of the event type (None if it has no events) with its 1:1 object columns, and its relationship
+    # tables as (position of the first relation, key, table). Runs in a worker.
+    events = _shared["events"]
+    relations = _shared["relations"]
+    custom = _shared["custom"]
+    evt_name = clean_name(evt_type)
+
+    relationship_tables = []
+    embedded_objects = []
+    relation_positions = _shared["relation_positions"].get(evt_type)
+    if relation_positions is not None:
+        rel_rows = relations.take(relation_positions)
+        # Position of the first relation of each object type, to restore the serial order of the relationship tables
+        first_positions = pd.Series(relation_positions).groupby(rel_rows['ocel:type'].to_numpy(), sort=False).min()
+        for (_, obj_type), (is_one_to_one, rel_df) in analyze_e2o_cardinality(rel_rows).items():
+            obj_name = clean_name(obj_type)
+            decision = link_decision(_shared["denormalization"], 'e2o', (evt_type, obj_type), is_one_to_one)
+            if decision == 'hybrid':
+                one_to_one, rel_df = split_one_to_one(rel_df, 'ocel:eid', 'ocel:oid')
+                embedded_objects.append((obj_name, one_to_one))
+            if decision == 'embed':
+                embedded_objects.append((obj_name, rel_df))
+            else:
+                relationship_tables.append((int(first_positions[obj_type]), (evt_name, obj_name),
+                                            build_relationship_table(rel_df, obj_name, custom=custom)))
+
+    evt_table = None
+    event_positions = _shared["event_positions"].get(evt_type)
+    if event_positions is not None:
+        value_columns = _shared["event_columns"][evt_type]
+        evt_rows = take_rows(events, event_positions, ['ocel:eid', 'ocel:timestamp'] + value_columns)
+        evt_table = build_event_table(evt_rows, value_columns)
+        for obj_name, rel_df in embedded_objects:
+            # Map event IDs to object IDs
+            eid_to_oid = rel_df.set_index('ocel:eid')['ocel:oid']
+            evt_table[obj_name] = evt_table['ID'].map(eid_to_oid)
+    elif embedded_objects:
+        # Relations of an event type without events: same error as the serial transform
+        raise KeyError(evt_name)
+    return evt_table, relationship_tables
+
+
+def _object_type_table(obj_type):
+    # Object table of the object type. Runs in a worker.
+    objects = _shared["objects"]
+    value_columns = _shared["object_columns"][obj_type]
+    return build_object_table(take_rows(objects, _shared["object_positions"][obj_type], ['ocel:oid'] + value_columns),
+                              value_columns)
+
+
+def transform_ocel_parallel(ocel, custom=False, create_object_relations=False, lead_object_type=None,
+                            o2o_chunk_size=None, max_workers=None, denormalization=None):
+    # Same arguments and output as transform_ocel, with the per-type work spread over 'max_workers' processes
+    # (default: the number of CPUs). The object-to-object relations are derived in the parent meanwhile.
+    # Fork the workers before starting threads in the parent (e.g. the upload workers of the pipelined mode).
+    global _shared
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return transform_ocel(ocel, custom=custom, create_object_relations=create_object_relations,
+                              lead_object_type=lead_object_type, o2o_chunk_size=o2o_chunk_size,
+                              denormalization=denormalization)
+
+    with stage('partition_positions', rows=len(ocel.events) + len(ocel.objects) + len(ocel.relations)):
+        object_positions = partition_positions(ocel.objects, 'ocel:type')
+        event_positions = partition_positions(ocel.events, 'ocel:activity')
+        relation_positions = partition_positions(ocel.relations, 'ocel:activity')
+    with stage('non_null_columns', rows=len(ocel.objects) + len(ocel.events)):
+        object_columns = value_columns_by_type(ocel.objects, 'ocel:type')
+        event_columns = value_columns_by_type(ocel.events, 'ocel:activity')
+    # Clean type names (fails when two types would get the same table)
+    object_names = clean_name_map(object_positions)
+    event_names = clean_name_map(event_positions)
+
+    _shared = {
+        "events": ocel.events,
+        "objects": ocel.objects,
+        "relations": ocel.relations,
+        "event_positions": event_positions,
+        "object_positions": object_positions,
+        "relation_positions": relation_positions,
+        "object_columns": object_columns,
+        "event_columns": event_columns,
+        "custom": custom,
+        "denormalization": denormalization,
+    }
+    try:
+        event_types = list(event_positions) + [t for t in relation_positions if t not in event_positions]
+        rows = {t: len(event_positions.get(t, ())) + len(relation_positions.get(t, ())) for t in event_types}
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            # Largest types first, so the long tasks do not end up last
+            event_futures = {t: executor.submit(_event_type_tables, t)
+                             for t in sorted(event_types, key=lambda t: rows[t], reverse=True)}
+            object_futures = {t: executor.submit(_object_type_table, t)
+                              for t in sorted(object_positions, key=lambda t: len(object_positions[t]), reverse=True)}
+
+            # Object-to-object relations in the parent, while the workers build the per-type tables
+            parent_mappings = {}
+            object_relationship_dataframes = {}
+            if create_object_relations and lead_object_type is not None:
+                parent_mappings, object_relationship_dataframes = build_lead_object_relations(
+                    ocel.relations, lead_object_type, o2o_chunk_size, denormalization)
+
+            # Assemble the tables in the serial order
+            with stage('collect_tables'):
+                event_dataframes = {}
+                relationship_tables = []
+                for evt_type in event_types:
+                    evt_table, evt_relationship_tables = event_futures.pop(evt_type).result()
+                    if evt_table is not None:
+                        event_dataframes[event_names[evt_type]] = evt_table
+                    relationship_tables.extend(evt_relationship_tables)
+                relationship_tables.sort(key=lambda x: x[0])
+                relationship_dataframes = {key: table for _, key, table in relationship_tables}
+
+                object_dataframes = {}
+                for obj_type in object_positions:
+                    object_dataframes[object_names[obj_type]] = object_futures.pop(obj_type).result()
+    finally:
+        _shared = None
+
+    if parent_mappings:
+        lead_obj_name = clean_name(lead_object_type)
+        for obj_name, mapping in parent_mappings.items():
+            # Add parent object column
+            obj_df = object_dataframes[obj_name]
+            obj_df[lead_obj_name] = obj_df['ID'].map(mapping)
+
+    return object_dataframes, event_dataframes, relationship_dataframes, object_relationship_dataframes
+
+
+if __name__ == "__main__":
+    import time
+
+    from synthetic_ocel import generate_ocel
+
+    ocel = generate_ocel(n_events=1000000, n_object_types=20, n_activities=60)
+    for max_workers in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        transform_ocel_parallel(ocel, create_object_relations=True, lead_object_type="Object Type 0",
+                                max_workers=max_workers)
+        print(f"{max_workers} worker(s): {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,186 @@
+# Pre-upload check of the foreign keys uploader2 creates in the data model (see data_model_plan.plan_data_model):
+# the EventID / ID columns of the relationship tables against the IDs of their event and object tables, and the
+# embedded object columns of the event tables against the IDs of the object tables. Dangling IDs are found before
+# anything is uploaded, instead of after a failed (or silently lossy) data model reload.
+#
+# Membership is hash based and runs on integer codes: the referenced IDs of every table are hashed once (an index
+# shared by all the foreign keys referencing the table), and each referencing column is factorized, so only its
+# distinct values are looked up and the rows are checked through their integer codes. Categorical columns are
+# checked through their categories, and dense integer IDs (e.g. a compact OCEL, see compaction) through a bitmap of
+# the referenced IDs, without hashing at all.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_model_plan import event_table_name, object_table_name, plan_data_model, relationship_table_name
+from instrumentation import stage
+from splitter import release_table
+
+DEFAULT_SAMPLES = 5
+
+# Integer IDs are checked with a bitmap when their range is at most this many times the number of referenced IDs
+MAX_BITMAP_SPARSITY = 8
+
+
+def _codes_and_uniques(values):
+    # Integer codes of the values (-1 for missing values) and the distinct values they refer to
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    return pd.factorize(values, use_na_sentinel=True)
+
+
+def key_set(keys):
+    # Lookup structure of the referenced IDs: a hashed index, and a bitmap when the IDs are dense integers
+    key_index = pd.Index(keys.dropna())
+    bitmap = None
+    offset = 0
+    if len(key_index) > 0 and key_index.dtype.kind in 'iu':
+        offset = int(key_index.min())
+        span = int(key_index.max()) - offset + 1
+        if span <= MAX_BITMAP_SPARSITY * len(key_index):
+            bitmap = np.zeros(span, dtype=bool)
+            bitmap[key_index.to_numpy() - offset] = True
+    return {"index": key_index, "bitmap": bitmap, "offset": offset}
+
+
+def _dangling_integers(keys, values):
+    # Dangling mask of integer values, looked up in the bitmap of the referenced IDs
+    positions = values - keys["offset"]
+    in_range = (positions >= 0) & (positions < len(keys["bitmap"]))
+    dangling = ~in_range
+    dangling[in_range] = ~keys["bitmap"][positions[in_range]]
+    return dangling
+
+
+def check_references(keys, values, samples=DEFAULT_SAMPLES):
+    # Check that every non-null value is one of the referenced IDs ('keys', see key_set).
+    # Returns the number of null values, of rows with a dangling value, of distinct dangling values, and samples.
+    if keys["bitmap"] is not None and isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iu':
+        values = values.to_numpy()
+        dangling = _dangling_integers(keys, values)
+        dangling_values = pd.unique(values[dangling])
+        return {
+            "nulls": 0,
+            "dangling_rows": int(np.count_nonzero(dangling)),
+            "dangling_values": len(dangling_values),
+            "samples": dangling_values[:samples].tolist(),
+        }
+    codes, uniques = _codes_and_uniques(values)
+    if keys["bitmap"] is not None and isinstance(uniques.dtype, np.dtype) and uniques.dtype.kind in 'iu':
+        dangling = _dangling_integers(keys, uniques.to_numpy())
+    else:
+        dangling = keys["index"].get_indexer(uniques) < 0
+    dangling_rows = int(np.count_nonzero(dangling[codes[codes >= 0]]))
+    return {
+        "nulls": int(np.count_nonzero(codes < 0)),
+        "dangling_rows": dangling_rows,
+        "dangling_values": int(np.count_nonzero(dangling)),
+        "samples": uniques[dangling][:samples].tolist() if dangling_rows else [],
+    }
+
+
+def _parent_side(foreign_key, key_tables):
+    # Referenced (table, column) and referencing (table, column) of a planned foreign key: the referenced side is
+    # the ID column of an event or object table
+    source_table, target_table, source_column, target_column = foreign_key
+    if source_table in key_tables and source_column == "ID":
+        return (source_table, source_column), (target_table, target_column)
+    return (target_table, target_column), (source_table, source_column)
+
+
+def validate_foreign_keys(object_dataframes, event_dataframes, relationship_dataframes, foreign_keys=None,
+                          samples=DEFAULT_SAMPLES, denormalization=None):
+    # Check every foreign key of the data model plan (or the given (source table, target table, source column,
+    # target column) foreign keys) on the dataframes. 'denormalization': the plan given to transform_ocel, if any
+    # (see data_model_plan.plan_data_model). The tables of LazyTables mappings are released after use.
+    # Returns a report: one entry per foreign key, with the referencing and referenced columns, the rows, nulls,
+    # dangling rows and values with samples, the duplicated referenced IDs, and the error when a column is missing.
+    start = time.perf_counter()
+    tables = {}
+    for name in object_dataframes:
+        tables[object_table_name(name)] = (object_dataframes, name)
+    for name in event_dataframes:
+        tables[event_table_name(name)] = (event_dataframes, name)
+    for evt_name, obj_name in relationship_dataframes:
+        tables[relationship_table_name(evt_name, obj_name)] = (relationship_dataframes, (evt_name, obj_name))
+    key_tables = {object_table_name(name) for name in object_dataframes} | {event_table_name(name)
+                                                                           for name in event_dataframes}
+    if foreign_keys is None:
+        foreign_keys = plan_data_model(object_dataframes, event_dataframes, relationship_dataframes,
+                                       denormalization=denormalization)["foreign_keys"]
+
+    def column(table_name, column_name):
+        dataframes, key = tables[table_name]
+        df = dataframes[key]
+        release_table(dataframes, key)
+        if column_name not in df.columns:
+            return None
+        return df[column_name]
+
+    # Referenced IDs of every table, hashed once for all the foreign keys referencing it
+    key_indexes = {}
+    checks = []
+    for foreign_key in foreign_keys:
+        (parent_table, parent_column), (child_table, child_column) = _parent_side(foreign_key, key_tables)
+        entry = {"table": child_table, "column": child_column, "referenced_table": parent_table,
+                 "referenced_column": parent_column, "rows": 0, "nulls": 0, "dangling_rows": 0,
+                 "dangling_values": 0, "samples": [], "duplicate_keys": 0, "error": None}
+        checks.append(entry)
+        if parent_table not in tables or child_table not in tables:
+            entry["error"] = f"table '{parent_table if parent_table not in tables else child_table}' not found"
+            continue
+        if (parent_table, parent_column) not in key_indexes:
+            keys = column(parent_table, parent_column)
+            parent_keys = None
+            if keys is not None:
+                with stage('hash_keys', table=parent_table, rows=len(keys)):
+                    parent_keys = key_set(keys)
+            key_indexes[(parent_table, parent_column)] = parent_keys
+        parent_keys = key_indexes[(parent_table, parent_column)]
+        values = column(child_table, child_column)
+        if parent_keys is None or values is None:
+            entry["error"] = (f"column '{parent_column}' not found in '{parent_table}'" if parent_keys is None
+                              else f"column '{child_column}' not found in '{child_table}'")
+            continue
+        with stage('check_references', table=f"{child_table}.{child_column}", rows=len(values)):
+            entry["rows"] = len(values)
+            entry.update(check_references(parent_keys, values, samples))
+            key_index = parent_keys["index"]
+            entry["duplicate_keys"] = 0 if key_index.is_unique else int(key_index.duplicated().sum())
+
+    return {
+        "foreign_keys": checks,
+        "valid": all(entry["error"] is None and entry["dangling_rows"] == 0 and entry["duplicate_keys"] == 0
+                     for entry in checks),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def print_integrity_report(report):
+    checks = report["foreign_keys"]
+    invalid = [entry for entry in checks if entry["error"] is not None or entry["dangling_rows"]
+               or entry["duplicate_keys"]]
+    print(f"Checked {len(checks)} foreign key(s) in {report['elapsed']:.2f}s: {len(invalid)} with problems.")
+    for entry in invalid:
+        reference = (f"'{entry['table']}'.'{entry['column']}' -> "
+                     f"'{entry['referenced_table']}'.'{entry['referenced_column']}'")
+        if entry["error"] is not None:
+            print(f"- {reference}: {entry['error']}")
+            continue
+        if entry["dangling_rows"]:
+            samples = ', '.join(repr(sample) for sample in entry["samples"])
+            print(f"- {reference}: {entry['dangling_rows']} of {entry['rows']} row(s) reference "
+                  f"{entry['dangling_values']} missing ID(s), e.g. {samples}")
+        if entry["duplicate_keys"]:
+            print(f"- {reference}: {entry['duplicate_keys']} duplicated ID(s) in the referenced table")
+
+
+if __name__ == "__main__":
+    import pm4py
+    from splitter import transform_ocel
+
+    ocel = pm4py.read_ocel("tests/input_data/ocel/example_log.jsonocel")
+    object_dataframes, event_dataframes, relationship_dataframes, _ = transform_ocel(ocel)
+    print_integrity_report(validate_foreign_keys(object_dataframes, event_dataframes, relationship_dataframes))
@@ -0,0 +1,126 @@
+# Planner of the data model of an OCEL: which event, object, E2O and O2O tables to create, so that the foreign keys
+# between them form an acyclic graph.
+#
+# The relationship tables are candidates considered in priority order (relationships of the lead object type first,
+# then the largest ones), and a candidate is rejected when its two foreign keys would close a cycle. The connected
+# tables are tracked with a union-find structure, so every candidate costs almost constant time, instead of a copy of
+# the whole graph and a cycle search per candidate.
+
+import pandas as pd
+
+
+class _DisjointSet:
+    # Union-find over hashable nodes, with path halving and union by size
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, node):
+        parent = self.parent
+        if node not in parent:
+            parent[node] = node
+            self.size[node] = 1
+            return node
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a, b):
+        # Merge the sets of a and b; False when they were already connected (the edge would close a cycle)
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+
+def _by_size(sizes):
+    # Largest first (ties broken by name, in reverse order, as in the original planner)
+    return sorted(sizes, key=lambda x: (sizes[x], x), reverse=True)
+
+
+def plan_schema(event_types, object_types, e2o, o2o=None, lead_object_type=None, acyclic_e2o=False):
+    # event_types / object_types: {type: number of events / objects},
+    # e2o: {(event type, object type): number of relations}, o2o: {(object type, object type): number of relations}.
+    #
+    # Every E2O relationship is kept, unless acyclic_e2o is set (then an E2O table closing a cycle is rejected too).
+    # An O2O relationship is kept when both object types have tables and it does not close a cycle; O2O relationships
+    # of an object type with itself are rejected, since they would need two foreign keys between the same two tables.
+    #
+    # Returns the plan: the accepted types and relationships, each list in priority order, and the rejected ones.
+    o2o = o2o or {}
+    components = _DisjointSet()
+
+    e2o_order = sorted(e2o, key=lambda x: (x[1] == lead_object_type, e2o[x], x), reverse=True)
+    accepted_e2o = []
+    rejected_e2o = []
+    for et, ot in e2o_order:
+        if et not in event_types or ot not in object_types:
+            rejected_e2o.append((et, ot))
+        elif components.union(("event", et), ("object", ot)) or not acyclic_e2o:
+            accepted_e2o.append((et, ot))
+        else:
+            rejected_e2o.append((et, ot))
+
+    # Tables of the types with at least one E2O relationship
+    connected_events = set(et for et, ot in accepted_e2o)
+    connected_objects = set(ot for et, ot in accepted_e2o)
+    events = [et for et in _by_size(event_types) if et in connected_events]
+    objects = [ot for ot in _by_size(object_types) if ot in connected_objects]
+
+    o2o_order = sorted(o2o, key=lambda x: (x[0] == lead_object_type, x[1] == lead_object_type, o2o[x], x),
+                       reverse=True)
+    accepted_o2o = []
+    rejected_o2o = []
+    for ot1, ot2 in o2o_order:
+        if ot1 in connected_objects and ot2 in connected_objects and \
+                components.union(("object", ot1), ("object", ot2)):
+            accepted_o2o.append((ot1, ot2))
+        else:
+            rejected_o2o.append((ot1, ot2))
+
+    return {
+        "lead_object_type": lead_object_type,
+        "events": events,
+        "objects": objects,
+        "e2o": accepted_e2o,
+        "o2o": accepted_o2o,
+        "rejected_e2o": rejected_e2o,
+        "rejected_o2o": rejected_o2o,
+    }
+
+
+def schema_sizes(ocel):
+    # Sizes of the candidate tables of an OCEL, the input of plan_schema: (event types, object types, e2o, o2o)
+    event_types = ocel.events['ocel:activity'].value_counts(sort=False).to_dict()
+    object_types = ocel.objects['ocel:type'].value_counts(sort=False).to_dict()
+    e2o = ocel.relations.groupby(['ocel:activity', 'ocel:type'], sort=False, observed=True).size().to_dict()
+    o2o = {}
+    if getattr(ocel, 'o2o', None) is not None and len(ocel.o2o) > 0:
+        types = ocel.objects.drop_duplicates('ocel:oid', keep='last').set_index('ocel:oid')['ocel:type']
+        pairs = pd.DataFrame({'source': ocel.o2o['ocel:oid'].map(types), 'target': ocel.o2o['ocel:oid_2'].map(types)})
+        o2o = pairs.dropna().groupby(['source', 'target'], sort=False).size().to_dict()
+    return event_types, object_types, e2o, o2o
+
+
+def print_plan(plan):
+    print(f"Lead object type: {plan['lead_object_type']}")
+    print(f"Event tables ({len(plan['events'])}): {', '.join(plan['events'])}")
+    print(f"Object tables ({len(plan['objects'])}): {', '.join(plan['objects'])}")
+    print(f"E2O tables: {len(plan['e2o'])} ({len(plan['rejected_e2o'])} rejected)")
+    print(f"O2O tables: {len(plan['o2o'])} ({len(plan['rejected_o2o'])} rejected)")
+    for ot1, ot2 in plan['o2o']:
+        print(f"- {ot1} -> {ot2}")
+
+
+if __name__ == "__main__":
+    import pm4py
+
+    ocel = pm4py.read_ocel2("tests/input_data/ocel/ocel20_example.xmlocel")
+    event_types, object_types, e2o, o2o = schema_sizes(ocel)
+    print_plan(plan_schema(event_types, object_types, e2o, o2o, lead_object_type="Purchase Order"))
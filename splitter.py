@@ -1,4 +1,5 @@
 import os.path
+from collections.abc import Mapping
 
 import pandas as pd
 import re
@@ -6,201 +7,606 @@ import re
 import pm4py
 import shutil
 
+from instrumentation import stage
+# dataframe_to_sql moved to sql_export, and stays importable from splitter for the existing callers
+from sql_export import dataframe_to_sql, export_dataframe  # noqa: F401
+
+
+# Function to clean names: strip non-alphanumerical characters and spaces, capitalize first letter of each word
+def clean_name(name):
+    name = re.sub(r'[^0-9a-zA-Z ]+', '', name)
+    name = ' '.join(word.capitalize() for word in name.split())
+    name = name.replace(' ', '')
+    return name
+
+
+def clean_name_map(names, clean=clean_name):
+    # Map every distinct raw name to its cleaned name. Raises ValueError when different raw names clean to the same
+    # name, since their tables (or columns) would silently overwrite each other.
+    mapping = {}
+    raw_names = {}
+    for name in names:
+        if name in mapping:
+            continue
+        cleaned = clean(name)
+        if cleaned in raw_names:
+            raise ValueError(f"Names '{raw_names[cleaned]}' and '{name}' both clean to '{cleaned}'")
+        raw_names[cleaned] = name
+        mapping[name] = cleaned
+    return mapping
+
+
+def partition_dataframe(df, columns):
+    # Split a dataframe into one partition per distinct value of 'columns' in a single grouped pass.
+    # Partitions are returned in order of first appearance (the same order as unique() / drop_duplicates()),
+    # each one keeping the original row order and index, exactly like filtering with a boolean mask.
+    # When 'columns' is a list, the keys are tuples of values.
+    if len(df) == 0:
+        return {}
+    return {key: part for key, part in df.groupby(columns, sort=False, observed=True)}
+
+
+def partition_positions(df, columns):
+    # Row positions of every distinct value of 'columns', in order of first appearance (the partitions of
+    # partition_dataframe, without copying any row)
+    if len(df) == 0:
+        return {}
+    # The indices of a grouping by several columns are not in order of appearance: sort them by first position
+    indices = df.groupby(columns, sort=False, observed=True).indices
+    return dict(sorted(indices.items(), key=lambda item: item[1][0]))
+
+
+def non_null_matrix(df, type_column):
+    # Type x column matrix telling whether at least one row of the type has a value in the attribute column
+    # (the columns not starting with 'ocel:'), computed for all the types and columns at once with a single grouped
+    # aggregation. Types are in order of first appearance.
+    attribute_columns = [col for col in df.columns if not col.startswith('ocel:')]
+    return df[attribute_columns].notna().groupby(df[type_column], sort=False, observed=True).any()
+
+
+def value_columns_by_type(df, type_column):
+    # {type: attribute columns with at least one value for the type}, from the non-null matrix
+    matrix = non_null_matrix(df, type_column)
+    columns = matrix.columns
+    return {typ: columns[row].tolist() for typ, row in zip(matrix.index, matrix.to_numpy(dtype=bool))}
+
+
+def take_rows(df, rows, columns):
+    # The given rows (positions) of the given columns. Selecting the columns first would copy them over all the rows
+    # of the dataframe (without copy-on-write, i.e. pandas < 3) before the rows are taken.
+    return df.iloc[rows, df.columns.get_indexer(columns)]
+
+
+def partition_value_columns(df, type_column, value_columns):
+    # Same partitions as partition_dataframe(df, type_column), but each one only holds the 'ocel:' columns and the
+    # value columns of its type ({type: columns}, see value_columns_by_type): the rows of the empty columns are
+    # never copied.
+    ocel_columns = [col for col in df.columns if col.startswith('ocel:')]
+    return {typ: take_rows(df, rows, ocel_columns + value_columns[typ])
+            for typ, rows in partition_positions(df, type_column).items()}
+
+
+def e2o_one_to_one(relations_df):
+    # For every (event type, object type) pair, whether each event of the pair is related to exactly one object of
+    # the pair (1:1). The number of distinct objects per event is computed once for all the pairs with a single
+    # grouped aggregation over the whole relations table.
+    counts = relations_df.groupby(['ocel:activity', 'ocel:type', 'ocel:eid'], sort=False, observed=True)['ocel:oid'].nunique()
+    return counts.eq(1).groupby(level=[0, 1], sort=False, observed=True).all()
+
+
+def analyze_e2o_cardinality(relations_df):
+    # For every (event type, object type) pair, tell whether each event of the pair is related to exactly one
+    # object of the pair (1:1), and return the rows of the pair
+    if len(relations_df) == 0:
+        return {}
+    one_to_one = e2o_one_to_one(relations_df)
+    partitions = partition_dataframe(relations_df, ['ocel:activity', 'ocel:type'])
+    return {pair: (bool(one_to_one[pair]), rel_df) for pair, rel_df in partitions.items()}
+
+
+def link_decision(denormalization, link, key, is_one_to_one):
+    # How a link ('e2o': key (event type, object type), 'o2o': key child object type) is stored: 'embed' (a column),
+    # 'table' (a relationship table) or 'hybrid' (a column for the keys related to exactly one object, and a
+    # relationship table holding only the other keys, the exceptions). Taken from the denormalization plan when given
+    # (see denormalization_planner), otherwise the link is embedded when it is 1:1 and stored as a table when not.
+    # A link that is not 1:1 cannot be embedded completely: its exceptions go to a table (hybrid).
+    decision = (denormalization or {}).get(link, {}).get(key)
+    if decision is None:
+        decision = 'embed' if is_one_to_one else 'table'
+    if decision == 'embed' and not is_one_to_one:
+        decision = 'hybrid'
+    elif decision == 'hybrid' and is_one_to_one:
+        decision = 'embed'
+    return decision
+
+
+def split_one_to_one(rel_df, key_column, value_column):
+    # Split the rows into those of the keys related to exactly one value (deduplicated per key) and those of the
+    # other keys, the exceptions (e.g. events related to several objects of the type)
+    one_to_one = rel_df.groupby(key_column, sort=False)[value_column].transform('nunique').eq(1).to_numpy()
+    return rel_df[one_to_one].drop_duplicates(key_column), rel_df[~one_to_one]
+
+
+def derive_lead_object_pairs(relations_df, lead_object_type, chunk_size=1000000):
+    # Derive the distinct (lead object, other object) pairs of objects related to a common event.
+    # Instead of merging all the lead relations with all the other relations at once (a cross product per event),
+    # the events are processed in chunks holding at most about 'chunk_size' candidate pairs, and the pairs are
+    # deduplicated while they are collected, so the peak memory follows the number of distinct pairs.
+    is_lead = relations_df['ocel:type'] == lead_object_type
+    lead_relations = relations_df.loc[is_lead, ['ocel:eid', 'ocel:oid']].drop_duplicates().rename(
+        columns={'ocel:oid': 'LeadObjectID'}
+    )
+    other_relations = relations_df.loc[~is_lead, ['ocel:eid', 'ocel:oid', 'ocel:type']].drop_duplicates().rename(
+        columns={'ocel:oid': 'OtherObjectID'}
+    )
+    pair_columns = ['LeadObjectID', 'OtherObjectID', 'ocel:type']
+
+    # Number of candidate pairs generated by each event shared by both sides, in order of appearance
+    lead_counts = lead_relations.groupby('ocel:eid', sort=False).size()
+    other_counts = other_relations.groupby('ocel:eid', sort=False).size()
+    pairs_per_event = (lead_counts * other_counts.reindex(lead_counts.index)).dropna()
+    if len(pairs_per_event) == 0:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in pair_columns})
+
+    # Assign consecutive events to chunks of about 'chunk_size' candidate pairs
+    event_chunks = (pairs_per_event.cumsum() - 1) // max(1, chunk_size)
+    lead_chunks = partition_dataframe(lead_relations.assign(chunk=lead_relations['ocel:eid'].map(event_chunks)), 'chunk')
+    other_chunks = partition_dataframe(other_relations.assign(chunk=other_relations['ocel:eid'].map(event_chunks)), 'chunk')
+
+    collected = []
+    collected_rows = 0
+    compact_threshold = max(1, chunk_size)
+    for chunk, lead_chunk in lead_chunks.items():
+        pairs = pd.merge(
+            lead_chunk[['ocel:eid', 'LeadObjectID']],
+            other_chunks[chunk][['ocel:eid', 'OtherObjectID', 'ocel:type']],
+            on='ocel:eid'
+        )[pair_columns].drop_duplicates()
+        collected.append(pairs)
+        collected_rows += len(pairs)
+        # Compact the pairs collected so far whenever they grow beyond twice the distinct pairs (or a chunk)
+        if collected_rows > compact_threshold and len(collected) > 1:
+            collected = [pd.concat(collected, ignore_index=True).drop_duplicates()]
+            collected_rows = len(collected[0])
+            compact_threshold = max(compact_threshold, 2 * collected_rows)
+
+    return pd.concat(collected, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def _columns_with_values(df):
+    # Attribute columns (not starting with 'ocel:') where at least one row has a non-null value
+    return [col for col in df.columns if not col.startswith('ocel:') and df[col].notnull().any()]
+
+
+def build_object_table(obj_df, value_columns=None):
+    # Build the table of an object type from its partition of ocel.objects
+    # value_columns: the attribute columns of the type with at least one value (see value_columns_by_type), found by
+    # scanning the partition when not given. The table is a column subset of the partition, the data is not copied.
+    if value_columns is None:
+        value_columns = _columns_with_values(obj_df)
+    # Select ID column and additional columns, rename 'ocel:oid' to 'ID' and clean the other names
+    obj_df = obj_df[['ocel:oid'] + value_columns]
+    obj_df.columns = ['ID'] + [clean_name(col) for col in value_columns]
+    return obj_df
+
+
+def build_event_table(evt_df, value_columns=None):
+    # Build the table of an event type from its partition of ocel.events (value_columns: see build_object_table)
+    if value_columns is None:
+        value_columns = _columns_with_values(evt_df)
+    # Select ID column, Time column, and additional columns, rename 'ocel:eid' to 'ID', 'ocel:timestamp' to 'Time'
+    # and clean the other names
+    evt_df = evt_df[['ocel:eid', 'ocel:timestamp'] + value_columns]
+    evt_df.columns = ['ID', 'Time'] + [clean_name(col) for col in value_columns]
+    return evt_df
+
+
+def build_relationship_table(rel_df, obj_name, custom=False):
+    # Create a dataframe for an (event type, object type) pair from its rows of ocel.relations
+    # Columns should be 'ID' (object ID), 'EventID' (event ID)
+    pair_df = rel_df[['ocel:oid', 'ocel:eid']].copy()
+    if custom:
+        pair_df.rename(columns={'ocel:eid': 'ID', 'ocel:oid': obj_name}, inplace=True)
+    else:
+        pair_df.rename(columns={'ocel:oid': 'ID', 'ocel:eid': 'EventID'}, inplace=True)
+    return pair_df
+
+
+def merge_lead_object_relations(relations_df, lead_object_type):
+    # Filter relations to get lead object type relations
+    lead_relations = relations_df[relations_df['ocel:type'] == lead_object_type].rename(
+        columns={'ocel:oid': 'LeadObjectID'}
+    )
+
+    # Filter relations to get other object types
+    other_relations = relations_df[relations_df['ocel:type'] != lead_object_type].rename(
+        columns={'ocel:oid': 'OtherObjectID'}
+    )
+
+    # Merge on event ID to find object-to-object relations
+    return pd.merge(
+        lead_relations[['ocel:eid', 'LeadObjectID']],
+        other_relations[['ocel:eid', 'OtherObjectID', 'ocel:type']],
+        on='ocel:eid'
+    )
 
-def transform_ocel(ocel, custom=False, create_object_relations=False, lead_object_type=None):
-    # Function to clean names: strip non-alphanumerical characters and spaces, capitalize first letter of each word
-    def clean_name(name):
-        name = re.sub(r'[^0-9a-zA-Z ]+', '', name)
-        name = ' '.join(word.capitalize() for word in name.split())
-        name = name.replace(' ', '')
-        return name
 
+def build_lead_object_relations(relations_df, lead_object_type, o2o_chunk_size=None, denormalization=None):
+    # Relations between the lead objects and the objects of the other types related to the same events.
+    # Returns the parent mappings ({clean child type: series from child object ID to lead object ID}) of the child
+    # types whose objects are related to exactly one lead object, and the object relationship tables of the others.
+    # With a denormalization plan, a child type can also be hybrid: the parent mapping holds the child objects with
+    # exactly one lead object, and the object relationship table only the other ones.
+    lead_obj_name = clean_name(lead_object_type)
+    parent_mappings = {}
+    object_relationship_tables = {}
+
+    with stage('o2o_pairs', rows=len(relations_df)) as s:
+        if o2o_chunk_size is not None:
+            # Derive distinct (lead, other) object pairs chunk by chunk of events, with bounded memory
+            merged_relations = derive_lead_object_pairs(relations_df, lead_object_type, o2o_chunk_size)
+        else:
+            merged_relations = merge_lead_object_relations(relations_df, lead_object_type)
+        s.update(df=merged_relations)
+
+    # For each other object type
+    for obj_type, obj_type_relations in partition_dataframe(merged_relations, 'ocel:type').items():
+        child_obj_name = clean_name(obj_type)
+
+        # Check if each child object is related to exactly one lead object
+        counts = obj_type_relations.groupby('OtherObjectID')['LeadObjectID'].nunique()
+        decision = link_decision(denormalization, 'o2o', obj_type, bool(counts.eq(1).all()))
+        if decision == 'embed':
+            # Map from child object ID to parent object ID
+            parent_mappings[child_obj_name] = obj_type_relations[['OtherObjectID', 'LeadObjectID']].drop_duplicates().set_index('OtherObjectID')['LeadObjectID']
+            continue
+        if decision == 'hybrid':
+            # Map the child objects with exactly one parent, keep the other ones in the relationship table
+            one_to_one, obj_type_relations = split_one_to_one(obj_type_relations, 'OtherObjectID', 'LeadObjectID')
+            parent_mappings[child_obj_name] = one_to_one.set_index('OtherObjectID')['LeadObjectID']
+        # Create object relationship dataframe
+        rel_df = obj_type_relations[['LeadObjectID', 'OtherObjectID']].rename(
+            columns={'LeadObjectID': lead_obj_name, 'OtherObjectID': 'ID'}
+        )
+        object_relationship_tables[f"{lead_obj_name}_{child_obj_name}_objrelations"] = rel_df
+    return parent_mappings, object_relationship_tables
+
+
+def _partition_ocel(ocel):
+    # Split objects and events per type in one pass each, keeping only the columns with values of every type
+    with stage('non_null_columns', rows=len(ocel.objects) + len(ocel.events)):
+        object_columns = value_columns_by_type(ocel.objects, 'ocel:type')
+        event_columns = value_columns_by_type(ocel.events, 'ocel:activity')
+    with stage('partition_objects', rows=len(ocel.objects)):
+        object_partitions = partition_value_columns(ocel.objects, 'ocel:type', object_columns)
+    with stage('partition_events', rows=len(ocel.events)):
+        event_partitions = partition_value_columns(ocel.events, 'ocel:activity', event_columns)
+    return object_partitions, event_partitions, object_columns, event_columns
+
+
+def transform_ocel(ocel, custom=False, create_object_relations=False, lead_object_type=None, o2o_chunk_size=None,
+                   lazy=False, denormalization=None):
+    # Returns the object, event, relationship and object relationship tables as four dicts. With lazy=True, they are
+    # LazyTables mappings with the same keys, whose tables are only built when accessed (see lazy_transform_ocel).
+    # denormalization: optional plan of denormalization_planner.plan_denormalization, telling which links are
+    # embedded as columns, stored as relationship tables, or both (see link_decision).
+    if lazy:
+        return lazy_transform_ocel(ocel, custom=custom, create_object_relations=create_object_relations,
+                                   lead_object_type=lead_object_type, o2o_chunk_size=o2o_chunk_size,
+                                   denormalization=denormalization)
+    object_partitions, event_partitions, object_columns, event_columns = _partition_ocel(ocel)
+
+    return transform_partitions(object_partitions, event_partitions, ocel.relations, custom=custom,
+                                create_object_relations=create_object_relations, lead_object_type=lead_object_type,
+                                o2o_chunk_size=o2o_chunk_size, object_columns=object_columns,
+                                event_columns=event_columns, denormalization=denormalization)
+
+
+def iter_transform_ocel(ocel, custom=False, create_object_relations=False, lead_object_type=None, o2o_chunk_size=None,
+                        denormalization=None):
+    # Same as transform_ocel, but the tables are yielded one by one as soon as each one is complete
+    # (see iter_transform_partitions)
+    object_partitions, event_partitions, object_columns, event_columns = _partition_ocel(ocel)
+
+    yield from iter_transform_partitions(object_partitions, event_partitions, ocel.relations, custom=custom,
+                                         create_object_relations=create_object_relations,
+                                         lead_object_type=lead_object_type, o2o_chunk_size=o2o_chunk_size,
+                                         object_columns=object_columns, event_columns=event_columns,
+                                         denormalization=denormalization)
+
+
+def transform_partitions(object_partitions, event_partitions, relations_df, custom=False, create_object_relations=False,
+                         lead_object_type=None, o2o_chunk_size=None, object_columns=None, event_columns=None,
+                         denormalization=None):
+    # Build the tables from the per-type partitions of the objects and the events (dicts in order of first
+    # appearance) and from the relations table. Used by transform_ocel, and by readers building the partitions directly.
+    # object_columns / event_columns: optional {type: attribute columns with values} (see value_columns_by_type);
+    # without them, the columns of every partition are scanned.
     # Prepare collections
     object_dataframes = {}
     event_dataframes = {}
     relationship_dataframes = {}
+    object_relationship_dataframes = {}
+    collections = {
+        'object': object_dataframes,
+        'event': event_dataframes,
+        'relationship': relationship_dataframes,
+        'object_relationship': object_relationship_dataframes,
+    }
+
+    for kind, key, df in iter_transform_partitions(object_partitions, event_partitions, relations_df, custom=custom,
+                                                   create_object_relations=create_object_relations,
+                                                   lead_object_type=lead_object_type, o2o_chunk_size=o2o_chunk_size,
+                                                   object_columns=object_columns, event_columns=event_columns,
+                                                   denormalization=denormalization):
+        collections[kind][key] = df
 
-    # Get unique object types and event types
-    object_types = ocel.objects['ocel:type'].unique()
-    event_types = ocel.events['ocel:activity'].unique()
+    return object_dataframes, event_dataframes, relationship_dataframes, object_relationship_dataframes
 
-    # Process objects for each object type
-    for obj_type in object_types:
-        # Clean object type name
-        df_name = clean_name(obj_type)
-        # Filter objects of this type
-        obj_df = ocel.objects[ocel.objects['ocel:type'] == obj_type].copy()
-        # Remove columns starting with 'ocel:'
-        additional_columns = [col for col in obj_df.columns if not col.startswith('ocel:')]
-        # Keep columns where at least one object has a non-null value
-        cols_with_values = [col for col in additional_columns if obj_df[col].notnull().any()]
-        # Select ID column and additional columns
-        columns_to_keep = ['ocel:oid'] + cols_with_values
-        obj_df = obj_df[columns_to_keep]
-        # Rename 'ocel:oid' to 'ID'
-        obj_df.rename(columns={'ocel:oid': 'ID'}, inplace=True)
-        new_columns = {x: clean_name(x) for x in obj_df.columns}
-        new_columns["ID"] = "ID"
-        obj_df.rename(columns=new_columns, inplace=True)
-        # Add to the collection
-        object_dataframes[df_name] = obj_df
 
-    # Process events for each event type
-    for evt_type in event_types:
-        # Clean event type name
-        df_name = clean_name(evt_type)
-        # Filter events of this type
-        evt_df = ocel.events[ocel.events['ocel:activity'] == evt_type].copy()
-        # Remove columns starting with 'ocel:'
-        additional_columns = [col for col in evt_df.columns if not col.startswith('ocel:')]
-        # Keep columns where at least one event has a non-null value
-        cols_with_values = [col for col in additional_columns if evt_df[col].notnull().any()]
-        # Select ID column, Time column, and additional columns
-        columns_to_keep = ['ocel:eid', 'ocel:timestamp'] + cols_with_values
-        evt_df = evt_df[columns_to_keep]
-        # Rename 'ocel:eid' to 'ID', 'ocel:timestamp' to 'Time'
-        evt_df.rename(columns={'ocel:eid': 'ID', 'ocel:timestamp': 'Time'}, inplace=True)
-        new_columns = {x: clean_name(x) for x in evt_df.columns}
-        new_columns["ID"] = "ID"
-        evt_df.rename(columns=new_columns, inplace=True)
-        # Add to the collection
-        event_dataframes[df_name] = evt_df
+def iter_transform_partitions(object_partitions, event_partitions, relations_df, custom=False,
+                              create_object_relations=False, lead_object_type=None, o2o_chunk_size=None,
+                              object_columns=None, event_columns=None, denormalization=None):
+    # Yield the tables of transform_partitions one by one, as soon as each one is complete, as (kind, key, dataframe)
+    # with kind 'relationship', 'event', 'object_relationship' or 'object' (in this order), so that a consumer
+    # (e.g. the pipelined upload) can send and free every table while the next ones are built.
+    # Clean type names (fails when two types would get the same table)
+    object_names = clean_name_map(object_partitions)
+    event_names = clean_name_map(event_partitions)
 
     # Process relationships between events and objects
-    relations_df = ocel.relations
-    # Get unique pairs of (event type, object type)
-    event_object_pairs = relations_df[['ocel:activity', 'ocel:type']].drop_duplicates()
-    for idx, row in event_object_pairs.iterrows():
-        evt_type = row['ocel:activity']
-        obj_type = row['ocel:type']
+    # Split relations per (event type, object type) pair and check, for all the pairs at once,
+    # whether each event of the event type is related to exactly one object of the object type
+    with stage('e2o_cardinality', rows=len(relations_df)):
+        e2o_cardinality = analyze_e2o_cardinality(relations_df)
+    # The 1:1 pairs become columns of their event table, the other pairs are complete relationship tables
+    # (unless the denormalization plan decides otherwise, see link_decision)
+    embedded_objects = {}
+    for pair in list(e2o_cardinality):
+        (evt_type, obj_type), (is_one_to_one, rel_df) = pair, e2o_cardinality.pop(pair)
         # Clean names
         evt_name = clean_name(evt_type)
         obj_name = clean_name(obj_type)
 
-        # Filter relations for this pair
-        rel_df = relations_df[(relations_df['ocel:activity'] == evt_type) & (relations_df['ocel:type'] == obj_type)]
-
-        # Check if each event of this event type is related to exactly one object of this object type
-        counts = rel_df.groupby('ocel:eid')['ocel:oid'].nunique()
-        if counts.eq(1).all():
-            # Map from event ID to object ID
-            eid_to_oid = rel_df.set_index('ocel:eid')['ocel:oid']
-            # Get the event dataframe
-            evt_df = event_dataframes[evt_name]
-            # Map event IDs to object IDs
-            if custom:
-                this_c_name = obj_name
-            else:
-                this_c_name = obj_name
-            evt_df[this_c_name] = evt_df['ID'].map(eid_to_oid)
-            # Update the event dataframe in the collection
-            event_dataframes[evt_name] = evt_df
+        decision = link_decision(denormalization, 'e2o', (evt_type, obj_type), is_one_to_one)
+        if decision == 'hybrid':
+            # Embed the events related to exactly one object, keep the other ones in the relationship table
+            one_to_one, rel_df = split_one_to_one(rel_df, 'ocel:eid', 'ocel:oid')
+            embedded_objects.setdefault(evt_name, []).append((obj_name, one_to_one))
+        if decision == 'embed':
+            embedded_objects.setdefault(evt_name, []).append((obj_name, rel_df))
         else:
-            # Create a dataframe for this (event type, object type) pair
-            # Columns should be 'ID' (object ID), 'EventID' (event ID)
-            pair_df = rel_df[['ocel:oid', 'ocel:eid']].copy()
-            if custom:
-                pair_df.rename(columns={'ocel:eid': 'ID', 'ocel:oid': obj_name}, inplace=True)
-            else:
-                pair_df.rename(columns={'ocel:oid': 'ID', 'ocel:eid': 'EventID'}, inplace=True)
             # Store under key (evt_name, obj_name)
             key = (evt_name, obj_name)
-            relationship_dataframes[key] = pair_df
+            with stage('relationship_table', table=f"{evt_name}_{obj_name}") as s:
+                rel_table = build_relationship_table(rel_df, obj_name, custom=custom)
+                s.update(df=rel_table)
+            yield 'relationship', key, rel_table
+
+    # Process events for each event type
+    for evt_type, evt_df in event_partitions.items():
+        # Clean event type name
+        df_name = event_names[evt_type]
+        with stage('event_table', table=df_name) as s:
+            evt_table = build_event_table(evt_df, (event_columns or {}).get(evt_type))
+            s.update(df=evt_table)
+        for obj_name, rel_df in embedded_objects.pop(df_name, []):
+            with stage('embed_object_column', table=f"{df_name}_{obj_name}", rows=len(rel_df)):
+                # Map event IDs to object IDs
+                eid_to_oid = rel_df.set_index('ocel:eid')['ocel:oid']
+                evt_table[obj_name] = evt_table['ID'].map(eid_to_oid)
+        yield 'event', df_name, evt_table
+    if embedded_objects:
+        # Relations of an event type without events
+        raise KeyError(next(iter(embedded_objects)))
 
     # Process object-to-object relationships if the flag is set
+    parent_mappings = {}
     if create_object_relations and lead_object_type is not None:
-        object_relationship_dataframes = {}
-
         lead_obj_name = clean_name(lead_object_type)
+        parent_mappings, object_relationship_tables = build_lead_object_relations(relations_df, lead_object_type,
+                                                                                  o2o_chunk_size, denormalization)
+        for key in list(object_relationship_tables):
+            yield 'object_relationship', key, object_relationship_tables.pop(key)
 
-        # Filter relations to get lead object type relations
-        lead_relations = ocel.relations[ocel.relations['ocel:type'] == lead_object_type].rename(
-            columns={'ocel:oid': 'LeadObjectID'}
-        )
-
-        # Filter relations to get other object types
-        other_relations = ocel.relations[ocel.relations['ocel:type'] != lead_object_type].rename(
-            columns={'ocel:oid': 'OtherObjectID'}
-        )
-
-        # Merge on event ID to find object-to-object relations
-        merged_relations = pd.merge(
-            lead_relations[['ocel:eid', 'LeadObjectID']],
-            other_relations[['ocel:eid', 'OtherObjectID', 'ocel:type']],
-            on='ocel:eid'
-        )
-
-
-        # For each other object type
-        for obj_type in merged_relations['ocel:type'].unique():
-            child_obj_name = clean_name(obj_type)
-
-            obj_type_relations = merged_relations[merged_relations['ocel:type'] == obj_type]
-
-            # Check if each child object is related to exactly one lead object
-            counts = obj_type_relations.groupby('OtherObjectID')['LeadObjectID'].nunique()
-            if counts.eq(1).all():
-                # Map from child object ID to parent object ID
-                mapping = obj_type_relations[['OtherObjectID', 'LeadObjectID']].drop_duplicates().set_index('OtherObjectID')['LeadObjectID']
-
-                # Get the object dataframe
-                obj_df_name = clean_name(obj_type)
-                obj_df = object_dataframes[obj_df_name]
-
-                # Add parent object column
-                parent_col_name = clean_name(lead_object_type)
-                obj_df[parent_col_name] = obj_df['ID'].map(mapping)
-
-                # Update the object dataframe
-                object_dataframes[obj_df_name] = obj_df
-            else:
-                # Create object relationship dataframe
-                rel_df = obj_type_relations[['LeadObjectID', 'OtherObjectID']].rename(
-                    columns={'LeadObjectID': lead_obj_name, 'OtherObjectID': 'ID'}
-                )
-                parent_name = clean_name(lead_object_type)
-                child_name = clean_name(obj_type)
-                key = f"{parent_name}_{child_name}_objrelations"
-                object_relationship_dataframes[key] = rel_df
-    else:
-        object_relationship_dataframes = {}
-
-    return object_dataframes, event_dataframes, relationship_dataframes, object_relationship_dataframes
-
-
-def dataframe_to_sql(df, output_file):
-    sql_statements = []
-
-    for index, row in df.iterrows():
-        select_parts = []
-
-        for col_name, value in row.items():
-            if pd.isnull(value):
-                value_str = 'NULL'
-            else:
-                if isinstance(value, pd.Timestamp):
-                    value_str = f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S')}'"
-                elif isinstance(value, float) or isinstance(value, int):
-                    value_str = str(value)
-                else:
-                    # Escape single quotes in the value
-                    value_str = "'" + str(value).replace("'", "\'") + "'"
-
-            select_parts.append(f"{value_str} AS \"{col_name}\"")
-
-        select_statement = "SELECT\n\t" + ",\n\t".join(select_parts) + "\nFROM (SELECT 1) AS dummy\nWHERE 1=1"
-        sql_statements.append(select_statement)
-
-    # Combine the SELECT statements using UNION ALL
-    full_sql = "\n\nUNION ALL\n\n".join(sql_statements)
-
-    # Write to the output file
-    with open(output_file, 'w') as f:
-        f.write(full_sql)
+    # Process objects for each object type
+    for obj_type, obj_df in object_partitions.items():
+        # Clean object type name
+        df_name = object_names[obj_type]
+        with stage('object_table', table=df_name) as s:
+            obj_table = build_object_table(obj_df, (object_columns or {}).get(obj_type))
+            s.update(df=obj_table)
+        if df_name in parent_mappings:
+            # Add parent object column
+            obj_table[lead_obj_name] = obj_table['ID'].map(parent_mappings.pop(df_name))
+        yield 'object', df_name, obj_table
+    if parent_mappings:
+        # Child object type without objects
+        raise KeyError(next(iter(parent_mappings)))
+
+
+class LazyTables(Mapping):
+    # Read-only mapping {key: table} whose names are known up front, and whose tables are built by build(key) on
+    # first access. A built table is kept until release(key), so a consumer can hold a single table at a time by
+    # releasing every table after use (accessing it again builds it again). 'keys' is a list, or a function
+    # returning the list, called on first use. Note that values() and items() build (and keep) every table.
+    # 'source': the OCEL object the tables are split from, if any (read by the consumers that only need its IDs).
+    def __init__(self, keys, build, source=None):
+        self._keys = keys
+        self._build = build
+        self.source = source
+        self._tables = {}
+        self._columns = {}
+
+    def _key_list(self):
+        if callable(self._keys):
+            self._keys = list(self._keys())
+        return self._keys
+
+    def __getitem__(self, key):
+        if key not in self._tables:
+            if key not in self:
+                raise KeyError(key)
+            df = self._build(key)
+            self._tables[key] = df
+            self._columns[key] = list(df.columns)
+        return self._tables[key]
+
+    def __iter__(self):
+        return iter(self._key_list())
+
+    def __len__(self):
+        return len(self._key_list())
+
+    def __contains__(self, key):
+        return key in self._key_list()
+
+    def release(self, key):
+        # Forget the table, so its memory is freed once the caller drops its own references
+        self._tables.pop(key, None)
+
+    def columns(self, key):
+        # Column names of the table (built and released again if it was never built)
+        if key not in self._columns:
+            self[key]
+            self.release(key)
+        return self._columns[key]
+
+    def __repr__(self):
+        return f"LazyTables({len(self)} tables, {len(self._tables)} built)"
+
+
+def release_table(dataframes, key):
+    # Release a table of a LazyTables mapping after use (no-op for a plain dict)
+    if isinstance(dataframes, LazyTables):
+        dataframes.release(key)
+
+
+def table_columns(dataframes, key):
+    # Column names of a table, without keeping a lazy table built
+    if isinstance(dataframes, LazyTables):
+        return dataframes.columns(key)
+    return list(dataframes[key].columns)
+
+
+def lazy_transform_ocel(ocel, custom=False, create_object_relations=False, lead_object_type=None, o2o_chunk_size=None,
+                        denormalization=None):
+    # Same tables as transform_ocel, as four LazyTables mappings. Only what the names depend on is computed here:
+    # the row positions of every type and (event type, object type) pair, the columns with values of every type,
+    # and the 1:1 pairs. Each table is then built from the OCEL when it is accessed, so a consumer releasing every
+    # table after use never holds more than one table besides the log. The object-to-object relations (needed by
+    # the object tables and the object relationship tables, and by their names) are derived once, on first use.
+    objects, events, relations = ocel.objects, ocel.events, ocel.relations
+
+    with stage('partition_positions', rows=len(objects) + len(events) + len(relations)):
+        object_positions = partition_positions(objects, 'ocel:type')
+        event_positions = partition_positions(events, 'ocel:activity')
+        pair_positions = partition_positions(relations, ['ocel:activity', 'ocel:type'])
+    with stage('non_null_columns', rows=len(objects) + len(events)):
+        object_columns = value_columns_by_type(objects, 'ocel:type')
+        event_columns = value_columns_by_type(events, 'ocel:activity')
+    # Clean type names (fails when two types would get the same table)
+    object_types = {name: typ for typ, name in clean_name_map(object_positions).items()}
+    event_types = {name: typ for typ, name in clean_name_map(event_positions).items()}
+
+    # The 1:1 pairs become columns of their event table, the other pairs are relationship tables
+    with stage('e2o_cardinality', rows=len(relations)):
+        one_to_one = e2o_one_to_one(relations) if len(relations) > 0 else {}
+    # (hybrid pairs are split between the two when their tables are built)
+    embedded_objects = {}
+    relationship_positions = {}
+    hybrid_pairs = set()
+    for (evt_type, obj_type), rows in pair_positions.items():
+        evt_name = clean_name(evt_type)
+        obj_name = clean_name(obj_type)
+        decision = link_decision(denormalization, 'e2o', (evt_type, obj_type), bool(one_to_one[(evt_type, obj_type)]))
+        if decision == 'hybrid':
+            hybrid_pairs.add((evt_name, obj_name))
+        if decision != 'table':
+            embedded_objects.setdefault(evt_name, []).append((obj_name, rows))
+        if decision != 'embed':
+            relationship_positions[(evt_name, obj_name)] = rows
+    for evt_name in embedded_objects:
+        if evt_name not in event_types:
+            # Relations of an event type without events
+            raise KeyError(evt_name)
+
+    object_relations = {}
+
+    def derive_object_relations():
+        if not object_relations:
+            parent_mappings, object_relationship_tables = {}, {}
+            if create_object_relations and lead_object_type is not None:
+                parent_mappings, object_relationship_tables = build_lead_object_relations(relations, lead_object_type,
+                                                                                          o2o_chunk_size,
+                                                                                          denormalization)
+            for obj_name in parent_mappings:
+                if obj_name not in object_types:
+                    # Child object type without objects
+                    raise KeyError(obj_name)
+            object_relations.update(parent_mappings=parent_mappings, tables=object_relationship_tables)
+        return object_relations
+
+    def build_object(df_name):
+        obj_type = object_types[df_name]
+        value_columns = object_columns[obj_type]
+        parent_mappings = derive_object_relations()["parent_mappings"]
+        with stage('object_table', table=df_name) as s:
+            obj_table = build_object_table(take_rows(objects, object_positions[obj_type], ['ocel:oid'] + value_columns),
+                                           value_columns)
+            s.update(df=obj_table)
+        if df_name in parent_mappings:
+            # Add parent object column
+            obj_table[clean_name(lead_object_type)] = obj_table['ID'].map(parent_mappings[df_name])
+        return obj_table
+
+    def build_event(df_name):
+        evt_type = event_types[df_name]
+        value_columns = event_columns[evt_type]
+        with stage('event_table', table=df_name) as s:
+            evt_table = build_event_table(
+                take_rows(events, event_positions[evt_type], ['ocel:eid', 'ocel:timestamp'] + value_columns),
+                value_columns)
+            s.update(df=evt_table)
+        for obj_name, rows in embedded_objects.get(df_name, []):
+            with stage('embed_object_column', table=f"{df_name}_{obj_name}", rows=len(rows)):
+                # Map event IDs to object IDs
+                rel_df = take_rows(relations, rows, ['ocel:eid', 'ocel:oid'])
+                if (df_name, obj_name) in hybrid_pairs:
+                    rel_df = split_one_to_one(rel_df, 'ocel:eid', 'ocel:oid')[0]
+                eid_to_oid = rel_df.set_index('ocel:eid')['ocel:oid']
+                evt_table[obj_name] = evt_table['ID'].map(eid_to_oid)
+        return evt_table
+
+    def build_relationship(key):
+        evt_name, obj_name = key
+        with stage('relationship_table', table=f"{evt_name}_{obj_name}") as s:
+            rel_df = take_rows(relations, relationship_positions[key], ['ocel:oid', 'ocel:eid'])
+            if key in hybrid_pairs:
+                rel_df = split_one_to_one(rel_df, 'ocel:eid', 'ocel:oid')[1]
+            rel_table = build_relationship_table(rel_df, obj_name, custom=custom)
+            s.update(df=rel_table)
+        return rel_table
+
+    def build_object_relationship(key):
+        # The object relationship tables all come out of the derivation: hand each one over, and derive them again
+        # if a table is accessed after its release
+        if key not in derive_object_relations()["tables"]:
+            object_relations.clear()
+        return derive_object_relations()["tables"].pop(key)
+
+    return (LazyTables(list(object_types), build_object, source=ocel),
+            LazyTables(list(event_types), build_event, source=ocel),
+            LazyTables(list(relationship_positions), build_relationship),
+            LazyTables(lambda: list(derive_object_relations()["tables"]), build_object_relationship))
 
 
 if __name__ == "__main__":
-    ocel = pm4py.read_ocel2("ContainerLogistics.json")
+    # Parsed logs are cached on disk (see ocel_cache), so reruns on the same file skip the parse
+    from ocel_cache import read_ocel_cached
+
+    with stage('read_ocel'):
+        ocel = read_ocel_cached("ContainerLogistics.json", pm4py.read_ocel2)
 
     # Set the flag and specify the lead object type
     create_object_relations = True
@@ -215,31 +621,41 @@ if __name__ == "__main__":
 
     target_folder = "target"
 
+    # Streaming export settings: output form ('insert', 'union_all' or 'csv') and size caps
+    export_format = 'insert'
+    max_statement_bytes = 16 * 1024 * 1024
+    max_file_bytes = 256 * 1024 * 1024
+    extension = ".csv" if export_format == 'csv' else ".sql"
+
     if os.path.exists(target_folder):
         shutil.rmtree(target_folder)
     os.mkdir(target_folder)
 
-    # Export object DataFrames to SQL files
+    # Export object DataFrames to SQL (or CSV) files
     for ot, objs in object_dfs.items():
-        output_file = os.path.join(target_folder, f"{ot}_objects.sql")
-        dataframe_to_sql(objs, output_file)
-        print(f"Exported {ot} objects to {output_file}")
+        output_file = os.path.join(target_folder, f"{ot}_objects{extension}")
+        output_files = export_dataframe(objs, output_file, output_format=export_format,
+                                        max_statement_bytes=max_statement_bytes, max_file_bytes=max_file_bytes)
+        print(f"Exported {ot} objects to {', '.join(output_files)}")
 
-    # Export event DataFrames to SQL files
+    # Export event DataFrames to SQL (or CSV) files
     for et, evs in event_dfs.items():
-        output_file = os.path.join(target_folder, f"{et}_events.sql")
-        dataframe_to_sql(evs, output_file)
-        print(f"Exported {et} events to {output_file}")
+        output_file = os.path.join(target_folder, f"{et}_events{extension}")
+        output_files = export_dataframe(evs, output_file, output_format=export_format,
+                                        max_statement_bytes=max_statement_bytes, max_file_bytes=max_file_bytes)
+        print(f"Exported {et} events to {', '.join(output_files)}")
 
-    # Export relationship DataFrames to SQL files
+    # Export relationship DataFrames to SQL (or CSV) files
     for (evt_name, obj_name), rel in relationship_dfs.items():
         table_name = f"{evt_name}_{obj_name}_relations"
-        output_file = os.path.join(target_folder, f"{table_name}.sql")
-        dataframe_to_sql(rel, output_file)
-        print(f"Exported {table_name} relationships to {output_file}")
+        output_file = os.path.join(target_folder, f"{table_name}{extension}")
+        output_files = export_dataframe(rel, output_file, output_format=export_format,
+                                        max_statement_bytes=max_statement_bytes, max_file_bytes=max_file_bytes)
+        print(f"Exported {table_name} relationships to {', '.join(output_files)}")
 
-    # Export object relationship DataFrames to SQL files
+    # Export object relationship DataFrames to SQL (or CSV) files
     for rel_name, rel_df in object_relationship_dfs.items():
-        output_file = os.path.join(target_folder, f"{rel_name}.sql")
-        dataframe_to_sql(rel_df, output_file)
-        print(f"Exported {rel_name} relationships to {output_file}")
+        output_file = os.path.join(target_folder, f"{rel_name}{extension}")
+        output_files = export_dataframe(rel_df, output_file, output_format=export_format,
+                                        max_statement_bytes=max_statement_bytes, max_file_bytes=max_file_bytes)
+        print(f"Exported {rel_name} relationships to {', '.join(output_files)}")
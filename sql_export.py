@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Output forms supported by the streaming export
+EXPORT_FORMATS = ('insert', 'union_all', 'csv')
+
+# Default upper bound for the size of a single statement (or CSV block) of the streaming export
+DEFAULT_MAX_STATEMENT_BYTES = 16 * 1024 * 1024
+
+
+def quote_sql_string(value):
+    # Quote a value as a SQL string literal, escaping single quotes by doubling them
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def format_sql_value(value):
+    # Format a single value as a SQL literal (fallback for columns that mix value types)
+    if pd.isnull(value):
+        return 'NULL'
+    if isinstance(value, pd.Timestamp):
+        return f"TIMESTAMP '{value.strftime(TIMESTAMP_FORMAT)}'"
+    if isinstance(value, float) or isinstance(value, int):
+        return str(value)
+    return quote_sql_string(value)
+
+
+def format_csv_value(value):
+    # Format a single value as a COPY-compatible CSV field (empty unquoted field for NULL)
+    if pd.isnull(value):
+        return ''
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, float) or isinstance(value, int):
+        return str(value)
+    return quote_csv_string(value)
+
+
+def quote_csv_string(value):
+    # Quote a value as a CSV field, escaping double quotes by doubling them
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _format_non_null(values, csv=False):
+    # Format a series without null values, choosing a vectorized path from its dtype
+    dtype = values.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype) or dtype.kind == 'M':
+        formatted = values.dt.strftime(TIMESTAMP_FORMAT)
+        if not csv:
+            formatted = "TIMESTAMP '" + formatted + "'"
+        return formatted.to_numpy(dtype=object)
+    if isinstance(dtype, np.dtype):
+        if dtype.kind == 'b':
+            return np.where(values.to_numpy(), 'True', 'False').astype(object)
+        if dtype.kind in 'iu':
+            return values.astype(str).to_numpy(dtype=object)
+        if dtype.kind == 'f':
+            # Python floats are printed with the shortest float64 representation
+            return values.astype('float64').astype(str).to_numpy(dtype=object)
+    if isinstance(dtype, pd.StringDtype) or (dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string'):
+        if csv:
+            return ('"' + values.astype(str).str.replace('"', '""', regex=False) + '"').to_numpy(dtype=object)
+        return ("'" + values.astype(str).str.replace("'", "''", regex=False) + "'").to_numpy(dtype=object)
+    # Mixed or exotic values: format them one by one, exactly as a row-wise export would
+    format_value = format_csv_value if csv else format_sql_value
+    return np.array([format_value(value) for value in values.astype(object)], dtype=object)
+
+
+def format_sql_column(values, csv=False):
+    # Format a whole column as SQL literals (or CSV fields) at once, with NULL for missing values
+    formatted = np.full(len(values), '' if csv else 'NULL', dtype=object)
+    not_null = values.notna().to_numpy()
+    if not_null.any():
+        formatted[not_null] = _format_non_null(values[not_null], csv=csv)
+    return formatted
+
+
+def format_sql_columns(df, csv=False):
+    # Format every column of the dataframe as SQL literals, one column at a time.
+    # Values are seen with the same types as when iterating the rows of the dataframe: if all the columns share
+    # a common numpy dtype (e.g. ints and floats become floats), every column is first cast to that dtype.
+    if len(df) > 0 and df.iloc[:1].values.dtype != object:
+        values = df.to_numpy()
+        columns = [pd.Series(values[:, i]) for i in range(values.shape[1])]
+    else:
+        columns = [df.iloc[:, i] for i in range(df.shape[1])]
+    return [(str(col_name), format_sql_column(col, csv=csv)) for col_name, col in zip(df.columns, columns)]
+
+
+def dataframe_to_select_statements(df):
+    # Build one 'SELECT ... FROM (SELECT 1) AS dummy' statement per row, joining the formatted columns
+    select_parts = np.full(len(df), '', dtype=object)
+    for i, (col_name, formatted) in enumerate(format_sql_columns(df)):
+        separator = "" if i == 0 else ",\n\t"
+        select_parts = select_parts + separator + formatted + f" AS \"{col_name}\""
+    return list("SELECT\n\t" + select_parts + "\nFROM (SELECT 1) AS dummy\nWHERE 1=1")
+
+
+def dataframe_to_sql(df, output_file):
+    sql_statements = dataframe_to_select_statements(df)
+
+    # Combine the SELECT statements using UNION ALL
+    full_sql = "\n\nUNION ALL\n\n".join(sql_statements)
+
+    # Write to the output file
+    with open(output_file, 'w') as f:
+        f.write(full_sql)
+
+
+def _join_columns(formatted_columns, n_rows, separator, prefix='', suffix=''):
+    # Join the formatted columns of a batch into one string per row
+    rows = np.full(n_rows, prefix, dtype=object)
+    for i, formatted in enumerate(formatted_columns):
+        rows = rows + ("" if i == 0 else separator) + formatted
+    return rows + suffix
+
+
+def iter_formatted_rows(df, output_format='insert', batch_size=10000):
+    # Yield the rows of the dataframe already formatted for the given output form,
+    # formatting only 'batch_size' rows at a time
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        if output_format == 'union_all':
+            yield from dataframe_to_select_statements(batch)
+        elif output_format == 'insert':
+            formatted_columns = [formatted for _, formatted in format_sql_columns(batch)]
+            yield from _join_columns(formatted_columns, len(batch), ", ", prefix="(", suffix=")")
+        elif output_format == 'csv':
+            formatted_columns = [formatted for _, formatted in format_sql_columns(batch, csv=True)]
+            yield from _join_columns(formatted_columns, len(batch), ",")
+        else:
+            raise ValueError(f"Unsupported export format '{output_format}', expected one of {EXPORT_FORMATS}.")
+
+
+def csv_header(df):
+    return ",".join(quote_csv_string(col) for col in df.columns)
+
+
+def iter_export_chunks(df, table_name, output_format='insert', batch_size=10000,
+                       max_statement_bytes=DEFAULT_MAX_STATEMENT_BYTES):
+    # Yield the export of the dataframe as a sequence of self-contained chunks:
+    # - 'insert': multi-row INSERT INTO ... VALUES statements
+    # - 'union_all': SELECT ... UNION ALL ... statements
+    # - 'csv': blocks of CSV lines (without the header) that can be loaded with COPY ... (FORMAT csv, HEADER)
+    # Each chunk holds as many rows as fit in 'max_statement_bytes' (always at least one row, no limit if None)
+    if output_format == 'insert':
+        columns = ', '.join(f'"{col}"' for col in df.columns)
+        head, separator, tail = f'INSERT INTO "{table_name}" ({columns}) VALUES\n\t', ",\n\t", ";\n\n"
+    elif output_format == 'union_all':
+        head, separator, tail = "", "\n\nUNION ALL\n\n", ";\n\n"
+    else:
+        head, separator, tail = "", "\n", "\n"
+
+    rows = []
+    size = 0
+    overhead = len((head + tail).encode('utf-8'))
+    for row in iter_formatted_rows(df, output_format=output_format, batch_size=batch_size):
+        row_size = len(row.encode('utf-8')) + len(separator)
+        if rows and max_statement_bytes is not None and overhead + size + row_size > max_statement_bytes:
+            yield head + separator.join(rows) + tail
+            rows = []
+            size = 0
+        rows.append(row)
+        size += row_size
+    if rows:
+        yield head + separator.join(rows) + tail
+
+
+def export_dataframe(df, output_file, table_name=None, output_format='insert', batch_size=10000,
+                     max_statement_bytes=DEFAULT_MAX_STATEMENT_BYTES, max_file_bytes=None):
+    # Stream the export of the dataframe to disk, keeping in memory only one batch of rows and one chunk.
+    # When 'max_file_bytes' is set, the export is split across numbered files (<name>_0001<ext>, ...),
+    # each one starting with the CSV header for the 'csv' format. Returns the list of written files.
+    if table_name is None:
+        table_name = os.path.splitext(os.path.basename(output_file))[0]
+    with stage('export', table=table_name, rows=len(df)) as s:
+        written_files = _write_export(df, output_file, table_name, output_format, batch_size, max_statement_bytes,
+                                      max_file_bytes)
+        s.update(bytes=sum(os.path.getsize(path) for path in written_files))
+    return written_files
+
+
+def _write_export(df, output_file, table_name, output_format, batch_size, max_statement_bytes, max_file_bytes):
+    base, ext = os.path.splitext(output_file)
+    header = csv_header(df) + "\n" if output_format == 'csv' else ""
+
+    written_files = []
+    f = None
+    file_size = 0
+    try:
+        for chunk in iter_export_chunks(df, table_name, output_format=output_format, batch_size=batch_size,
+                                        max_statement_bytes=max_statement_bytes):
+            chunk_size = len(chunk.encode('utf-8'))
+            if f is None or (max_file_bytes is not None and file_size > 0 and file_size + chunk_size > max_file_bytes):
+                if f is not None:
+                    f.close()
+                path = output_file if max_file_bytes is None else f"{base}_{len(written_files) + 1:04d}{ext}"
+                f = open(path, 'w')
+                written_files.append(path)
+                f.write(header)
+                file_size = len(header.encode('utf-8'))
+            f.write(chunk)
+            file_size += chunk_size
+        if f is None:
+            # Empty dataframe: still produce the (empty) export
+            path = output_file if max_file_bytes is None else f"{base}_0001{ext}"
+            with open(path, 'w') as empty:
+                empty.write(header)
+            written_files.append(path)
+    finally:
+        if f is not None:
+            f.close()
+    return written_files
@@ -0,0 +1,206 @@
+# Type tightening of the tables right before their upload: every column gets the tightest type that keeps all its
+# values, so the dataframe handed to create_table (and serialized by it) is smaller.
+#
+# - integer columns, and float columns holding only whole numbers (e.g. float64 because some rows are missing), become
+#   the smallest integer type holding their values, nullable (Int8, Int16, ...) when some values are missing
+# - other float columns become float32 when it stores the same values (see compaction._downcast_numeric)
+# - object columns holding only strings become strings, only booleans boolean, only numbers numeric, and only
+#   timestamps datetime64
+# - timestamps are normalised to UTC: time zone aware ones are converted to UTC and stay time zone aware, naive ones
+#   are left as they are
+# Strings are never parsed as numbers: IDs such as '007' would lose their zeros and no longer match across tables.
+# Columns without any value are left as they are, so the schema of the table does not change.
+#
+# The report gives, per table, the rows and the payload of the table before and after tightening: its bytes once
+# serialized the way create_table sends it, as a parquet file (pycelonis writes the dataframe of its data push job
+# with pandas' to_parquet, through pyarrow: dictionary-encoded, snappy-compressed columns). Without pyarrow, the
+# payload is measured as CSV text, and 'payload_format' says which one was used. The deep memory before and after is
+# reported too. The tables of the splitter mostly have tight types already (str columns, datetime64 timestamps), so
+# the savings come from the integer-valued float and object columns.
+
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from compaction import _downcast_numeric
+from instrumentation import stage
+
+try:
+    import pyarrow  # noqa: F401  (engine of DataFrame.to_parquet)
+    PAYLOAD_FORMAT = 'parquet'
+except ImportError:
+    PAYLOAD_FORMAT = 'csv'
+
+INTEGER_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _smallest_integer_dtype(values):
+    # Smallest signed integer dtype holding the (non-missing) values
+    if len(values) == 0:
+        return np.int8
+    low, high = values.min(), values.max()
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return None
+
+
+def _tighten_integers(values, missing, index):
+    # Integer values (int64 numpy array) with their missing mask: smallest numpy integer type without missing values,
+    # smallest nullable integer type otherwise
+    dtype = _smallest_integer_dtype(values[~missing])
+    if dtype is None:
+        return None
+    if missing.any():
+        return pd.Series(pd.arrays.IntegerArray(np.where(missing, 0, values).astype(dtype), missing), index=index)
+    return pd.Series(values.astype(dtype), index=index)
+
+
+def _tighten_numeric(series):
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == 'u':
+        return _downcast_numeric(series)
+    if pd.api.types.is_integer_dtype(dtype):
+        missing = series.isna().to_numpy()
+        tight = _tighten_integers(series.to_numpy(dtype=np.int64, na_value=0), missing, series.index)
+        return series if tight is None else tight
+    if pd.api.types.is_float_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(values)
+        present = values[~missing]
+        # Only whole numbers in the int64 range (infinite values stay float)
+        if (np.isfinite(present).all() and (present == np.round(present)).all()
+                and (len(present) == 0 or (present.min() >= -2.0 ** 63 and present.max() < 2.0 ** 63))):
+            tight = _tighten_integers(np.where(missing, 0, values).astype(np.int64), missing, series.index)
+            if tight is not None:
+                return tight
+        return _downcast_numeric(series)
+    return series
+
+
+def _tighten_timestamps(series):
+    # UTC timestamps (the time zone is kept: naive timestamps would silently drop it from the uploaded data)
+    if isinstance(series.dtype, pd.DatetimeTZDtype) and str(series.dtype.tz) != 'UTC':
+        return series.dt.tz_convert('UTC')
+    return series
+
+
+def _tighten_object(series):
+    # Object column: the type of the values it holds, when they all have the same one
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred == 'string':
+        return series.astype(pd.StringDtype())
+    if inferred == 'boolean':
+        return series.astype('boolean')
+    if inferred in ('integer', 'floating', 'mixed-integer-float'):
+        return _tighten_numeric(pd.to_numeric(series))
+    if inferred in ('datetime', 'datetime64'):
+        return pd.to_datetime(series, utc=True)
+    return series
+
+
+def tighten_column(series):
+    if series.isna().all():
+        return series
+    dtype = series.dtype
+    if isinstance(dtype, pd.DatetimeTZDtype) or (isinstance(dtype, np.dtype) and dtype.kind == 'M'):
+        return _tighten_timestamps(series)
+    if pd.api.types.is_bool_dtype(dtype):
+        return series
+    if pd.api.types.is_numeric_dtype(dtype):
+        return _tighten_numeric(series)
+    if dtype == object:
+        return _tighten_object(series)
+    return series
+
+
+def tighten_dtypes(df):
+    # Copy of the dataframe with the tightest safe type of every column (see the top of the module)
+    columns = {}
+    for i, col in enumerate(df.columns):
+        columns[i] = tighten_column(df.iloc[:, i])
+    tight = pd.DataFrame(columns, index=df.index, copy=False)
+    tight.columns = df.columns
+    return tight
+
+
+def payload_bytes(df):
+    # Bytes of the table once serialized for its upload (see the top of the module), None when the serializer rejects
+    # one of its columns (e.g. an object column mixing strings and numbers, which parquet cannot store)
+    if PAYLOAD_FORMAT == 'csv':
+        return len(df.to_csv(index=False).encode('utf-8'))
+    buffer = io.BytesIO()
+    try:
+        df.to_parquet(buffer, index=False)
+    except (TypeError, ValueError):
+        return None
+    return buffer.getbuffer().nbytes
+
+
+def stage_table(df, table_name):
+    # Tighten the types of the table. Returns the tightened dataframe (the one to upload) and the entry of the report:
+    # rows, raw and tight payload bytes (the table as produced by the splitter and after tightening, serialized in
+    # 'payload_format'), raw and tight memory bytes (deep memory) and the columns whose type changed. Both tables are
+    # serialized once to measure them, which 'duration' includes.
+    start = time.perf_counter()
+    with stage('tighten_types', table=table_name, rows=len(df)):
+        tight = tighten_dtypes(df)
+    with stage('payload_bytes', table=table_name, rows=len(df)):
+        raw_payload, tight_payload = payload_bytes(df), payload_bytes(tight)
+    return tight, {
+        "table": table_name,
+        "rows": len(df),
+        "payload_format": PAYLOAD_FORMAT,
+        "raw_bytes": raw_payload,
+        "tight_bytes": tight_payload,
+        "raw_memory_bytes": int(df.memory_usage(index=False, deep=True).sum()),
+        "tight_memory_bytes": int(tight.memory_usage(index=False, deep=True).sum()),
+        "changed_columns": {str(col): f"{df[col].dtype} -> {tight[col].dtype}" for col in df.columns
+                            if df[col].dtype != tight[col].dtype},
+        "duration": time.perf_counter() - start,
+    }
+
+
+def _bytes(n):
+    return "-" if n is None else f"{n} bytes"
+
+
+def print_staging_report(entries):
+    if not entries:
+        return
+    print(f"Tightened tables ({entries[0]['payload_format']} payload, deep memory):")
+    for entry in entries:
+        changed = ', '.join(f"{col} ({change})" for col, change in entry["changed_columns"].items())
+        print(f"- {entry['table']}: {entry['rows']} rows, {_bytes(entry['raw_bytes'])} -> "
+              f"{_bytes(entry['tight_bytes'])} (memory: {entry['raw_memory_bytes']} bytes -> "
+              f"{entry['tight_memory_bytes']} bytes)" + (f"; {changed}" if changed else ""))
+    # Totals of the tables measured before and after
+    measured = [entry for entry in entries if entry["raw_bytes"] is not None and entry["tight_bytes"] is not None]
+    raw = sum(entry["raw_bytes"] for entry in measured)
+    tight = sum(entry["tight_bytes"] for entry in measured)
+    raw_memory = sum(entry["raw_memory_bytes"] for entry in entries)
+    tight_memory = sum(entry["tight_memory_bytes"] for entry in entries)
+    unmeasured = len(entries) - len(measured)
+    print(f"{len(entries)} table(s): payload {raw} bytes -> {tight} bytes ({tight / raw if raw else 0:.1%})"
+          + (f" without {unmeasured} unmeasured table(s)" if unmeasured else "")
+          + f", memory {raw_memory} bytes -> {tight_memory} bytes "
+          f"({tight_memory / raw_memory if raw_memory else 0:.1%}), "
+          f"{sum(1 for entry in entries if entry['changed_columns'])} table(s) with tightened columns.")
+
+
+if __name__ == "__main__":
+    import sys
+
+    import pm4py
+    from splitter import transform_ocel
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "tests/input_data/ocel/recruiting-red.jsonocel"
+    ocel = pm4py.read_ocel2(path) if path.endswith('xmlocel') else pm4py.read_ocel(path)
+    object_dataframes, event_dataframes, relationship_dataframes, _ = transform_ocel(ocel)
+    tables = [(f"o_{name}", df) for name, df in object_dataframes.items()]
+    tables += [(f"e_{name}", df) for name, df in event_dataframes.items()]
+    tables += [(f"r_{evt_name}_{obj_name}", df) for (evt_name, obj_name), df in relationship_dataframes.items()]
+    print_staging_report([stage_table(df, table_name)[1] for table_name, df in tables])
@@ -0,0 +1,165 @@
+# Surrogate integer keys for the uploaded tables: instead of their original OCEL strings (e.g. '880001' or long
+# UUIDs, repeated in every relationship table and embedded object column), the event and object IDs are uploaded as
+# dense integer codes, and one key table per object table and per event table maps every code back to the original
+# ID ('ID', 'OriginalID'). The foreign keys keep their columns, which now hold the codes.
+#
+# The codes use the decoder format of compaction.compact_ocel ({'eid': index of the event IDs, 'oid': index of the
+# object IDs, 'object_columns': names of the columns holding object IDs}): the code of an ID is its position in the
+# index. Tables split from a compact OCEL already hold these codes (coded=True: decided by the id_decoder of the
+# compaction being given, never by the dtype, since original IDs can be numbers too), so only the key tables are
+# added; for tables holding the original IDs, build_key_decoder numbers the IDs of the object and event tables (or
+# ocel_key_decoder the same IDs in the log, for the LazyTables split from it), and encode_ids turns every table into
+# codes right before its upload.
+#
+# Surrogate keys only pay off for long IDs: the key tables repeat every ID once, so the codes must save more than
+# that in the relationship tables and embedded object columns. On the bundled logs (see surrogate_key_savings and
+# the __main__ report), recruiting-red (long IDs) is 10.8% smaller, while example_log (-30%) and ocel20_example
+# (-22%), with IDs of a few characters, get larger: the mode is off by default.
+
+import numpy as np
+import pandas as pd
+
+from compaction import decode_ids
+from splitter import clean_name, release_table
+
+
+def _code_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def build_key_decoder(object_dataframes, event_dataframes):
+    # Number the object IDs and the event IDs of the tables (in table order, then row order) and return the decoder.
+    # The tables of LazyTables mappings are released after use.
+    ids = {'oid': [], 'eid': []}
+    for kind, dataframes in [('oid', object_dataframes), ('eid', event_dataframes)]:
+        for name in dataframes:
+            ids[kind].append(dataframes[name]['ID'])
+            release_table(dataframes, name)
+    return {
+        'eid': pd.Index(pd.unique(pd.concat(ids['eid'], ignore_index=True).dropna())) if ids['eid'] else pd.Index([]),
+        'oid': pd.Index(pd.unique(pd.concat(ids['oid'], ignore_index=True).dropna())) if ids['oid'] else pd.Index([]),
+        # Columns named after an object type hold object IDs
+        'object_columns': set(object_dataframes),
+    }
+
+
+def ocel_key_decoder(ocel):
+    # Decoder of build_key_decoder read from the log the tables are split from: the IDs of its object and event tables
+    # (in row order), and the clean names of its object types, without building any table
+    objects, events = ocel.objects, ocel.events
+    return {
+        'eid': pd.Index(pd.unique(events['ocel:eid'].dropna())),
+        'oid': pd.Index(pd.unique(objects['ocel:oid'].dropna())),
+        'object_columns': {clean_name(t) for t in objects['ocel:type'].dropna().unique()},
+    }
+
+
+def _encode_column(values, index):
+    # Codes of the values in the index, as integers; missing (or unknown) IDs become nulls
+    codes = index.get_indexer(values)
+    return _code_series(codes, codes < 0, len(index), values.index)
+
+
+def _code_series(codes, missing, n, row_index):
+    dtype = _code_dtype(n)
+    if missing.any():
+        return pd.Series(pd.arrays.IntegerArray(codes.astype(dtype), missing), index=row_index)
+    return pd.Series(codes.astype(dtype), index=row_index)
+
+
+def _is_integer(values):
+    return isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iu'
+
+
+def _integer_codes(values, index):
+    # Codes already in the table (embedded object columns of a compact OCEL are float when some rows have no
+    # related object): integers, with the missing ones as nulls
+    if _is_integer(values):
+        return values
+    codes = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(codes) | (codes < 0)
+    return _code_series(np.where(missing, 0, codes), missing, len(index), values.index)
+
+
+def encode_ids(df, decoder, id_kind='oid', coded=False):
+    # Inverse of compaction.decode_ids: turn the original IDs of a table produced by transform_ocel into their codes.
+    # 'ID' holds IDs of the given kind ('eid' for event tables and custom E2O tables, 'oid' otherwise), 'EventID'
+    # holds event IDs, and the columns named after an object type hold object IDs. With 'coded' (the table comes
+    # from a compact OCEL and 'decoder' is its id_decoder), the columns already hold the codes and are only turned
+    # into integers.
+    kinds = {'ID': id_kind, 'EventID': 'eid'}
+    kinds.update({col: 'oid' for col in decoder['object_columns'] if col not in kinds})
+    encoded = {}
+    for col, kind in kinds.items():
+        if col not in df.columns:
+            continue
+        if coded:
+            if not _is_integer(df[col]):
+                encoded[col] = _integer_codes(df[col], decoder[kind])
+        else:
+            encoded[col] = _encode_column(df[col], decoder[kind])
+    if not encoded:
+        return df
+    return df.assign(**encoded)
+
+
+def key_table(df, decoder, id_kind='oid', coded=False):
+    # Key table of an object table ('oid') or an event table ('eid'): the code and the original ID of every row.
+    # The table holds the original IDs, or the codes with 'coded' (see encode_ids).
+    ids = df['ID']
+    if coded:
+        ids = _integer_codes(ids, decoder[id_kind])
+        return pd.DataFrame({'ID': ids, 'OriginalID': decode_ids(pd.DataFrame({'ID': ids}), decoder, id_kind)['ID']})
+    return pd.DataFrame({'ID': _encode_column(ids, decoder[id_kind]), 'OriginalID': ids})
+
+
+def surrogate_decoder(object_dataframes, event_dataframes, id_decoder=None):
+    # Decoder of the surrogate keys: the one of the compact OCEL the tables come from when given, otherwise the IDs are
+    # numbered. LazyTables split from a log are numbered from the log itself, since numbering the tables would build
+    # every object and event table once more than their upload does.
+    if id_decoder is not None:
+        return id_decoder
+    source = getattr(object_dataframes, 'source', None)
+    if source is not None and getattr(event_dataframes, 'source', None) is source:
+        return ocel_key_decoder(source)
+    return build_key_decoder(object_dataframes, event_dataframes)
+
+
+def dataframe_bytes(df):
+    # Uploaded size of a table, measured as its CSV text (header included)
+    return len(df.to_csv(index=False).encode('utf-8'))
+
+
+def surrogate_key_savings(object_dataframes, event_dataframes, relationship_dataframes,
+                          object_relationship_dataframes=None, custom=False):
+    # Bytes of all the tables with the original IDs, and with surrogate keys (key tables included). 'saved' is
+    # negative when the key tables cost more than the codes save (short IDs).
+    decoder = build_key_decoder(object_dataframes, event_dataframes)
+    tables = [(df, 'oid') for df in object_dataframes.values()]
+    tables += [(df, 'eid') for df in event_dataframes.values()]
+    tables += [(df, 'eid' if custom else 'oid') for df in relationship_dataframes.values()]
+    tables += [(df, 'oid') for df in (object_relationship_dataframes or {}).values()]
+    original = sum(dataframe_bytes(df) for df, _ in tables)
+    encoded = sum(dataframe_bytes(encode_ids(df, decoder, kind)) for df, kind in tables)
+    keys = sum(dataframe_bytes(key_table(df, decoder, 'oid')) for df in object_dataframes.values())
+    keys += sum(dataframe_bytes(key_table(df, decoder, 'eid')) for df in event_dataframes.values())
+    return {"original": original, "encoded": encoded, "key_tables": keys, "surrogate": encoded + keys,
+            "saved": original - encoded - keys}
+
+
+if __name__ == "__main__":
+    import pm4py
+    from splitter import transform_ocel
+
+    for path, lead_object_type in [("tests/input_data/ocel/example_log.jsonocel", None),
+                                   ("tests/input_data/ocel/ocel20_example.xmlocel", "Purchase Order"),
+                                   ("tests/input_data/ocel/recruiting-red.jsonocel", "applications")]:
+        ocel = pm4py.read_ocel2(path) if path.endswith('xmlocel') else pm4py.read_ocel(path)
+        for custom in [False, True]:
+            tables = transform_ocel(ocel, custom=custom, create_object_relations=lead_object_type is not None,
+                                    lead_object_type=lead_object_type)
+            savings = surrogate_key_savings(*tables, custom=custom)
+            verdict = (f"{savings['saved'] / savings['original']:.1%} saved" if savings['saved'] > 0 else
+                       f"{-savings['saved'] / savings['original']:.1%} larger: surrogate keys do not pay off")
+            print(f"{path.split('/')[-1]} (custom={custom}): {savings['original']} bytes -> {savings['encoded']} + "
+                  f"{savings['key_tables']} in key tables = {savings['surrogate']} bytes ({verdict})")
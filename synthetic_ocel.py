@@ -0,0 +1,100 @@
+# Generator of synthetic OCEL 2.0 logs for the benchmarks (see benchmark.py): the number of events, object types and
+# activities, the E2O fan-out, the O2O density and the sparsity of the attributes are parameters, so every stage can
+# be measured on logs of any size and shape. The logs are built with numpy, without a Python loop over the rows, and
+# the same seed gives the same log.
+
+import numpy as np
+import pandas as pd
+from pm4py.objects.ocel.obj import OCEL
+
+
+def _prefixed_ids(prefix, n):
+    return prefix + pd.Series(np.arange(n)).astype(str)
+
+
+def _attributes(rng, n_rows, row_types, n_types, n_attributes, sparsity, prefix):
+    # Attribute columns for a table: each attribute is defined only for a random half of the types (so the
+    # per-type tables have different columns), and is missing with probability 'sparsity' where defined.
+    # Even attributes are numeric, odd attributes are strings.
+    columns = {}
+    for j in range(n_attributes):
+        defined_types = rng.random(n_types) < 0.5
+        defined_types[rng.integers(n_types)] = True
+        present = defined_types[row_types] & (rng.random(n_rows) >= sparsity)
+        if j % 2 == 0:
+            values = pd.Series(np.round(rng.random(n_rows) * 1000, 2))
+        else:
+            values = "value " + pd.Series(rng.integers(0, 100, n_rows)).astype(str)
+        columns[f"{prefix} attribute {j}"] = values.where(present)
+    return columns
+
+
+def generate_ocel(n_events=10000, n_object_types=5, n_activities=10, e2o_fanout=2.0, events_per_object=4.0,
+                  o2o_density=1.0, n_event_attributes=4, n_object_attributes=4, attribute_sparsity=0.5, seed=0):
+    # Generate a synthetic OCEL 2.0 log:
+    # - n_events events of n_activities activities, n_object_types object types
+    # - e2o_fanout: average number of objects related to an event; every event is related to exactly one object
+    #   of the "primary" type of its activity (giving 1:1 pairs), plus a Poisson number of objects of any type
+    # - events_per_object: average number of events per object, which gives the number of objects
+    # - o2o_density: number of object-to-object relations per object (ocel.o2o, read by the schema planner:
+    #   transform_ocel derives the lead object relations from the E2O relations)
+    # - attribute_sparsity: probability that an attribute is missing in a row where it is defined
+    rng = np.random.default_rng(seed)
+    n_objects = max(n_object_types, int(n_events * e2o_fanout / events_per_object))
+
+    # Objects, sorted by type so that the objects of each type have contiguous positions
+    object_types = rng.integers(0, n_object_types, n_objects)
+    object_types[:n_object_types] = np.arange(n_object_types)
+    object_types = np.sort(object_types)
+    type_counts = np.bincount(object_types, minlength=n_object_types)
+    type_offsets = np.concatenate([[0], np.cumsum(type_counts)[:-1]])
+    type_names = np.array([f"Object Type {t}" for t in range(n_object_types)], dtype=object)
+    oids = _prefixed_ids("o", n_objects)
+    objects = pd.DataFrame({"ocel:oid": oids, "ocel:type": type_names[object_types]})
+    for col, values in _attributes(rng, n_objects, object_types, n_object_types, n_object_attributes,
+                                   attribute_sparsity, "object").items():
+        objects[col] = values
+
+    # Events, ordered by timestamp
+    activities = rng.integers(0, n_activities, n_events)
+    activity_names = np.array([f"Activity {a}" for a in range(n_activities)], dtype=object)
+    timestamps = pd.Timestamp("2020-01-01", tz="UTC") + pd.to_timedelta(np.cumsum(rng.integers(1, 60, n_events)), unit="s")
+    events = pd.DataFrame({"ocel:eid": _prefixed_ids("e", n_events), "ocel:timestamp": timestamps,
+                           "ocel:activity": activity_names[activities]})
+    for col, values in _attributes(rng, n_events, activities, n_activities, n_event_attributes,
+                                   attribute_sparsity, "event").items():
+        events[col] = values
+
+    # Relations: one object of the primary type of the activity, plus the extra objects
+    primary_types = activities % n_object_types
+    primary_objects = type_offsets[primary_types] + (rng.random(n_events) * type_counts[primary_types]).astype(np.int64)
+    n_extra = rng.poisson(max(0.0, e2o_fanout - 1.0), n_events)
+    extra_events = np.repeat(np.arange(n_events), n_extra)
+    extra_objects = rng.integers(0, n_objects, len(extra_events))
+    rel_events = np.concatenate([np.arange(n_events), extra_events])
+    rel_objects = np.concatenate([primary_objects, extra_objects])
+    order = np.argsort(rel_events, kind="stable")
+    rel_events, rel_objects = rel_events[order], rel_objects[order]
+    relations = pd.DataFrame({
+        "ocel:eid": events["ocel:eid"].to_numpy()[rel_events],
+        "ocel:activity": events["ocel:activity"].to_numpy()[rel_events],
+        "ocel:timestamp": events["ocel:timestamp"].take(rel_events).reset_index(drop=True),
+        "ocel:oid": oids.to_numpy()[rel_objects],
+        "ocel:type": type_names[object_types[rel_objects]],
+        "ocel:qualifier": "",
+    }).drop_duplicates(subset=["ocel:eid", "ocel:oid"], ignore_index=True)
+
+    # Object-to-object relations between random objects
+    n_o2o = int(n_objects * o2o_density)
+    o2o = pd.DataFrame({
+        "ocel:oid": oids.to_numpy()[rng.integers(0, n_objects, n_o2o)],
+        "ocel:oid_2": oids.to_numpy()[rng.integers(0, n_objects, n_o2o)],
+        "ocel:qualifier": "",
+    }).drop_duplicates(subset=["ocel:oid", "ocel:oid_2"], ignore_index=True)
+
+    return OCEL(events=events, objects=objects, relations=relations, o2o=o2o)
+
+
+if __name__ == "__main__":
+    ocel = generate_ocel(n_events=1000)
+    print(ocel)
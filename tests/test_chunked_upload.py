@@ -0,0 +1,112 @@
+# Chunked uploads of chunked_upload against the local fake data pool: the table arrives whole, an interrupted upload
+# resumes from its journal instead of the first row, and slices the API cannot take are halved until they go through.
+
+import pandas as pd
+
+from chunked_upload import UploadJournal, upload_table_chunked
+from fake_celonis import FakeDataPool, FakeUploadError
+from upload_executor import upload_tables
+
+
+class InterruptedDataPool(FakeDataPool):
+    # Fake data pool whose appends fail once 'appends' of them went through (None: never), and which records the
+    # rows sent by every call reaching the API
+    def __init__(self, appends=None, **kwargs):
+        super().__init__(**kwargs)
+        self.appends = appends
+        self.sent_rows = []
+
+    def _call(self, name, rows=0):
+        if name == "append" and self.appends is not None:
+            if self.appends == 0:
+                raise FakeUploadError("connection lost")
+            self.appends -= 1
+        self.sent_rows.append(rows)
+        super()._call(name, rows)
+
+
+def make_table(rows=1000):
+    return pd.DataFrame({"ID": [f"id_{i}" for i in range(rows)], "Value": range(rows)})
+
+
+def test_chunks_make_the_whole_table():
+    df = make_table()
+    data_pool = InterruptedDataPool()
+    result = upload_table_chunked(data_pool, "table", df, chunk_rows=300)
+
+    assert result["error"] is None and result["uploaded_rows"] == len(df)
+    assert result["chunks"] == 4 and result["attempts"] == 4
+    assert data_pool.calls == {"create_table": 1, "append": 3}
+    assert data_pool.sent_rows == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(data_pool.tables["table"], df)
+
+
+def test_interrupted_upload_resumes_from_the_journal(tmp_path):
+    df = make_table()
+    journal_path = str(tmp_path / "journal.json")
+    data_pool = InterruptedDataPool(appends=2)
+    result = upload_table_chunked(data_pool, "table", df, chunk_rows=200, journal=UploadJournal(journal_path),
+                                  retries=0, retry_backoff=0.0, min_chunk_rows=200)
+    # The table and two appends went through before the connection was lost
+    assert result["error"] is not None
+    assert result["uploaded_rows"] == 600
+    assert UploadJournal(journal_path).get("table")["uploaded"] == 600
+
+    # Rerun with a new journal object reading the file, as a new process would
+    data_pool.appends = None
+    data_pool.sent_rows = []
+    before = data_pool.calls.copy()
+    result = upload_table_chunked(data_pool, "table", df, chunk_rows=200, journal=UploadJournal(journal_path),
+                                  retries=0, retry_backoff=0.0, min_chunk_rows=200)
+
+    assert result["error"] is None and result["resumed_rows"] == 600
+    assert data_pool.calls - before == {"append": 2}
+    assert sum(data_pool.sent_rows) == len(df) - 600
+    pd.testing.assert_frame_equal(data_pool.tables["table"], df)
+
+
+def test_changed_table_is_not_resumed(tmp_path):
+    df = make_table()
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    data_pool = InterruptedDataPool(appends=1)
+    upload_table_chunked(data_pool, "table", df, chunk_rows=200, journal=journal, retries=0, retry_backoff=0.0,
+                         min_chunk_rows=200)
+
+    changed = df.assign(Value=df["Value"] + 1)
+    data_pool.appends = None
+    result = upload_table_chunked(data_pool, "table", changed, chunk_rows=200, journal=journal)
+
+    assert result["error"] is None and result["resumed_rows"] == 0
+    pd.testing.assert_frame_equal(data_pool.tables["table"], changed)
+
+
+def test_slices_are_halved_until_the_api_takes_them():
+    df = make_table()
+    data_pool = InterruptedDataPool(max_rows_per_call=120)
+    result = upload_table_chunked(data_pool, "table", df, chunk_rows=500, retry_backoff=0.0)
+
+    assert result["error"] is None
+    # Halved down to a size the API takes, then every refused call is one of a slice over the limit
+    assert data_pool.sent_rows[:4] == [500, 250, 125, 62]
+    assert result["attempts"] - result["chunks"] == sum(1 for rows in data_pool.sent_rows if rows > 120)
+    assert sum(rows for rows in data_pool.sent_rows if rows <= 120) == len(df)
+    pd.testing.assert_frame_equal(data_pool.tables["table"], df)
+
+
+def test_upload_tables_resume_from_the_journal(tmp_path):
+    tables = [(f"table_{i}", make_table(500)) for i in range(3)]
+    journal = UploadJournal(str(tmp_path / "journal.json"))
+    data_pool = InterruptedDataPool(appends=3)
+    report = upload_tables(data_pool, tables, max_workers=1, retries=0, retry_backoff=0.0, verbose=False,
+                           chunk_rows=100, journal=journal, min_chunk_rows=100)
+    assert report["failed"]
+
+    data_pool.appends = None
+    data_pool.sent_rows = []
+    report = upload_tables(data_pool, tables, max_workers=1, retries=0, verbose=False, chunk_rows=100,
+                           journal=journal)
+
+    assert report["failed"] == [] and report["resumed_rows"] > 0
+    assert sum(data_pool.sent_rows) == 3 * 500 - report["resumed_rows"]
+    for table_name, df in tables:
+        pd.testing.assert_frame_equal(data_pool.tables[table_name], df)
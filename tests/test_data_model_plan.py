@@ -0,0 +1,185 @@
+# Data model plan of uploader2 against the local fake data pool: the plan builds the same data model as the original
+# one-call-at-a-time code (baseline_build_data_model below, kept as the reference), and a reused data model only
+# gets the items it is missing.
+
+import os
+
+import pandas as pd
+import pytest
+
+from data_model_plan import (apply_plan, diff_plan, direct_object_columns, empty_model_state, plan_data_model,
+                             read_model_state)
+from fake_celonis import FakeDataPool
+from referential_integrity import validate_foreign_keys
+from splitter import analyze_e2o_cardinality, clean_name, transform_ocel
+
+EXAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data", "ocel", "example_log.jsonocel")
+
+
+@pytest.fixture(scope="module")
+def example_log():
+    import pm4py
+
+    return pm4py.read_ocel(EXAMPLE_LOG)
+
+
+@pytest.fixture(scope="module")
+def split_log(example_log):
+    object_dataframes, event_dataframes, relationship_dataframes, _ = transform_ocel(example_log)
+    return object_dataframes, event_dataframes, relationship_dataframes
+
+
+def fresh_data_model(plan, latency=0.0):
+    # Empty data model of a data pool holding the tables of the plan
+    data_pool = FakeDataPool(latency=latency)
+    for table_name in plan["tables"]:
+        data_pool.tables[table_name] = None
+    return data_pool.create_data_model("model")
+
+
+def baseline_build_data_model(data_model, object_dataframes, event_dataframes, relationship_dataframes):
+    # The original code: one call per table, then one call per foreign key, the direct foreign keys found by checking
+    # every object type against every event table
+    table_name_to_id = {}
+    all_table_names = [f"o_custom_{name}" for name in object_dataframes]
+    all_table_names += [f"e_custom_{name}" for name in event_dataframes]
+    all_table_names += [f"r_e_{evt_name}__{obj_name}" for evt_name, obj_name in relationship_dataframes]
+    for table_name in all_table_names:
+        table_name_to_id[table_name] = data_model.add_table(table_name, table_name).id
+    for evt_name, obj_name in relationship_dataframes:
+        rel_table_name = f"r_e_{evt_name}__{obj_name}"
+        data_model.create_foreign_key(table_name_to_id[f"e_custom_{evt_name}"], table_name_to_id[rel_table_name],
+                                      [("ID", "EventID")])
+        data_model.create_foreign_key(table_name_to_id[f"o_custom_{obj_name}"], table_name_to_id[rel_table_name],
+                                      [("ID", "ID")])
+    for event_name, df in event_dataframes.items():
+        for object_type in object_dataframes:
+            for column_name in [object_type, f"{object_type}_Id"]:
+                if column_name in df.columns:
+                    data_model.create_foreign_key(table_name_to_id[f"e_custom_{event_name}"],
+                                                  table_name_to_id[f"o_custom_{object_type}"], [(column_name, "ID")])
+                    break
+
+
+def model_items(data_model):
+    # Table names and foreign keys of a fake data model, read without any counted call
+    names = {table.id: table.name for table in data_model.tables.values()}
+    foreign_keys = {(names[fk.source_table_id], names[fk.target_table_id], column.source_column_name,
+                     column.target_column_name) for fk in data_model.foreign_keys for column in fk.columns}
+    return set(names.values()), foreign_keys
+
+
+def test_direct_object_columns_prefers_the_exact_name():
+    columns = ["ID", "Time", "Order_Id", "Item", "Item_Id", "Other_Id"]
+    assert direct_object_columns(columns, ["Item", "Order", "Customer"]) == {"Item": "Item", "Order": "Order_Id"}
+
+
+def test_plan_builds_the_baseline_data_model(split_log):
+    plan = plan_data_model(*split_log)
+    baseline = fresh_data_model(plan)
+    baseline_build_data_model(baseline, *split_log)
+
+    data_model = fresh_data_model(plan)
+    state = empty_model_state()
+    report = apply_plan(data_model, diff_plan(plan, state), state, verbose=False)
+
+    assert model_items(data_model) == model_items(baseline)
+    assert set(state["tables"]) == set(plan["tables"]) and state["foreign_keys"] == set(plan["foreign_keys"])
+    # A new data model is not read: one call per item, as many as the baseline
+    assert data_model.calls == {"add_table": len(plan["tables"]), "create_foreign_key": len(plan["foreign_keys"])}
+    assert report["calls"] == sum(baseline.calls.values())
+
+
+def test_applied_plan_has_an_empty_diff(split_log):
+    plan = plan_data_model(*split_log)
+    data_model = fresh_data_model(plan)
+    state = empty_model_state()
+    apply_plan(data_model, diff_plan(plan, state), state, verbose=False)
+
+    assert diff_plan(plan, state) == {"tables": [], "foreign_keys": [], "process_configurations": []}
+    before = data_model.calls.copy()
+    assert diff_plan(plan, read_model_state(data_model, plan)) == {"tables": [], "foreign_keys": [],
+                                                                   "process_configurations": []}
+    # One read per kind of item of the plan (it has no process configuration)
+    assert data_model.calls - before == {"get_tables": 1, "get_foreign_keys": 1}
+
+
+def test_reused_data_model_only_gets_the_missing_items(split_log):
+    plan = plan_data_model(*split_log)
+    data_model = fresh_data_model(plan)
+    state = empty_model_state()
+    apply_plan(data_model, diff_plan(plan, state), state, verbose=False)
+    # Foreign key deleted on the server side
+    data_model.foreign_keys.pop()
+    expected = model_items(data_model)[1] ^ set(plan["foreign_keys"])
+
+    before = data_model.calls.copy()
+    state = read_model_state(data_model, plan)
+    diff = diff_plan(plan, state)
+    apply_plan(data_model, diff, state, verbose=False)
+
+    assert diff["tables"] == [] and set(diff["foreign_keys"]) == expected and len(expected) == 1
+    assert model_items(data_model)[1] == set(plan["foreign_keys"])
+    # Two reads and one creation, instead of a call per item to build the data model again
+    calls = data_model.calls - before
+    assert calls == {"get_tables": 1, "get_foreign_keys": 1, "create_foreign_key": 1}
+    assert sum(calls.values()) < len(plan["tables"]) + len(plan["foreign_keys"])
+
+
+def test_process_configurations_are_planned_and_applied(split_log):
+    object_dataframes, event_dataframes, _ = split_log
+    evt_name, obj_name = next(iter(event_dataframes)), next(iter(object_dataframes))
+    configuration = {"activity_table": f"e_custom_{evt_name}", "case_table": f"o_custom_{obj_name}",
+                     "timestamp_column": "Time"}
+    plan = plan_data_model(*split_log, process_configurations=[configuration])
+    data_model = fresh_data_model(plan)
+    state = empty_model_state()
+    apply_plan(data_model, diff_plan(plan, state), state, verbose=False)
+
+    assert data_model.calls["create_process_configuration"] == 1
+    assert diff_plan(plan, read_model_state(data_model, plan))["process_configurations"] == []
+
+
+def test_concurrent_calls_overlap_the_latency(split_log):
+    plan = plan_data_model(*split_log)
+    elapsed = {}
+    for max_workers in [1, 8]:
+        data_model = fresh_data_model(plan, latency=0.02)
+        state = empty_model_state()
+        elapsed[max_workers] = apply_plan(data_model, diff_plan(plan, state), state, max_workers=max_workers,
+                                          verbose=False)["elapsed"]
+        assert sum(data_model.calls.values()) == len(plan["tables"]) + len(plan["foreign_keys"])
+    assert elapsed[8] < elapsed[1] / 2
+
+
+def test_attribute_named_like_an_object_type_keeps_the_relationship_foreign_key():
+    # Without a denormalization plan every relationship table is complete, even when an attribute of the event table
+    # has the name of the object type
+    object_dataframes = {"Order": pd.DataFrame({"ID": ["o1"]})}
+    event_dataframes = {"PlaceOrder": pd.DataFrame({"ID": ["e1"], "Time": [pd.Timestamp(0)], "Order": ["note"]})}
+    relationship_dataframes = {("PlaceOrder", "Order"): pd.DataFrame({"EventID": ["e1", "e1"], "ID": ["o1", "o1"]})}
+    plan = plan_data_model(object_dataframes, event_dataframes, relationship_dataframes)
+    assert ("o_custom_Order", "r_e_PlaceOrder__Order", "ID", "ID") in plan["foreign_keys"]
+    assert ("e_custom_PlaceOrder", "r_e_PlaceOrder__Order", "ID", "EventID") in plan["foreign_keys"]
+
+
+def test_hybrid_exception_table_only_references_its_event_table(example_log):
+    # A link that is not 1:1, stored as hybrid: embedded column plus a relationship table of the exceptions
+    pair = next(pair for pair, (is_one_to_one, _) in analyze_e2o_cardinality(example_log.relations).items()
+                if not is_one_to_one)
+    denormalization = {'e2o': {pair: 'hybrid'}}
+    object_dataframes, event_dataframes, relationship_dataframes, _ = transform_ocel(example_log,
+                                                                                     denormalization=denormalization)
+    plan = plan_data_model(object_dataframes, event_dataframes, relationship_dataframes,
+                           denormalization=denormalization)
+
+    evt_name, obj_name = clean_name(pair[0]), clean_name(pair[1])
+    rel_table_name = f"r_e_{evt_name}__{obj_name}"
+    assert [fk for fk in plan["foreign_keys"] if rel_table_name in fk[:2]] == [
+        (f"e_custom_{evt_name}", rel_table_name, "ID", "EventID")]
+    assert (f"e_custom_{evt_name}", f"o_custom_{obj_name}", obj_name, "ID") in plan["foreign_keys"]
+    # The other relationship tables still reference their object table
+    assert all((f"o_custom_{o}", f"r_e_{e}__{o}", "ID", "ID") in plan["foreign_keys"]
+               for e, o in relationship_dataframes if (e, o) != (evt_name, obj_name))
+    assert validate_foreign_keys(object_dataframes, event_dataframes, relationship_dataframes,
+                                 denormalization=denormalization)["valid"]
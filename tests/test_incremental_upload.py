@@ -0,0 +1,112 @@
+# Incremental uploads of uploader and uploader2 against the local fake data pool: a rerun with the same manifest on
+# unchanged tables sends nothing, and a changed table is the only one sent again.
+
+import os
+
+import pandas as pd
+import pytest
+
+import uploader
+import uploader2
+from fake_celonis import FakeDataPool
+from fingerprints import load_manifest, table_fingerprint
+from splitter import transform_ocel
+
+EXAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data", "ocel", "example_log.jsonocel")
+
+# Calls of uploader2 that only read the state of the reused data model
+READ_CALLS = {"get_tables", "get_foreign_keys", "get_process_configurations"}
+
+
+@pytest.fixture(scope="module")
+def split_log():
+    import pm4py
+
+    return transform_ocel(pm4py.read_ocel(EXAMPLE_LOG))
+
+
+def with_changed_table(dataframes):
+    # Copy of the mapping where the last row of the first table has another ID
+    dataframes = dict(dataframes)
+    name = next(iter(dataframes))
+    df = dataframes[name].copy()
+    df.iloc[-1, df.columns.get_loc("ID")] = "changed"
+    dataframes[name] = df
+    return name, dataframes
+
+
+def calls_since(data_pool, before):
+    return +(data_pool.calls - before)
+
+
+def test_fingerprint_follows_the_content():
+    df = pd.DataFrame({"ID": ["a", "b"], "Value": [1, 2]})
+    assert table_fingerprint(df) == table_fingerprint(df.copy())
+    assert table_fingerprint(df) != table_fingerprint(df.assign(Value=[1, 3]))
+    assert table_fingerprint(df) != table_fingerprint(df.iloc[::-1])
+    assert table_fingerprint(df) != table_fingerprint(df.astype({"Value": "float64"}))
+
+
+def test_uploader_rerun_sends_nothing(split_log, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    data_pool = FakeDataPool()
+    first = uploader.upload_to_data_pool(data_pool, *split_log, retries=0, manifest_path=manifest_path)
+    table_count = len(first["tables"])
+    assert data_pool.calls["create_table"] == table_count
+    assert len(load_manifest(manifest_path)["tables"]) == table_count
+
+    before = data_pool.calls.copy()
+    rerun = uploader.upload_to_data_pool(data_pool, *split_log, retries=0, manifest_path=manifest_path)
+    assert calls_since(data_pool, before) == {}
+    assert len(rerun["skipped"]) == table_count and rerun["succeeded"] == []
+
+
+def test_uploader_sends_only_the_changed_table(split_log, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    data_pool = FakeDataPool()
+    uploader.upload_to_data_pool(data_pool, *split_log, retries=0, manifest_path=manifest_path)
+
+    object_dataframes, event_dataframes, relationship_dataframes, object_relationship_dataframes = split_log
+    name, object_dataframes = with_changed_table(object_dataframes)
+    before = data_pool.calls.copy()
+    report = uploader.upload_to_data_pool(data_pool, object_dataframes, event_dataframes, relationship_dataframes,
+                                          object_relationship_dataframes, retries=0, manifest_path=manifest_path)
+    assert calls_since(data_pool, before) == {"create_table": 1}
+    assert report["succeeded"] == [f"TEMP_OBJECT_{name}"]
+    pd.testing.assert_frame_equal(data_pool.tables[f"TEMP_OBJECT_{name}"], object_dataframes[name])
+
+
+def test_uploader2_rerun_only_reads_the_data_model(split_log, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    object_dataframes, event_dataframes, relationship_dataframes, _ = split_log
+    data_pool = FakeDataPool()
+    uploader2.upload_to_data_pool(data_pool, object_dataframes, event_dataframes, relationship_dataframes, "model",
+                                  manifest_path=manifest_path)
+    table_count = len(object_dataframes) + len(event_dataframes) + len(relationship_dataframes)
+    assert data_pool.calls["create_table"] == table_count
+    assert data_pool.calls["create_data_model"] == 1 and data_pool.calls["reload"] == 1
+
+    before = data_pool.calls.copy()
+    uploader2.upload_to_data_pool(data_pool, object_dataframes, event_dataframes, relationship_dataframes, "model",
+                                  manifest_path=manifest_path)
+    # No table, data model item or reload: only the reads of the state of the reused data model
+    assert set(calls_since(data_pool, before)) <= READ_CALLS
+    assert len(data_pool.data_models) == 1
+
+
+def test_uploader2_sends_only_the_changed_table(split_log, tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    object_dataframes, event_dataframes, relationship_dataframes, _ = split_log
+    data_pool = FakeDataPool()
+    uploader2.upload_to_data_pool(data_pool, object_dataframes, event_dataframes, relationship_dataframes, "model",
+                                  manifest_path=manifest_path)
+
+    name, object_dataframes = with_changed_table(object_dataframes)
+    before = data_pool.calls.copy()
+    uploader2.upload_to_data_pool(data_pool, object_dataframes, event_dataframes, relationship_dataframes, "model",
+                                  manifest_path=manifest_path)
+    calls = calls_since(data_pool, before)
+    # The changed table is sent again and the data model is reloaded, without adding any item to it
+    assert {call: count for call, count in calls.items() if call not in READ_CALLS} == {"create_table": 1,
+                                                                                        "reload": 1}
+    pd.testing.assert_frame_equal(data_pool.tables[f"o_custom_{name}"], object_dataframes[name])
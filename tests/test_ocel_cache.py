@@ -0,0 +1,81 @@
+# On-disk cache of parsed OCEL logs: a cached log loads back equal to the parsed one (dtypes and missing values
+# included), its string columns are dictionary-encoded whatever the pandas version, and writes to a loaded log never
+# reach the cached files.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ocel_cache import OCEL_TABLES, load_ocel, read_ocel_cached, save_ocel
+
+OCEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data", "ocel")
+
+
+def reader_of(file_name):
+    import pm4py
+    from ocel_csv import read_ocel_csv
+
+    if file_name.endswith(".xmlocel"):
+        return pm4py.read_ocel2
+    if file_name.endswith(".csv"):
+        return read_ocel_csv
+    return pm4py.read_ocel
+
+
+def assert_same_ocel(actual, expected):
+    for table in OCEL_TABLES:
+        pd.testing.assert_frame_equal(getattr(actual, table), getattr(expected, table))
+
+
+@pytest.mark.parametrize("file_name", ["example_log.jsonocel", "ocel20_example.xmlocel", "recruiting-red.jsonocel",
+                                       "ocel_order_simulated.csv"])
+def test_cached_log_equals_the_parsed_one(file_name, tmp_path):
+    path = os.path.join(OCEL_DIR, file_name)
+    parsed = read_ocel_cached(path, reader_of(file_name), cache_dir=str(tmp_path))
+    cached = read_ocel_cached(path, reader_of(file_name), cache_dir=str(tmp_path))
+    assert_same_ocel(cached, parsed)
+    # Every column of the bundled logs has a numeric, timestamp or string layout: nothing is pickled
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".pkl")
+                and name != "meta.pkl"]
+
+
+def test_object_string_columns_are_dictionary_encoded(tmp_path):
+    from pm4py.objects.ocel.obj import OCEL
+
+    events = pd.DataFrame({
+        "ocel:eid": pd.Series(["e1", "e2", "e3"], dtype=object),
+        "ocel:activity": pd.Series(["a", "b", "a"], dtype=object),
+        "ocel:timestamp": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]),
+        "with none": pd.Series(["x", None, "x"], dtype=object),
+        "with nan": pd.Series(["y", np.nan, "z"], dtype=object),
+        "mixed": pd.Series(["y", 1, None], dtype=object),
+        "cost": [1.0, 2.0, 3.0],
+    })
+    ocel = OCEL(events=events)
+    save_ocel(str(tmp_path), ocel)
+    loaded = load_ocel(str(tmp_path))
+
+    pd.testing.assert_frame_equal(loaded.events, events)
+    assert loaded.events.loc[1, "with none"] is None and isinstance(loaded.events.loc[1, "with nan"], float)
+    stored = set(os.listdir(tmp_path))
+    # The string columns are codes and distinct values, the mixed column is pickled
+    assert {"events.0.npy", "events.0.values.npy", "events.3.npy", "events.4.values.npy"} <= stored
+    assert "events.5.pkl" in stored and "events.0.pkl" not in stored
+
+
+def test_writes_to_a_loaded_log_never_reach_the_cache(tmp_path):
+    path = os.path.join(OCEL_DIR, "example_log.jsonocel")
+    parsed = read_ocel_cached(path, reader_of(path), cache_dir=str(tmp_path))
+    cached = read_ocel_cached(path, reader_of(path), cache_dir=str(tmp_path))
+
+    events = cached.events
+    numeric = [col for col in events.columns if events[col].dtype.kind in "if"]
+    assert numeric
+    events.loc[events.index[0], numeric[0]] = -1
+    events.iloc[1, events.columns.get_loc(numeric[0])] = -2
+    events.loc[events.index[0], "ocel:eid"] = "changed"
+    assert events[numeric[0]].iloc[0] == -1 and events["ocel:eid"].iloc[0] == "changed"
+
+    assert_same_ocel(read_ocel_cached(path, reader_of(path), cache_dir=str(tmp_path)), parsed)
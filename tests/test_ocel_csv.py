@@ -0,0 +1,23 @@
+# Parsing of the object lists of the flattened OCEL CSV format: the vectorized path gives the objects of the literal
+# parser (the one of the pm4py importer), with the numpy string functions and with the fallback for older numpy.
+
+import pandas as pd
+import pytest
+
+import ocel_csv
+
+CELLS = ["['a','b']", "['x', 'y,z']", None, "[]", "['q\\'r']", "['one']", "not a list", "['a\\\\b']", "['1', '2']",
+         "['line\\nbreak']", ""]
+
+
+@pytest.mark.parametrize("numpy_strings", [True, False])
+def test_parse_object_lists_matches_the_literal_parser(numpy_strings, monkeypatch):
+    if numpy_strings and not ocel_csv.NUMPY_STRINGS:
+        pytest.skip("numpy has no vectorized string functions")
+    monkeypatch.setattr(ocel_csv, "NUMPY_STRINGS", numpy_strings)
+    cells = pd.Series(CELLS, index=range(10, 10 + len(CELLS)))
+    items = ocel_csv.parse_object_lists(cells)
+
+    expected = [(index, str(item)) for index, cell in cells.items() if isinstance(cell, str) and cell.startswith('[')
+                for item in ocel_csv._parse_list(cell)]
+    assert list(zip(items.index, items)) == expected
@@ -0,0 +1,142 @@
+# Equivalence of transform_ocel with the original per-type implementation (baseline_transform_ocel below, kept as
+# the reference) on the bundled example logs.
+
+import functools
+import os
+import re
+
+import pandas as pd
+import pytest
+
+from splitter import transform_ocel
+
+OCEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data", "ocel")
+LOGS = ["example_log.jsonocel", "ocel20_example.xmlocel", "recruiting-red.jsonocel", "ocel_order_simulated.csv"]
+
+
+@functools.lru_cache(maxsize=None)
+def read_log(file_name):
+    import pm4py
+    from ocel_csv import read_ocel_csv
+
+    path = os.path.join(OCEL_DIR, file_name)
+    if file_name.endswith(".xmlocel"):
+        return pm4py.read_ocel2(path)
+    if file_name.endswith(".csv"):
+        return read_ocel_csv(path)
+    return pm4py.read_ocel(path)
+
+
+def baseline_transform_ocel(ocel, custom=False, create_object_relations=False, lead_object_type=None):
+    # The original implementation: one boolean filter per type and per (event type, object type) pair
+    def clean_name(name):
+        name = re.sub(r'[^0-9a-zA-Z ]+', '', name)
+        name = ' '.join(word.capitalize() for word in name.split())
+        name = name.replace(' ', '')
+        return name
+
+    object_dataframes = {}
+    event_dataframes = {}
+    relationship_dataframes = {}
+
+    for obj_type in ocel.objects['ocel:type'].unique():
+        df_name = clean_name(obj_type)
+        obj_df = ocel.objects[ocel.objects['ocel:type'] == obj_type].copy()
+        additional_columns = [col for col in obj_df.columns if not col.startswith('ocel:')]
+        cols_with_values = [col for col in additional_columns if obj_df[col].notnull().any()]
+        obj_df = obj_df[['ocel:oid'] + cols_with_values]
+        obj_df.rename(columns={'ocel:oid': 'ID'}, inplace=True)
+        new_columns = {x: clean_name(x) for x in obj_df.columns}
+        new_columns["ID"] = "ID"
+        obj_df.rename(columns=new_columns, inplace=True)
+        object_dataframes[df_name] = obj_df
+
+    for evt_type in ocel.events['ocel:activity'].unique():
+        df_name = clean_name(evt_type)
+        evt_df = ocel.events[ocel.events['ocel:activity'] == evt_type].copy()
+        additional_columns = [col for col in evt_df.columns if not col.startswith('ocel:')]
+        cols_with_values = [col for col in additional_columns if evt_df[col].notnull().any()]
+        evt_df = evt_df[['ocel:eid', 'ocel:timestamp'] + cols_with_values]
+        evt_df.rename(columns={'ocel:eid': 'ID', 'ocel:timestamp': 'Time'}, inplace=True)
+        new_columns = {x: clean_name(x) for x in evt_df.columns}
+        new_columns["ID"] = "ID"
+        evt_df.rename(columns=new_columns, inplace=True)
+        event_dataframes[df_name] = evt_df
+
+    relations_df = ocel.relations
+    event_object_pairs = relations_df[['ocel:activity', 'ocel:type']].drop_duplicates()
+    for _, row in event_object_pairs.iterrows():
+        evt_type = row['ocel:activity']
+        obj_type = row['ocel:type']
+        evt_name = clean_name(evt_type)
+        obj_name = clean_name(obj_type)
+        rel_df = relations_df[(relations_df['ocel:activity'] == evt_type) & (relations_df['ocel:type'] == obj_type)]
+        counts = rel_df.groupby('ocel:eid')['ocel:oid'].nunique()
+        if counts.eq(1).all():
+            eid_to_oid = rel_df.set_index('ocel:eid')['ocel:oid']
+            evt_df = event_dataframes[evt_name]
+            evt_df[obj_name] = evt_df['ID'].map(eid_to_oid)
+        else:
+            pair_df = rel_df[['ocel:oid', 'ocel:eid']].copy()
+            if custom:
+                pair_df.rename(columns={'ocel:eid': 'ID', 'ocel:oid': obj_name}, inplace=True)
+            else:
+                pair_df.rename(columns={'ocel:oid': 'ID', 'ocel:eid': 'EventID'}, inplace=True)
+            relationship_dataframes[(evt_name, obj_name)] = pair_df
+
+    object_relationship_dataframes = {}
+    if create_object_relations and lead_object_type is not None:
+        lead_obj_name = clean_name(lead_object_type)
+        lead_relations = relations_df[relations_df['ocel:type'] == lead_object_type].rename(
+            columns={'ocel:oid': 'LeadObjectID'})
+        other_relations = relations_df[relations_df['ocel:type'] != lead_object_type].rename(
+            columns={'ocel:oid': 'OtherObjectID'})
+        merged_relations = pd.merge(lead_relations[['ocel:eid', 'LeadObjectID']],
+                                    other_relations[['ocel:eid', 'OtherObjectID', 'ocel:type']], on='ocel:eid')
+        for obj_type in merged_relations['ocel:type'].unique():
+            obj_type_relations = merged_relations[merged_relations['ocel:type'] == obj_type]
+            counts = obj_type_relations.groupby('OtherObjectID')['LeadObjectID'].nunique()
+            if counts.eq(1).all():
+                mapping = obj_type_relations[['OtherObjectID', 'LeadObjectID']].drop_duplicates().set_index(
+                    'OtherObjectID')['LeadObjectID']
+                obj_df = object_dataframes[clean_name(obj_type)]
+                obj_df[lead_obj_name] = obj_df['ID'].map(mapping)
+            else:
+                rel_df = obj_type_relations[['LeadObjectID', 'OtherObjectID']].rename(
+                    columns={'LeadObjectID': lead_obj_name, 'OtherObjectID': 'ID'})
+                object_relationship_dataframes[f"{lead_obj_name}_{clean_name(obj_type)}_objrelations"] = rel_df
+
+    return object_dataframes, event_dataframes, relationship_dataframes, object_relationship_dataframes
+
+
+def cases():
+    # Every log, plain and custom, without object relations and with each of the first object types as lead type
+    # (recruiting-red has only two object types: its 'third' cases are skipped)
+    for file_name in LOGS:
+        for custom in [False, True]:
+            yield file_name, custom, None
+            for lead_object_type in ["first", "second", "third"]:
+                yield file_name, custom, lead_object_type
+
+
+def assert_same_tables(actual, expected):
+    for actual_tables, expected_tables in zip(actual, expected):
+        assert list(actual_tables) == list(expected_tables)
+        for key in expected_tables:
+            pd.testing.assert_frame_equal(actual_tables[key], expected_tables[key])
+
+
+@pytest.mark.parametrize("file_name, custom, lead", list(cases()))
+def test_transform_ocel_matches_baseline(file_name, custom, lead):
+    ocel = read_log(file_name)
+    lead_object_type = None
+    if lead is not None:
+        object_types = list(ocel.objects['ocel:type'].unique())
+        position = ["first", "second", "third"].index(lead)
+        if position >= len(object_types):
+            pytest.skip(f"{file_name} has fewer than {position + 1} object types")
+        lead_object_type = object_types[position]
+    options = dict(custom=custom, create_object_relations=lead_object_type is not None,
+                   lead_object_type=lead_object_type)
+    assert_same_tables(transform_ocel(ocel, **options), baseline_transform_ocel(ocel, **options))
+
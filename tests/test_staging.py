@@ -0,0 +1,56 @@
+# Type tightening of the tables before their upload: the tightened table keeps every value, and the report measures
+# the payload the way create_table serializes it (parquet with pyarrow, CSV text without it).
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import staging
+
+FORMATS = ["csv", pytest.param("parquet", marks=pytest.mark.skipif(staging.PAYLOAD_FORMAT != "parquet",
+                                                                   reason="pyarrow is not installed"))]
+
+
+def make_table(rows=1000):
+    return pd.DataFrame({
+        "ID": pd.Series([f"id_{i}" for i in range(rows)], dtype=object),
+        # Whole numbers stored as float because some rows are missing
+        "Quantity": [float(i % 100) if i % 7 else np.nan for i in range(rows)],
+        "Price": np.arange(rows, dtype=np.float64) / 4,
+    })
+
+
+@pytest.mark.parametrize("payload_format", FORMATS)
+def test_report_measures_the_serialized_payload(payload_format, monkeypatch):
+    monkeypatch.setattr(staging, "PAYLOAD_FORMAT", payload_format)
+    df = make_table()
+    tight, entry = staging.stage_table(df, "table")
+
+    # Same values in tighter types
+    assert tight["ID"].tolist() == df["ID"].tolist()
+    for col in ["Quantity", "Price"]:
+        pd.testing.assert_series_equal(tight[col].astype(np.float64), df[col])
+    assert entry["payload_format"] == payload_format
+    if payload_format == "csv":
+        expected = len(tight.to_csv(index=False).encode("utf-8"))
+    else:
+        buffer = io.BytesIO()
+        tight.to_parquet(buffer, index=False)
+        expected = len(buffer.getvalue())
+    assert entry["tight_bytes"] == expected
+    assert entry["tight_bytes"] < entry["raw_bytes"]
+    assert entry["tight_memory_bytes"] < entry["raw_memory_bytes"]
+    assert set(entry["changed_columns"]) >= {"Quantity", "Price"}
+
+
+@pytest.mark.skipif(staging.PAYLOAD_FORMAT != "parquet", reason="pyarrow is not installed")
+def test_unserializable_table_is_reported_unmeasured(capsys):
+    # Parquet cannot store a column mixing strings and numbers
+    df = pd.DataFrame({"ID": ["a", "b"], "Mixed": pd.Series(["x", 1], dtype=object)})
+    _, entry = staging.stage_table(df, "mixed")
+
+    assert entry["raw_bytes"] is None and entry["tight_bytes"] is None
+    staging.print_staging_report([entry, staging.stage_table(make_table(), "table")[1]])
+    assert "without 1 unmeasured table(s)" in capsys.readouterr().out
@@ -0,0 +1,86 @@
+# Surrogate keys of uploader and uploader2 against the local fake data pool: the uploaded codes map back to the
+# original IDs through the key tables, and lazy tables are numbered from their log without being built for it.
+
+import os
+
+import pandas as pd
+import pytest
+
+import uploader
+import uploader2
+from data_model_plan import event_key_table_name, event_table_name, object_key_table_name, object_table_name
+from fake_celonis import FakeDataPool
+from splitter import transform_ocel
+from surrogate_keys import build_key_decoder, ocel_key_decoder, surrogate_decoder
+
+EXAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data", "ocel", "example_log.jsonocel")
+
+
+@pytest.fixture(scope="module")
+def example_log():
+    import pm4py
+
+    return pm4py.read_ocel(EXAMPLE_LOG)
+
+
+def count_builds(dataframes, builds):
+    # Count every table built by a LazyTables mapping
+    build = dataframes._build
+
+    def counted(key):
+        builds[key] = builds.get(key, 0) + 1
+        return build(key)
+    dataframes._build = counted
+
+
+def decoded(data_pool, table_name, key_table_name):
+    # Uploaded table with its codes turned back into the original IDs through its key table
+    keys = data_pool.tables[key_table_name]
+    df = data_pool.tables[table_name]
+    return df.assign(ID=df["ID"].map(pd.Series(keys["OriginalID"].to_numpy(), index=keys["ID"])).astype(object))
+
+
+def test_ocel_key_decoder_numbers_the_ids_of_the_tables(example_log):
+    object_dataframes, event_dataframes, _, _ = transform_ocel(example_log)
+    expected = build_key_decoder(object_dataframes, event_dataframes)
+    decoder = ocel_key_decoder(example_log)
+
+    assert decoder["object_columns"] == expected["object_columns"]
+    for kind in ["eid", "oid"]:
+        assert sorted(decoder[kind]) == sorted(expected[kind])
+
+
+def test_lazy_tables_are_numbered_from_their_log(example_log):
+    object_dataframes, event_dataframes, _, _ = transform_ocel(example_log, lazy=True)
+    builds = {}
+    count_builds(object_dataframes, builds)
+    count_builds(event_dataframes, builds)
+
+    decoder = surrogate_decoder(object_dataframes, event_dataframes)
+    assert builds == {}
+    assert decoder["object_columns"] == set(object_dataframes)
+
+
+@pytest.mark.parametrize("module", [uploader, uploader2])
+def test_lazy_upload_builds_every_table_once(example_log, module):
+    object_dataframes, event_dataframes, _, _ = transform_ocel(example_log)
+    lazy_tables = transform_ocel(example_log, lazy=True)
+    builds = {}
+    count_builds(lazy_tables[0], builds)
+    count_builds(lazy_tables[1], builds)
+
+    data_pool = FakeDataPool()
+    if module is uploader:
+        uploader.upload_to_data_pool(data_pool, *lazy_tables, surrogate_keys=True)
+        names = {kind: lambda name, prefix=prefix: f"{prefix}{name}"
+                 for kind, prefix in uploader.TABLE_PREFIXES.items()}
+    else:
+        uploader2.upload_to_data_pool(data_pool, *lazy_tables[:3], "model", surrogate_keys=True)
+        names = {"object": object_table_name, "object_key": object_key_table_name, "event": event_table_name,
+                 "event_key": event_key_table_name}
+
+    assert builds == {name: 1 for name in list(object_dataframes) + list(event_dataframes)}
+    for kind, dataframes in [("object", object_dataframes), ("event", event_dataframes)]:
+        for name, df in dataframes.items():
+            uploaded = decoded(data_pool, names[kind](name), names[kind + "_key"](name))
+            pd.testing.assert_series_equal(uploaded["ID"], df["ID"].astype(object), check_names=False)
@@ -0,0 +1,101 @@
+# Concurrent uploads of upload_executor against the local fake data pool: every table is sent once, failed calls are
+# retried and reported, and the bounded pool of workers overlaps the latency of the calls.
+
+import pandas as pd
+import pytest
+
+from fake_celonis import FakeDataPool
+from upload_executor import upload_table, upload_table_stream, upload_tables
+
+
+def make_tables(count, rows=5):
+    return [(f"table_{i}", pd.DataFrame({"ID": [f"{i}_{j}" for j in range(rows)], "Value": range(rows)}))
+            for i in range(count)]
+
+
+def assert_uploaded(data_pool, tables):
+    assert sorted(data_pool.tables) == sorted(table_name for table_name, _ in tables)
+    for table_name, df in tables:
+        pd.testing.assert_frame_equal(data_pool.tables[table_name], df)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4, 16])
+def test_every_table_is_created_once(max_workers):
+    tables = make_tables(10)
+    data_pool = FakeDataPool()
+    report = upload_tables(data_pool, tables, max_workers=max_workers, verbose=False)
+
+    assert_uploaded(data_pool, tables)
+    assert data_pool.calls["create_table"] == len(tables)
+    # The report keeps the input order
+    assert [result["table"] for result in report["tables"]] == [table_name for table_name, _ in tables]
+    assert report["succeeded"] == [table_name for table_name, _ in tables]
+    assert report["failed"] == [] and report["retries"] == 0
+    assert report["max_workers"] == max_workers
+
+
+def test_stream_uploads_every_table_once():
+    tables = make_tables(10)
+    data_pool = FakeDataPool()
+    report = upload_table_stream(data_pool, iter(tables), max_workers=3, queue_depth=2, verbose=False)
+
+    assert_uploaded(data_pool, tables)
+    assert data_pool.calls["create_table"] == len(tables)
+    assert report["succeeded"] == [table_name for table_name, _ in tables]
+
+
+def test_failed_calls_are_retried_and_reported():
+    tables = make_tables(20)
+    data_pool = FakeDataPool(failure_rate=0.3, seed=1)
+    report = upload_tables(data_pool, tables, max_workers=4, retries=10, retry_backoff=0.0, verbose=False)
+
+    assert report["failed"] == []
+    assert_uploaded(data_pool, tables)
+    # Every call beyond the first one of a table is a retry
+    assert report["retries"] > 0
+    assert data_pool.calls["create_table"] == len(tables) + report["retries"]
+    assert sum(result["attempts"] for result in report["tables"]) == data_pool.calls["create_table"]
+
+
+def test_persistent_failure_gives_up_after_the_retries():
+    data_pool = FakeDataPool(max_rows_per_call=2)
+    result = upload_table(data_pool, "table", make_tables(1)[0][1], retries=2, retry_backoff=0.0)
+
+    assert not result["success"]
+    assert result["attempts"] == 3
+    assert data_pool.calls["create_table"] == 3
+    assert "FakeUploadError" in result["error"]
+
+
+def test_workers_overlap_the_latency():
+    tables = make_tables(16)
+    elapsed = {}
+    for max_workers in [1, 8]:
+        data_pool = FakeDataPool(latency=0.05)
+        elapsed[max_workers] = upload_tables(data_pool, tables, max_workers=max_workers, verbose=False)["elapsed"]
+        assert data_pool.calls["create_table"] == len(tables)
+    # 16 calls of 50ms: 0.8s one at a time, 0.1s with 8 workers
+    assert elapsed[8] < elapsed[1] / 3
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_failing_prepare_table_only_fails_its_table(stream):
+    tables = make_tables(6)
+
+    def prepare_table(table_name, df):
+        if table_name == "table_2":
+            raise ValueError("cannot decode the IDs")
+        return df
+
+    data_pool = FakeDataPool()
+    upload = upload_table_stream if stream else upload_tables
+    report = upload(data_pool, iter(tables) if stream else tables, max_workers=3, prepare_table=prepare_table,
+                    verbose=False)
+
+    assert report["failed"] == ["table_2"]
+    result = report["tables"][2]
+    assert not result["success"] and result["attempts"] == 0
+    assert result["error"] == "ValueError: cannot decode the IDs"
+    # The other tables are uploaded, and the failed one is never sent
+    assert_uploaded(data_pool, [table for table in tables if table[0] != "table_2"])
+    assert data_pool.calls["create_table"] == len(tables) - 1
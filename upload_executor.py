@@ -0,0 +1,187 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from chunked_upload import upload_table_chunked
+from fingerprints import table_fingerprint
+from instrumentation import stage
+
+
+def upload_table(data_pool, table_name, df, retries=2, retry_backoff=1.0, prepare_table=None,
+                 known_fingerprints=None, chunk_rows=None, journal=None, min_chunk_rows=None):
+    # Upload a single table to the data pool, retrying failed attempts with exponential backoff.
+    # 'prepare_table' (optional) is called as prepare_table(table_name, df) in the worker, right before the upload,
+    # and returns the dataframe to send (e.g. with integer-coded IDs decoded back to the original ones).
+    # When 'known_fingerprints' (table name -> fingerprint of the last upload) is given, the fingerprint of the
+    # table is computed and the upload is skipped if the table did not change.
+    # Tables with more than 'chunk_rows' rows are uploaded in slices (see chunked_upload), recorded in 'journal'
+    # (an UploadJournal) when given, so an interrupted upload resumes on the next run.
+    # Returns a result entry with the timing, the number of attempts and the last error (if any). Errors of
+    # 'prepare_table', of the fingerprint or of the journal also give a failed entry instead of being raised, so one
+    # table never aborts the upload of the others.
+    result = {"table": table_name, "rows": len(df), "attempts": 0, "duration": 0.0, "error": None,
+              "skipped": False, "fingerprint": None}
+    start = time.perf_counter()
+    try:
+        if prepare_table is not None:
+            df = prepare_table(table_name, df)
+        if known_fingerprints is not None:
+            result["fingerprint"] = table_fingerprint(df)
+            if known_fingerprints.get(table_name) == result["fingerprint"]:
+                result["skipped"] = True
+                result["success"] = True
+                result["duration"] = time.perf_counter() - start
+                return result
+        if chunk_rows is not None and len(df) > chunk_rows:
+            if journal is not None and result["fingerprint"] is None:
+                result["fingerprint"] = table_fingerprint(df)
+            result.update(upload_table_chunked(data_pool, table_name, df, chunk_rows, journal=journal,
+                                               retries=retries, retry_backoff=retry_backoff,
+                                               min_chunk_rows=min_chunk_rows, fingerprint=result["fingerprint"]))
+            result["duration"] = time.perf_counter() - start
+            result["success"] = result["error"] is None
+            return result
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["duration"] = time.perf_counter() - start
+        result["success"] = False
+        return result
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            with stage("create_table", table=table_name) as s:
+                s.update(df=df)
+                data_pool.create_table(df, table_name, force=True, drop_if_exists=True)
+            result["error"] = None
+            break
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            if attempt < retries:
+                time.sleep(retry_backoff * 2 ** attempt)
+    result["duration"] = time.perf_counter() - start
+    result["success"] = result["error"] is None
+    return result
+
+
+def _print_result(result):
+    if result["skipped"]:
+        print(f"Table '{result['table']}' is unchanged since the last upload, skipped.")
+    elif result["success"] and "chunks" in result:
+        print(f"Created table '{result['table']}' in Data Pool ({result['rows']} rows in "
+              f"{result['chunks']} slice(s), {result['resumed_rows']} resumed, "
+              f"{result['duration']:.2f}s, {result['attempts']} attempt(s)).")
+    elif result["success"]:
+        print(f"Created table '{result['table']}' in Data Pool ({result['rows']} rows, "
+              f"{result['duration']:.2f}s, {result['attempts']} attempt(s)).")
+    else:
+        print(f"Failed to create table '{result['table']}' after {result['attempts']} attempt(s): "
+              f"{result['error']}")
+
+
+def _upload_report(tables_report, max_workers, start):
+    return {
+        "tables": tables_report,
+        "succeeded": [r["table"] for r in tables_report if r["success"] and not r["skipped"]],
+        "skipped": [r["table"] for r in tables_report if r["skipped"]],
+        "failed": [r["table"] for r in tables_report if not r["success"]],
+        # Chunked tables make one call per slice: only the calls beyond them are retries
+        "retries": sum(max(0, r["attempts"] - max(1, r.get("chunks", 1))) for r in tables_report),
+        "resumed_rows": sum(r.get("resumed_rows", 0) for r in tables_report),
+        "max_workers": max_workers,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def upload_tables(data_pool, tables, max_workers=8, retries=2, retry_backoff=1.0, prepare_table=None,
+                  known_fingerprints=None, verbose=True, chunk_rows=None, journal=None, min_chunk_rows=None):
+    # Upload a list of (table_name, dataframe) pairs concurrently with a bounded pool of worker threads.
+    # Uploads are network bound, so threads overlap the waiting time of the different tables.
+    # Returns a report with one entry per table (in the input order) and the overall wall-clock time.
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(upload_table, data_pool, table_name, df, retries, retry_backoff,
+                                   prepare_table, known_fingerprints, chunk_rows, journal, min_chunk_rows): table_name
+                   for table_name, df in tables}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if verbose:
+                _print_result(result)
+
+    return _upload_report([results[table_name] for table_name, _ in tables], max_workers, start)
+
+
+def upload_table_stream(data_pool, tables, max_workers=8, queue_depth=None, retries=2, retry_backoff=1.0,
+                        prepare_table=None, known_fingerprints=None, verbose=True, chunk_rows=None, journal=None,
+                        min_chunk_rows=None):
+    # Upload (table_name, dataframe) pairs while they are produced: 'tables' is consumed in the calling thread
+    # (e.g. a generator building the tables, see splitter.iter_transform_ocel) and the tables are handed to the
+    # worker threads through a bounded queue, so building and uploading overlap. The producer waits while
+    # 'queue_depth' tables (default: max_workers) are queued, so at most queue_depth + max_workers finished tables
+    # are held at once, and every table is released as soon as it is sent.
+    # Returns the same report as upload_tables, with the tables in the order they were produced.
+    start = time.perf_counter()
+    max_workers = max(1, max_workers)
+    pending = queue.Queue(maxsize=max(1, queue_depth or max_workers))
+    results = {}
+    order = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            table_name, df = item
+            item = None
+            # upload_table returns a failed entry instead of raising: the worker stays alive, so the producer never
+            # waits for a queue nobody reads
+            result = upload_table(data_pool, table_name, df, retries, retry_backoff, prepare_table,
+                                  known_fingerprints, chunk_rows, journal, min_chunk_rows)
+            df = None
+            with lock:
+                results[table_name] = result
+                if verbose:
+                    _print_result(result)
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(max_workers)]
+    for thread in workers:
+        thread.start()
+    try:
+        for table_name, df in tables:
+            order.append(table_name)
+            pending.put((table_name, df))
+            df = None
+    finally:
+        # Let the workers finish the queued tables, even when building the tables failed
+        for _ in workers:
+            pending.put(None)
+        for thread in workers:
+            thread.join()
+
+    return _upload_report([results[table_name] for table_name in order], max_workers, start)
+
+
+def print_upload_report(report):
+    print(f"Uploaded {len(report['succeeded'])} table(s), {len(report.get('skipped', []))} unchanged, "
+          f"{len(report['failed'])} failed, "
+          f"{report['retries']} retry(ies), in {report['elapsed']:.2f}s with {report['max_workers']} worker(s).")
+    if report.get("resumed_rows"):
+        print(f"Resumed {report['resumed_rows']} row(s) uploaded by a previous run.")
+    for table_name in report["failed"]:
+        print(f"- Failed: '{table_name}'")
+
+
+# Example usage: show the speedup of the concurrent upload against a local fake data pool
+if __name__ == "__main__":
+    import pandas as pd
+    from fake_celonis import FakeDataPool
+
+    tables = [(f"TEMP_OBJECT_T{i}", pd.DataFrame({"ID": [str(j) for j in range(100)]})) for i in range(48)]
+
+    for max_workers in [1, 2, 4, 8, 16]:
+        data_pool = FakeDataPool(latency=0.05, failure_rate=0.05, seed=0)
+        report = upload_tables(data_pool, tables, max_workers=max_workers, retry_backoff=0.01, verbose=False)
+        print_upload_report(report)